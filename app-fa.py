@@ -4,6 +4,7 @@
 
 # app-fa.py
 import os
+import asyncio
 from fastapi import FastAPI
 from routes.rt_auth import router as auth_router
 from routes.rt_code import router as code_router
@@ -14,6 +15,21 @@ from routes.rt_reports import router as reports_router
 from routes.rt_requested_document import router as requested_document_router
 from routes.rt_user import router as user_router
 from models import init_db
+from services.documents.ingestion.job_worker import (
+    start_ingestion_workers,
+    stop_ingestion_workers,
+)
+from services.nr_database.collection_alias_service import sync_collection_aliases
+from services.embeddings.reindex_service import resume_reindex_jobs, stop_reindex_jobs
+from services.ollama.ollama_client_service import (
+    start_ollama_clients,
+    close_ollama_clients,
+)
+from services.ollama.model_residency_service import warm_up_models
+from services.metrics.save_metrics.metrics_recorder import (
+    start_metrics_recorder,
+    stop_metrics_recorder,
+)
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
@@ -27,6 +43,29 @@ reset_db = (
     os.getenv("RESET_DB", "false").lower() == "true"
 )  # Leer de las variables de entorno
 init_db(reset=reset_db)
+# Registrar las colecciones de Chroma existentes con su modelo de embeddings
+sync_collection_aliases()
+
+
+# Iniciar los workers de ingesta en segundo plano
+@app.on_event("startup")
+async def startup_event():
+    await start_ollama_clients()
+    start_metrics_recorder()
+    # La carga de los modelos no retrasa el arranque de la API
+    app.state.warm_up_task = asyncio.create_task(warm_up_models())
+    await start_ingestion_workers()
+    await resume_reindex_jobs()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_ingestion_workers()
+    await stop_reindex_jobs()
+    # Guardar las métricas pendientes antes de cerrar
+    await stop_metrics_recorder()
+    await close_ollama_clients()
+
 
 # Incluir las rutas
 app.include_router(auth_router)
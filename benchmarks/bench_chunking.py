@@ -0,0 +1,132 @@
+"""
+Benchmark de la fragmentación del texto resolutivo.
+
+Compara las dos formas de obtener los fragmentos a mostrar y los fragmentos
+para embeddings:
+
+- legacy: se normaliza el texto completo con get_resolve_to_embed y se
+  fragmentan por separado el texto original y el normalizado (dos pasadas del
+  splitter). Como la normalización cambia la longitud del texto, los cortes no
+  coinciden y el fragmento i para embeddings no corresponde al fragmento i a
+  mostrar.
+- single: chunk_documents fragmenta una vez con posiciones y normaliza cada
+  tramo; ambas listas quedan alineadas.
+
+Se reporta el tiempo por lote de documentos y cuántos fragmentos quedan
+desalineados (distinta cantidad, o el texto normalizado del fragmento a
+mostrar no coincide con el fragmento para embeddings).
+
+Uso:
+    python benchmarks/bench_chunking.py --documents 200 --repeat 3
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from services.documents.treat_docs.info_documents_service import (  # noqa: E402
+    get_resolve_to_embed,
+)
+from services.documents.treat_docs.chunking_service import (  # noqa: E402
+    text_splitter,
+    chunk_documents,
+)
+
+WORDS = (
+    "el consejo politécnico de la escuela superior resuelve aprobar reforma "
+    "reglamento régimen académico artículo disposición transitoria señor "
+    "vicerrectorado investigación posgrado facultad carrera ingeniería "
+    "presupuesto año fiscal contratación docentes ocasionales títulos niños "
+    "año compañía evaluación desempeño informe técnico jurídico comisión"
+).split()
+PUNCTUATION = [". ", ", ", "; ", " - ", ": ", ".- ", " (", ") ", " «", "» ", " … "]
+
+
+def generate_resolve(rng, length):
+    """Texto resolutivo sintético con tildes, ñ, mayúsculas y signos."""
+    parts = [f"RESOLUCIÓN {rng.randint(1, 999)}.CP.2024 resuelve: por "]
+    size = len(parts[0])
+    while size < length:
+        word = rng.choice(WORDS)
+        if rng.random() < 0.15:
+            word = word.upper()
+        part = word + (rng.choice(PUNCTUATION) if rng.random() < 0.2 else " ")
+        if rng.random() < 0.03:
+            part += f"Artículo {rng.randint(1, 40)}.- "
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+def legacy_chunking(texts):
+    results = []
+    for text in texts:
+        text_to_embed = get_resolve_to_embed(text)
+        chunks = text_splitter.split_text(text)
+        chunks_to_embed = text_splitter.split_text(text_to_embed)
+        results.append({"chunks": chunks, "chunks_to_embed": chunks_to_embed})
+    return results
+
+
+def count_misaligned(results):
+    misaligned = 0
+    total = 0
+    for result in results:
+        chunks = result["chunks"]
+        chunks_to_embed = result["chunks_to_embed"]
+        total += len(chunks)
+        misaligned += abs(len(chunks) - len(chunks_to_embed))
+        for chunk, chunk_to_embed in zip(chunks, chunks_to_embed):
+            # chunk_documents quita los espacios de los extremos de cada tramo
+            if get_resolve_to_embed(chunk).strip() != chunk_to_embed.strip():
+                misaligned += 1
+    return misaligned, total
+
+
+def measure(function, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = function(texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--length", type=int, default=20000, help="Caracteres por documento")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [
+        generate_resolve(rng, rng.randint(args.length // 2, args.length))
+        for _ in range(args.documents)
+    ]
+    total_chars = sum(len(text) for text in texts)
+    print(f"{args.documents} documentos, {total_chars / 1e6:.1f} M caracteres")
+    print(f"{'modo':>8} {'tiempo (s)':>11} {'MB/s':>8} {'fragmentos':>11} {'desalineados':>13}")
+
+    for name, function in (("legacy", legacy_chunking), ("single", chunk_documents)):
+        elapsed, results = measure(function, texts, args.repeat)
+        misaligned, total = count_misaligned(results)
+        print(
+            f"{name:>8} {elapsed:>11.3f} {total_chars / 1e6 / elapsed:>8.2f} "
+            f"{total:>11} {misaligned:>13}"
+        )
+
+    # Las posiciones deben reconstruir exactamente cada fragmento
+    for text, result in zip(texts, chunk_documents(texts)):
+        for chunk, (start, end) in zip(result["chunks"], result["offsets"]):
+            assert text[start:end] == chunk
+
+
+if __name__ == "__main__":
+    main()
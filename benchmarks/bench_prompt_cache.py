@@ -0,0 +1,117 @@
+"""
+Benchmark de la evaluación del prompt según la plantilla de mensajes.
+
+Simula sesiones de varios turnos contra un Ollama real y compara, por
+versión de plantilla (v1: pregunta y material en el mensaje de sistema;
+v2: instrucciones fijas -> material -> historial -> pregunta), los tokens
+que Ollama tuvo que evaluar y el prompt_eval_duration de cada turno. Con v2
+el prefijo de instrucciones es idéntico entre solicitudes y Ollama reutiliza
+su caché KV.
+
+En cada sesión el primer turno trae material nuevo y los siguientes son
+preguntas de seguimiento sobre el mismo material (el caso de una
+conversación), salvo con --new-material, donde cada turno recupera
+material distinto.
+
+Uso (necesita OLLAMA_HOST y un modelo de chat descargado):
+    python benchmarks/bench_prompt_cache.py --model llama3.1:8b --sessions 3 --turns 4
+"""
+
+import os
+import sys
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ollama import Client  # noqa: E402
+from services.query.ollama.prompt_layout import build_messages  # noqa: E402
+
+TOPICS = [
+    "reforma del reglamento de régimen académico",
+    "contratación de docentes ocasionales",
+    "aprobación del presupuesto del año fiscal",
+    "creación de la carrera de ingeniería de software",
+    "calendario académico del periodo ordinario",
+]
+
+
+def material(rng, turn):
+    topic = rng.choice(TOPICS)
+    number = rng.randint(100, 999)
+    sources = " ".join(
+        f"Documento: RESOLUCIÓN {number + i}.CP.2024, Página: {i + 2}, Ubicación: /{number + i}.pdf"
+        for i in range(3)
+    )
+    context = " ".join(
+        f"RESOLUCIÓN {number + i}.CP.2024 resuelve: por unanimidad aprobar la {topic}, "
+        f"artículo {i + 1}. Disponer a las unidades académicas su cumplimiento desde el turno {turn}."
+        for i in range(6)
+    )
+    considerations = [
+        {"Documento": f"RESOLUCIÓN {number}.CP.2024", "Consideraciones": f"Que la {topic} fue revisada"}
+    ]
+    return sources, context, considerations, topic
+
+
+def run_session(client, model, version, rng, turns, new_material, num_predict):
+    interactions = []
+    results = []
+    sources = context = considerations = topic = None
+    for turn in range(turns):
+        if turn == 0 or new_material:
+            sources, context, considerations, topic = material(rng, turn)
+        query = f"¿Qué se resolvió sobre la {topic}? (pregunta {turn + 1})"
+        history = interactions + [{"role": "user", "content": query}]
+        messages = build_messages(query, history, context, sources, considerations, version=version)
+        response = client.chat(
+            model=model,
+            messages=messages,
+            options={"num_predict": num_predict, "temperature": 0},
+        )
+        answer = response["message"]["content"]
+        interactions += [{"role": "user", "content": query}, {"role": "assistant", "content": answer}]
+        results.append(
+            {
+                "prompt_eval_count": response.get("prompt_eval_count") or 0,
+                "prompt_eval_ms": (response.get("prompt_eval_duration") or 0) / 1e6,
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--num-predict", type=int, default=48)
+    parser.add_argument("--new-material", action="store_true")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    client = Client()
+    client.generate(model=args.model, prompt="", keep_alive="10m")  # Carga del modelo
+
+    print(f"{'versión':>8} {'turno':>6} {'tokens evaluados':>17} {'prompt_eval (ms)':>17}")
+    for version in ("v1", "v2"):
+        rng = random.Random(args.seed)  # El mismo material para ambas versiones
+        per_turn = [[] for _ in range(args.turns)]
+        for _ in range(args.sessions):
+            for turn, result in enumerate(
+                run_session(
+                    client, args.model, version, rng, args.turns, args.new_material, args.num_predict
+                )
+            ):
+                per_turn[turn].append(result)
+        for turn, results in enumerate(per_turn):
+            print(
+                f"{version:>8} {turn + 1:>6} "
+                f"{statistics.mean(r['prompt_eval_count'] for r in results):>17.0f} "
+                f"{statistics.mean(r['prompt_eval_ms'] for r in results):>17.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
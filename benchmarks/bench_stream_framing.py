@@ -0,0 +1,132 @@
+"""
+Benchmark de la salida del websocket por respuesta.
+
+Simula el flujo de tokens de una respuesta de Ollama (tokens cortos en
+español a un ritmo fijo) y compara:
+    legacy   -> un json.dumps + send_text por token, con el response_uuid completo
+    json     -> StreamWriter con tokens agrupados (framing JSON compatible)
+    msgpack  -> StreamWriter con tokens agrupados y framing binario con id numérico
+
+Reporta frames por respuesta, frames por segundo y bytes por respuesta.
+
+Uso:
+    python benchmarks/bench_stream_framing.py --tokens 600 --rate 40 --flush-ms 50 --flush-bytes 256
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from services.query.ollama.stream_output import (  # noqa: E402
+    StreamWriter,
+    negotiate_framing,
+)
+
+WORDS = (
+    "la resolución aprueba el reglamento de régimen académico y dispone a las "
+    "unidades académicas su cumplimiento desde el periodo ordinario según el artículo"
+).split()
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_text(self, data):
+        self.frames += 1
+        self.bytes += len(data.encode("utf-8"))
+
+    async def send_bytes(self, data):
+        self.frames += 1
+        self.bytes += len(data)
+
+
+def tokens(count, seed=7):
+    rng = random.Random(seed)
+    # Ollama entrega fragmentos de palabra; se parte cada palabra en 1-3 trozos
+    result = []
+    while len(result) < count:
+        word = " " + rng.choice(WORDS)
+        cuts = sorted(rng.sample(range(1, len(word)), min(len(word) - 1, rng.randint(0, 2))))
+        start = 0
+        for cut in cuts + [len(word)]:
+            result.append(word[start:cut])
+            start = cut
+    return result[:count]
+
+
+def done_chunk():
+    return {
+        "key": "MESSAGE_DONE",
+        "created_at": "2024-11-05T16:20:00Z",
+        "total_duration": 12345678900,
+        "eval_count": 600,
+        "eval_duration": 11000000000,
+        "prompt_version": "v2",
+    }
+
+
+async def run_legacy(stream, interval):
+    websocket = FakeWebSocket()
+    response_uuid = str(uuid.uuid4())
+    start = time.perf_counter()
+    for token in stream:
+        await asyncio.sleep(interval)
+        await websocket.send_text(json.dumps({"response_uuid": response_uuid, "content": token}))
+    await websocket.send_text(json.dumps({"response_uuid": response_uuid, "content": done_chunk()}))
+    return websocket, time.perf_counter() - start
+
+
+async def run_writer(stream, interval, framing, flush_ms, flush_bytes):
+    websocket = FakeWebSocket()
+    writer = StreamWriter(websocket, negotiate_framing(framing), flush_ms, flush_bytes)
+    response_uuid = str(uuid.uuid4())
+    start = time.perf_counter()
+    await writer.open(response_uuid)
+    for token in stream:
+        await asyncio.sleep(interval)
+        await writer.write(response_uuid, token)
+    await writer.send_event(response_uuid, done_chunk())
+    await writer.close(response_uuid)
+    return websocket, time.perf_counter() - start
+
+
+async def main(args):
+    stream = tokens(args.tokens)
+    interval = 1 / args.rate
+    print(
+        f"{args.tokens} tokens a {args.rate} tokens/s, "
+        f"flush cada {args.flush_ms} ms o {args.flush_bytes} bytes\n"
+    )
+    print(f"{'modo':<10}{'frames':>8}{'frames/s':>10}{'bytes':>10}{'bytes/token':>13}")
+    runs = [("legacy", run_legacy(stream, interval))]
+    for framing in ("json", "msgpack"):
+        if negotiate_framing(framing) != framing:
+            print(f"{framing:<10} no disponible (falta el paquete)")
+            continue
+        runs.append(
+            (framing, run_writer(stream, interval, framing, args.flush_ms, args.flush_bytes))
+        )
+    for name, run in runs:
+        websocket, elapsed = await run
+        print(
+            f"{name:<10}{websocket.frames:>8}{websocket.frames / elapsed:>10.1f}"
+            f"{websocket.bytes:>10}{websocket.bytes / args.tokens:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=600)
+    parser.add_argument("--rate", type=float, default=40.0, help="Tokens por segundo")
+    parser.add_argument("--flush-ms", type=float, default=50.0)
+    parser.add_argument("--flush-bytes", type=int, default=256)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,214 @@
+"""
+Benchmark de memoria de la ruta de carga de documentos.
+
+Compara el pico de RSS de un proceso al subir y analizar un PDF:
+
+- legacy: el archivo completo se lee a bytes (como `await file.read()`), se
+  envía como un solo cuerpo multipart y se vuelve a leer para PyPDF2.
+- streaming: el multipart se genera por bloques desde el archivo en disco y
+  PyPDF2 lee desde un mmap del mismo archivo.
+
+Cada medición corre en un subproceso nuevo para que el pico de RSS sea
+independiente. Se reporta el RSS total y el RSS anónimo: las páginas del mmap
+cuentan en el RSS total mientras están mapeadas, pero son caché de archivo
+que el kernel recupera bajo presión; el RSS anónimo es la memoria que
+realmente crece con el tamaño del archivo. No necesita red: el cuerpo multipart se genera localmente con
+httpx igual que lo haría el cliente de Supabase.
+
+Uso:
+    python benchmarks/bench_upload_memory.py --sizes 25 100 300
+"""
+
+import io
+import os
+import sys
+import mmap
+import argparse
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def generate_pdf(path, size_mb, pages=40):
+    """
+    PDF tipo escaneado: cada página dibuja una imagen grande y tiene una línea
+    de texto. El tamaño total queda repartido entre las imágenes de las páginas.
+    """
+    side = max(16, int(((size_mb * 1024 * 1024) / pages) ** 0.5))
+    offsets = []
+    out = io.BytesIO()
+
+    def add_object(body):
+        offsets.append(out.tell())
+        out.write(f"{len(offsets)} 0 obj\n".encode())
+        out.write(body)
+        out.write(b"\nendobj\n")
+        return len(offsets)
+
+    out.write(b"%PDF-1.4\n")
+    add_object(b"<< /Type /Catalog /Pages 2 0 R >>")
+    add_object(b"")  # /Pages, se reescribe al final con los hijos
+    font = add_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for page_num in range(pages):
+        pixels = os.urandom(side * side)
+        image = add_object(
+            f"<< /Type /XObject /Subtype /Image /Width {side} /Height {side} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Length {len(pixels)} >>\nstream\n".encode()
+            + pixels
+            + b"\nendstream"
+        )
+        content = (
+            f"q 612 0 0 792 0 0 cm /Im1 Do Q BT /F1 12 Tf 72 720 Td "
+            f"(RESOLUCION {page_num:03d}.CP.2024 pagina {page_num}) Tj ET"
+        ).encode()
+        contents = add_object(
+            f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream"
+        )
+        page_ids.append(
+            add_object(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 {font} 0 R >> /XObject << /Im1 {image} 0 R >> >> "
+                f"/Contents {contents} 0 R >>".encode()
+            )
+        )
+
+    # Reescribir el objeto /Pages al final del archivo (xref apunta a la nueva posición)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    offsets[1] = out.tell()
+    out.write(f"2 0 obj\n<< /Type /Pages /Kids [{kids}] /Count {pages} >>\nendobj\n".encode())
+
+    xref_pos = out.tell()
+    out.write(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref_pos}\n%%EOF\n".encode()
+    )
+
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+
+
+def _peak_rss_mb():
+    # En Linux ru_maxrss está en KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _anon_rss_mb():
+    # Memoria anónima (heap, copias en bytes); excluye páginas del mmap, que
+    # son caché de archivo limpia y el kernel puede liberar sin escribir a disco
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class _AnonPeakSampler(threading.Thread):
+    """Muestrea RssAnon cada pocos milisegundos para obtener su pico."""
+
+    def __init__(self, interval=0.002):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _anon_rss_mb()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, _anon_rss_mb())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, _anon_rss_mb())
+        return self.peak
+
+
+def _drain_multipart(file_field):
+    import httpx
+
+    request = httpx.Request(
+        "POST",
+        "http://storage.invalid/object/documents/bench.pdf",
+        files={"file": ("bench.pdf", file_field, "application/pdf")},
+    )
+    sent = 0
+    for chunk in request.stream:  # type: ignore
+        sent += len(chunk)
+    return sent
+
+
+def run_mode(mode, path):
+    import httpx  # noqa: F401  (importar antes de tomar la línea base)
+    from PyPDF2 import PdfReader
+    from services.documents.treat_docs.info_documents_service import (
+        get_info_document,
+    )
+
+    baseline = _peak_rss_mb()
+    anon_baseline = _anon_rss_mb()
+    sampler = _AnonPeakSampler()
+    sampler.start()
+
+    if mode == "legacy":
+        # Ruta anterior: bytes completos para Storage y otra copia para PyPDF2
+        with open(path, "rb") as f:
+            data = f.read()
+        _drain_multipart(data)
+        reader = PdfReader(io.BytesIO(data))
+        for page in reader.pages:
+            page.extract_text()
+    elif mode == "streaming":
+        # Ruta actual: multipart por bloques desde disco y análisis sobre mmap
+        with open(path, "rb") as f:
+            _drain_multipart(f)
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped_file:
+            get_info_document(mapped_file, file_path=path)
+    else:
+        raise ValueError(mode)
+
+    anon_peak = sampler.stop()
+    print(f"{_peak_rss_mb() - baseline:.1f} {anon_peak - anon_baseline:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 100, 300])
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "PATH"))
+    args = parser.parse_args()
+
+    if args.run:
+        run_mode(*args.run)
+        return
+
+    print("Crecimiento del pico de memoria por carga (RSS total / RSS anónima, MB)")
+    print(f"{'tamaño (MB)':>12} {'legacy':>16} {'streaming':>16}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size_mb in args.sizes:
+            path = os.path.join(tmp_dir, f"bench_{size_mb}.pdf")
+            generate_pdf(path, size_mb)
+            results = {}
+            for mode in ("legacy", "streaming"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--run", mode, path],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                total, anon = output.stdout.strip().splitlines()[-1].split()
+                results[mode] = f"{float(total):.1f} / {float(anon):.1f}"
+            print(f"{size_mb:>12} {results['legacy']:>16} {results['streaming']:>16}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,12 @@ import json
 import bcrypt
 import os
 import pytz
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from models.database import SessionLocal
 from .database import Base, engine
 from .user import User
+from .chunk import Chunk  # noqa: F401  (create_all debe conocer la tabla)
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -26,6 +28,43 @@ ROLES_ADMINISTRADOR = json.loads(
 TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
 tz = pytz.timezone(TIME_ZONE)
 
+# create_all no modifica tablas existentes: las columnas e índices agregados
+# después de crear la base se aplican aquí (las sentencias deben ser idempotentes)
+SCHEMA_UPDATES = [
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_collection_hash ON documents (collection_name, content_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_path ON documents (path)",
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS resolution_name VARCHAR",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS number_resolution VARCHAR",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS resolve_page VARCHAR",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS considerations TEXT",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS copia TEXT",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS resolve TEXT",
+    "CREATE INDEX IF NOT EXISTS ix_documents_number_resolution ON documents (number_resolution)",
+    "ALTER TABLE metrics_extra_response ADD COLUMN IF NOT EXISTS prompt_version VARCHAR(16)",
+    "CREATE INDEX IF NOT EXISTS ix_metrics_extra_response_prompt_version ON metrics_extra_response (prompt_version)",
+    "ALTER TABLE metrics_extra_response ADD COLUMN IF NOT EXISTS cancelled BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE reindex_jobs ADD COLUMN IF NOT EXISTS swapped BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE reindex_jobs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+    # Fragmentos de documentos anteriores a la tabla chunks
+    """
+    INSERT INTO chunks (id, document_id, chunk_index, created_at)
+    SELECT uuids.id, d.id, uuids.position - 1, d.created_at
+    FROM documents d
+    CROSS JOIN LATERAL unnest(d.embeddings_uuids) WITH ORDINALITY AS uuids(id, position)
+    WHERE NOT EXISTS (SELECT 1 FROM chunks c WHERE c.document_id = d.id)
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+
+def apply_schema_updates():
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPDATES:
+            connection.execute(text(statement))
+
 
 # Crear tablas si no existen
 def init_db(reset=False):
@@ -35,6 +74,7 @@ def init_db(reset=False):
         print("Reiniciando la base de datos...")
         Base.metadata.drop_all(bind=engine)  # Elimina todas las tablas existentes
     Base.metadata.create_all(bind=engine)  # Crea las tablas si no existen
+    apply_schema_updates()  # Agrega columnas nuevas a tablas ya existentes
 
     # Verificar si ya existe un usuario administrador
     admin_user = db.query(User).filter(User.roles.op("@>")(["admin"])).first()
@@ -0,0 +1,42 @@
+import os
+import pytz
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from .database import Base
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.env")
+load_dotenv(dotenv_path)
+
+# Ahora puedes acceder a las variables de entorno
+TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
+
+
+class Chunk(Base):
+    __tablename__ = "chunks"  # Nombre de la tabla en la base de datos
+    __table_args__ = (
+        UniqueConstraint("document_id", "chunk_index", name="uq_chunks_document_index"),
+    )
+
+    id = Column(String(36), primary_key=True)  # Mismo id que en Chroma
+    document_id = Column(
+        Integer,
+        ForeignKey("documents.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    chunk_index = Column(Integer, nullable=False)
+    text_hash = Column(String(64), nullable=True, index=True)  # Clave del caché de embeddings
+    token_count = Column(Integer, nullable=True)
+    char_start = Column(Integer, nullable=True)  # Posición del fragmento en el texto
+    char_end = Column(Integer, nullable=True)
+    created_at = Column(
+        DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
+    )
+
+    document = relationship("Document", back_populates="chunks")
+
+    def __repr__(self):
+        return f"<Chunk(id={self.id}, document_id={self.document_id}, chunk_index={self.chunk_index})>"
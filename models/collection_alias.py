@@ -0,0 +1,30 @@
+import os
+import pytz
+from sqlalchemy import Column, String, DateTime
+from .database import Base
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.env")
+load_dotenv(dotenv_path)
+
+# Ahora puedes acceder a las variables de entorno
+TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
+
+
+class CollectionAlias(Base):
+    __tablename__ = "collection_aliases"  # Nombre de la tabla en la base de datos
+
+    # Nombre que usan la API y los documentos (Document.collection_name)
+    name = Column(String, primary_key=True)
+    # Colección de Chroma que responde hoy por ese nombre
+    physical_name = Column(String, nullable=False, unique=True)
+    # Modelo con el que se generaron los embeddings de la colección física
+    embedding_model = Column(String, nullable=False)
+    updated_at = Column(
+        DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
+    )
+
+    def __repr__(self):
+        return f"<CollectionAlias(name={self.name}, physical_name={self.physical_name}, embedding_model={self.embedding_model})>"
@@ -1,6 +1,6 @@
 import os
 import pytz
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
 from sqlalchemy.dialects.postgresql import ARRAY
 from .database import Base
 from sqlalchemy.orm import relationship
@@ -17,11 +17,17 @@ TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
 
 class Document(Base):
     __tablename__ = "documents"  # Nombre de la tabla en la base de datos
+    __table_args__ = (
+        # Un mismo contenido solo puede registrarse una vez por colección
+        UniqueConstraint(
+            "collection_name", "content_hash", name="uq_documents_collection_hash"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
     collection_name = Column(String, nullable=False)
-    path = Column(String, nullable=False)
+    path = Column(String, nullable=False, index=True)
     physical_path = Column(String, nullable=True)
     created_at = Column(
         DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
@@ -29,7 +35,18 @@ class Document(Base):
     updated_at = Column(
         DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
     )
+    # Reemplazada por la tabla chunks; se conserva para documentos antiguos
     embeddings_uuids = Column(ARRAY(String), default=list)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 del PDF
+
+    # Datos de la resolución, una sola vez por documento (no en cada fragmento)
+    resolution_name = Column(String, nullable=True)
+    number_resolution = Column(String, nullable=True, index=True)
+    resolve_page = Column(String, nullable=True)
+    considerations = Column(Text, nullable=True)
+    copia = Column(Text, nullable=True)
+    # Texto de la parte resolutiva; chunks.char_start/char_end son posiciones en él
+    resolve = Column(Text, nullable=True)
 
     requests = relationship(
         "RequestedDocument",
@@ -41,5 +58,12 @@ class Document(Base):
         "MetricExtraDocument", back_populates="document", cascade="all, delete-orphan"
     )
 
+    chunks = relationship(
+        "Chunk",
+        back_populates="document",
+        cascade="all, delete-orphan",
+        passive_deletes=True,  # La base de datos borra los fragmentos (ON DELETE CASCADE)
+    )
+
     def __repr__(self):
-        return f"<Document(id={self.id}, name={self.name}, collection_name={self.collection_name}, created_at={self.created_at}, embeddings_uuids={self.embeddings_uuids})>"
+        return f"<Document(id={self.id}, name={self.name}, collection_name={self.collection_name}, created_at={self.created_at})>"
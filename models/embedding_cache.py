@@ -0,0 +1,28 @@
+import os
+import pytz
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from .database import Base
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.env")
+load_dotenv(dotenv_path)
+
+# Ahora puedes acceder a las variables de entorno
+TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
+
+
+class EmbeddingCache(Base):
+    __tablename__ = "embedding_cache"  # Nombre de la tabla en la base de datos
+
+    model = Column(String, primary_key=True)  # Modelo de embeddings usado
+    text_hash = Column(String(64), primary_key=True)  # SHA-256 del texto normalizado
+    dimensions = Column(Integer, nullable=False)  # Longitud del vector
+    vector = Column(LargeBinary, nullable=False)  # float32 little-endian
+    created_at = Column(
+        DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
+    )
+
+    def __repr__(self):
+        return f"<EmbeddingCache(model={self.model}, text_hash={self.text_hash}, dimensions={self.dimensions})>"
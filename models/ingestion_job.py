@@ -0,0 +1,64 @@
+import os
+import enum
+import pytz
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
+from .database import Base
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.env")
+load_dotenv(dotenv_path)
+
+# Ahora puedes acceder a las variables de entorno
+TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
+
+
+# Estados posibles de un trabajo de ingesta
+class JobStatus(str, enum.Enum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+# Etapas del pipeline de ingesta, en orden
+class JobStage(str, enum.Enum):
+    spooled = "spooled"  # Archivo recibido y guardado en disco
+    uploaded = "uploaded"  # Archivo subido a Supabase Storage
+    registered = "registered"  # Documento registrado en la base de datos
+    processed = "processed"  # Fragmentos y embeddings guardados
+    completed = "completed"  # Métricas guardadas, trabajo terminado
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"  # Nombre de la tabla en la base de datos
+
+    id = Column(String, primary_key=True)  # UUID del trabajo
+    batch_id = Column(String, nullable=True, index=True)  # Lote de carga masiva
+    status = Column(Enum(JobStatus), default=JobStatus.pending, index=True)
+    stage = Column(Enum(JobStage), default=JobStage.spooled)
+    progress = Column(JSONB, default=dict)  # Progreso de la etapa actual
+    filename = Column(String, nullable=False)  # Nombre original del archivo
+    collection_name = Column(String, nullable=False)
+    content_type = Column(String, nullable=True)
+    spool_path = Column(String, nullable=False)  # Copia local del archivo
+    content_hash = Column(String(64), nullable=True)  # SHA-256 del archivo recibido
+    public_url = Column(String, nullable=True)
+    document_id = Column(
+        Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True
+    )
+    result = Column(JSONB, nullable=True)  # Respuesta final del trabajo
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String, nullable=True)  # Proceso que ejecuta el trabajo
+    created_at = Column(
+        DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
+    )
+    updated_at = Column(
+        DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
+    )  # También funciona como heartbeat del worker
+
+    def __repr__(self):
+        return f"<IngestionJob(id={self.id}, filename={self.filename}, status={self.status}, stage={self.stage})>"
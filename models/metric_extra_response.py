@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -14,6 +14,10 @@ class MetricExtraResponse(Base):
     number_tokens_response = Column(Integer, nullable=False)
     time_generating_response = Column(Float, nullable=False)
     time_searching_documents = Column(Float, nullable=False)
+    # Versión de la plantilla del prompt (compara prompt_eval_duration entre versiones)
+    prompt_version = Column(String(16), nullable=True, index=True)
+    # Generación interrumpida porque el cliente se desconectó
+    cancelled = Column(Boolean, nullable=False, default=False, server_default="false")
 
     metric = relationship("Metric", back_populates="response_metrics")
 
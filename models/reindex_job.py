@@ -0,0 +1,43 @@
+import os
+import pytz
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean
+from .database import Base
+from .ingestion_job import JobStatus
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../.env")
+load_dotenv(dotenv_path)
+
+# Ahora puedes acceder a las variables de entorno
+TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
+
+
+class ReindexJob(Base):
+    __tablename__ = "reindex_jobs"  # Nombre de la tabla en la base de datos
+
+    id = Column(String, primary_key=True)  # UUID del trabajo
+    collection_name = Column(String, nullable=False, index=True)  # Nombre lógico
+    source_collection = Column(String, nullable=False)  # Colección física actual
+    target_collection = Column(String, nullable=False)  # Colección sombra
+    source_model = Column(String, nullable=False)
+    target_model = Column(String, nullable=False)
+    status = Column(Enum(JobStatus), default=JobStatus.pending, index=True)
+    offset = Column(Integer, default=0)  # Checkpoint: fragmentos ya leídos del origen
+    total = Column(Integer, default=0)  # Fragmentos en el origen al iniciar
+    processed = Column(Integer, default=0)  # Fragmentos escritos en la sombra
+    # Alias ya cambiado: falta copiar las escrituras tardías y borrar el origen
+    swapped = Column(Boolean, nullable=False, default=False)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String, nullable=True)
+    created_at = Column(
+        DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
+    )
+    updated_at = Column(
+        DateTime, default=lambda: datetime.now(pytz.timezone(TIME_ZONE))
+    )  # También funciona como heartbeat
+
+    def __repr__(self):
+        return f"<ReindexJob(id={self.id}, collection_name={self.collection_name}, status={self.status}, processed={self.processed}/{self.total})>"
@@ -1,7 +1,10 @@
 # routes/routes_documents.py
 import os
 import time
+import uuid
+import asyncio
 import traceback
+from typing import List, Optional
 from sqlalchemy.orm import Session
 from models.database import get_db
 from models.document import Document
@@ -12,15 +15,49 @@ from fastapi import (
     Form,
     UploadFile,
     HTTPException,
+    WebSocket,
+    WebSocketDisconnect,
 )
 from fastapi.responses import JSONResponse
-from models.supabase_client import get_client_supabase
-from services.helpers.system_usage import get_system_usage
-from services.helpers.clean_filename import clean_filename
-from services.helpers.return_collection import return_collection, get_list_collections
-from services.documents.save_docs.upload_service import save_document
-from services.documents.save_docs.process_any_document_service import process_pdf
-from services.metrics.save_metrics.save_metrics_docs import save_metrics_docs
+from models.ingestion_job import JobStatus
+from services.helpers.return_collection import get_list_collections
+from services.documents.save_docs.spool_service import (
+    spool_upload,
+    spool_stream,
+    is_zip_upload,
+    iter_zip_pdfs,
+)
+from services.documents.ingestion.job_service import (
+    create_job,
+    get_job,
+    get_batch_summary,
+    touch_jobs,
+)
+from services.documents.ingestion.job_worker import enqueue_job, WORKER_ID
+from services.documents.ingestion.bulk_pipeline import (
+    BULK_HEARTBEAT_INTERVAL,
+    start_bulk_pipeline,
+)
+from services.documents.save_docs.move_document_service import (
+    copy_chunks_to_collection,
+    delete_chunks_from_collection,
+)
+from services.documents.save_docs.chunk_service import get_chunk_ids
+from services.documents.delete_docs.delete_service import (
+    delete_document_chunks,
+    delete_document_storage,
+    delete_collection_bulk,
+)
+from services.embeddings.get_embedding_service import MODEL_EMBEDDING
+from services.embeddings.reindex_service import (
+    create_reindex_jobs,
+    get_reindex_job,
+    start_reindex,
+)
+
+JOB_WS_POLL_INTERVAL = 1  # Segundos entre consultas del estado del trabajo
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "1000"))
+BULK_MAX_FILE_MB = int(os.getenv("BULK_MAX_FILE_MB", "100"))
 
 router = APIRouter()
 
@@ -51,185 +88,236 @@ async def list_collections():
         return {"message": "No collections found."}
 
 
+@router.post("/collections/reindex")
+async def reindex_collections(
+    collection_name: Optional[str] = Form(None),
+    embedding_model: Optional[str] = Form(None),
+):
+    """
+    Reconstruye los embeddings de las colecciones con otro modelo (por defecto
+    MODEL_EMBEDDING). Las consultas siguen usando el índice anterior hasta que
+    cada colección termina y se cambia su alias.
+    """
+    jobs = await asyncio.to_thread(
+        create_reindex_jobs,
+        [collection_name] if collection_name else None,
+        embedding_model or MODEL_EMBEDDING,
+    )
+    if not jobs:
+        return {
+            "status": "Nothing to do",
+            "message": "Las colecciones ya usan ese modelo o tienen una migración en curso.",
+        }
+
+    start_reindex([job["job_id"] for job in jobs])
+    return JSONResponse(
+        {
+            "status": "Queued",
+            "jobs": jobs,
+            "message": f"Se reindexarán {len(jobs)} colecciones en segundo plano.",
+        },
+        status_code=202,
+    )
+
+
+@router.get("/collections/reindex/{job_id}")
+async def get_reindex_status(job_id: str):
+    job = await asyncio.to_thread(get_reindex_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
 @router.post("/document")
 async def document_post(
     collection_name: str = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
 ):
     start_time = time.time()
 
-    # Medición inicial de recursos
-    initial_cpu, initial_memory = get_system_usage()
-
     try:
         print(
             f"[rt_documents] Datos recibidos: collection_name={collection_name}, file={file.filename}"
         )
 
-        # Generar un nombre único para el archivo en Supabase
         if file.filename is None:
             raise HTTPException(status_code=400, detail="Filename is missing")
 
-        cleaned_filename = clean_filename(file.filename.replace(" ", "_"))
-        storage_path = f"{collection_name}/{cleaned_filename}"
-
-        # Verificar si el archivo ya existe en la colección
-        client_supabase = get_client_supabase()
-        response = client_supabase.storage.from_("documents").list(collection_name)
-        existing_files = [item["name"] for item in response if "name" in item]
-
-        if cleaned_filename in existing_files:
-            elapsed_time = time.time() - start_time
-            return JSONResponse(
-                {
-                    "status": "Documento existente en la colección",
-                    "filename": file.filename,
-                    "message": f"Este documento ya está registrado en la colección '{collection_name}'.",
-                    "execution_time": elapsed_time,
-                }
-            )
-
-        save_start = time.time()
-
-        # Subir el archivo a Supabase Storage
-        upload_start = time.time()
-        response = client_supabase.storage.from_("documents").upload(
-            storage_path,
-            await file.read(),
-            file_options={"Content-Type": f"{file.content_type}"},  # type: ignore
+        # Guardar el archivo en disco y registrar el trabajo de ingesta
+        job_id = str(uuid.uuid4())
+        spool_path, content_hash = await asyncio.to_thread(spool_upload, file, job_id)
+        await asyncio.to_thread(
+            create_job,
+            job_id,
+            file.filename,
+            collection_name,
+            file.content_type,
+            spool_path,
+            content_hash=content_hash,
         )
-        upload_time = time.time() - upload_start
-
-        print("[rt_documents] response: ", response)
-
-        if not response.full_path:
-            elapsed_time = time.time() - start_time
-            return JSONResponse(
-                {
-                    "status": "Error",
-                    "message": f"No se pudo subir el archivo '{file.filename}'.",
-                    "execution_time": elapsed_time,
-                }
-            )
+        enqueue_job(job_id)
 
-        # Obtener la URL pública del archivo
-        public_url = client_supabase.storage.from_("documents").get_public_url(
-            storage_path
+        # Retornar el id del trabajo sin esperar el procesamiento
+        return JSONResponse(
+            {
+                "status": "Queued",
+                "job_id": job_id,
+                "filename": file.filename,
+                "collection_name": collection_name,
+                "status_url": f"/document/jobs/{job_id}",
+                "execution_time": time.time() - start_time,
+                "message": "El archivo se recibió y se procesará en segundo plano.",
+            },
+            status_code=202,
         )
-        print("[public_url] ", public_url)
-
-        if not public_url:
-            elapsed_time = time.time() - start_time
-            final_cpu, final_memory = get_system_usage()
-            return JSONResponse(
-                {
-                    "status": "Error",
-                    "message": "No se pudo guardar el archivo.",
-                    "execution_time": elapsed_time,
-                    "cpu_usage": {"initial": initial_cpu, "final": final_cpu},
-                    "memory_usage": {"initial": initial_memory, "final": final_memory},
-                }
-            )
 
-        result = await save_document(
-            file, collection_name, public_url, physical_path=None
+    except Exception as e:
+        elapsed_time = time.time() - start_time
+        print(f"Error en document_post: {e}")
+        print("Traceback completo:")
+        traceback.print_exc()
+        return JSONResponse(
+            {
+                "status": "Error",
+                "message": "Ocurrió un error procesando el archivo.",
+                "execution_time": elapsed_time,
+            }
         )
 
-        if result is None:
-            elapsed_time = time.time() - start_time
-            final_cpu, final_memory = get_system_usage()
-            return JSONResponse(
-                {
-                    "status": "Error",
-                    "message": "No se pudo guardar el archivo.",
-                    "execution_time": elapsed_time,
-                    "cpu_usage": {"initial": initial_cpu, "final": final_cpu},
-                    "memory_usage": {"initial": initial_memory, "final": final_memory},
-                }
-            )
-        document = result
-        save_time = time.time() - save_start
 
-        # Medir recursos después de guardar
-        save_cpu, save_memory = get_system_usage()
+@router.get("/document/jobs/{job_id}")
+async def get_document_job(job_id: str):
+    job = await asyncio.to_thread(get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
 
-        print("[rt_documents] file_path: ", public_url)
-        print("[rt_documents] document: ", document)
 
-        # Medir recursos después del procesamiento
-        process_cpu, process_memory = get_system_usage()
-
-        # Simular el procesamiento del documento
-        process_start = time.time()
-        doc_len, chunk_len = process_pdf(
-            file, public_url, collection_name, document.id  # type: ignore
+@router.websocket("/document/jobs/{job_id}/ws")
+async def document_job_websocket(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    last_sent = None
+    try:
+        while True:
+            job = await asyncio.to_thread(get_job, job_id)
+            if not job:
+                await websocket.send_json({"error": "Trabajo no encontrado"})
+                break
+
+            # Solo enviar cuando el estado cambia
+            if job != last_sent:
+                await websocket.send_json(job)
+                last_sent = job
+
+            if job["status"] in (JobStatus.completed.value, JobStatus.failed.value):
+                break
+            await asyncio.sleep(JOB_WS_POLL_INTERVAL)
+        await websocket.close()
+    except WebSocketDisconnect:
+        print(f"[rt_documents] Cliente desconectado del trabajo {job_id}")
+
+
+def _spool_bulk_files(files, collection_name, batch_id):
+    """
+    Guarda en disco cada PDF (o cada PDF dentro de un ZIP) y crea su trabajo.
+    Los trabajos se crean ya tomados por este proceso para que el barrido no
+    los procese por separado antes de que arranque el lote.
+    """
+    job_ids = []
+    last_touch = time.time()
+
+    def register(filename, content_type, stream):
+        nonlocal last_touch
+        if len(job_ids) >= BULK_MAX_FILES:
+            raise ValueError(f"Se excede el máximo de {BULK_MAX_FILES} archivos por lote.")
+        job_id = str(uuid.uuid4())
+        spool_path, content_hash = spool_stream(stream, job_id)
+        create_job(
+            job_id,
+            filename,
+            collection_name,
+            content_type,
+            spool_path,
+            batch_id=batch_id,
+            content_hash=content_hash,
+            worker_id=WORKER_ID,
         )
+        job_ids.append(job_id)
+        if time.time() - last_touch >= BULK_HEARTBEAT_INTERVAL:
+            # Un lote grande puede tardar en recibirse
+            touch_jobs(job_ids, WORKER_ID)
+            last_touch = time.time()
 
-        process_time = time.time() - process_start
+    for file in files:
+        if file.filename is None:
+            continue
+        if is_zip_upload(file):
+            for filename, member in iter_zip_pdfs(
+                file, BULK_MAX_FILES, BULK_MAX_FILE_MB * 1024 * 1024
+            ):
+                register(filename, "application/pdf", member)
+        else:
+            file.file.seek(0)
+            register(file.filename, file.content_type, file.file)
 
-        # Medición de recursos después del procesamiento
-        final_cpu, final_memory = get_system_usage()
-        total_time = time.time() - start_time
+    return job_ids
 
-        # Preparar datos de métricas
-        execution_times = {
-            "upload_time": upload_time,
-            "process_time": process_time,
-            "total_time": total_time,
-            "save_time": save_time,
-        }
-        cpu_usage = {
-            "initial": initial_cpu,
-            "save": save_cpu,
-            "process": process_cpu,
-            "final": final_cpu,
-        }
 
-        memory_usage = {
-            "initial": initial_memory,
-            "save": save_memory,
-            "process": process_memory,
-            "final": final_memory,
-        }
+@router.post("/documents/bulk")
+async def documents_bulk_post(
+    collection_name: str = Form(...),
+    files: List[UploadFile] = File(...),
+):
+    start_time = time.time()
 
-        save_metrics_docs(
-            db, document.id, execution_times, cpu_usage, memory_usage  # type: ignore
+    try:
+        print(
+            f"[rt_documents] Carga masiva: collection_name={collection_name}, archivos={len(files)}"
+        )
+        batch_id = str(uuid.uuid4())
+        job_ids = await asyncio.to_thread(
+            _spool_bulk_files, files, collection_name, batch_id
         )
+        if not job_ids:
+            raise HTTPException(status_code=400, detail="No se recibieron archivos PDF")
+
+        start_bulk_pipeline(batch_id, job_ids, collection_name)
 
-        # Retornar respuesta exitosa
         return JSONResponse(
             {
-                "status": "Successfully Uploaded",
-                "filename": file.filename,
+                "status": "Queued",
+                "batch_id": batch_id,
+                "job_ids": job_ids,
                 "collection_name": collection_name,
-                "file_url": public_url,
-                "doc_len": doc_len,
-                "chunks": chunk_len,
-                "execution_times": execution_times,
-                "cpu_usage": cpu_usage,
-                "memory_usage": memory_usage,
-                "message": "El archivo se subió y procesó correctamente.",
-            }
+                "status_url": f"/document/batches/{batch_id}",
+                "execution_time": time.time() - start_time,
+                "message": f"Se recibieron {len(job_ids)} documentos y se procesarán en segundo plano.",
+            },
+            status_code=202,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        elapsed_time = time.time() - start_time
-        final_cpu, final_memory = get_system_usage()
-        print(f"Error en document_post: {e}")
-        print("Traceback completo:")
+        print(f"Error en documents_bulk_post: {e}")
         traceback.print_exc()
         return JSONResponse(
             {
                 "status": "Error",
-                "message": "Ocurrió un error procesando el archivo.",
-                "execution_time": elapsed_time,
-                "cpu_usage": {"initial": initial_cpu, "final": final_cpu},
-                "memory_usage": {"initial": initial_memory, "final": final_memory},
+                "message": f"Ocurrió un error recibiendo los archivos: {e}",
+                "execution_time": time.time() - start_time,
             }
         )
 
 
+@router.get("/document/batches/{batch_id}")
+async def get_document_batch(batch_id: str):
+    summary = await asyncio.to_thread(get_batch_summary, batch_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return summary
+
+
 @router.put("/edit_document/{document_id}")
 async def edit_document(
     document_id: int,
@@ -254,28 +342,43 @@ async def edit_document(
         print("No encuentra el documento")
         raise HTTPException(status_code=404, detail="Documento no encontrado")
 
-    # Obtener el path actual del documento
-    old_path = document.path
+    old_collection_name = str(document.collection_name)
+    chunk_ids = get_chunk_ids(document.id, db)  # type: ignore
+    moving = old_collection_name != collection_name and bool(chunk_ids)
+    committed = False
 
     # Actualizar los valores del documento con los nuevos datos
     try:
+        # Copiar los fragmentos a la colección nueva antes de confirmar el cambio.
+        # Mientras existan en ambas, las consultas los cuentan una sola vez
+        if moving:
+            copied = await asyncio.to_thread(
+                copy_chunks_to_collection,
+                chunk_ids,
+                old_collection_name,
+                collection_name,
+            )
+            print(
+                f"[edit_document] {copied} fragmentos copiados de '{old_collection_name}' a '{collection_name}'"
+            )
+
         # Actualizar campos
         document.name = name  # type: ignore
         document.collection_name = collection_name  # type: ignore
         document.created_at = created_at  # type: ignore
-
-        # Actualizar el campo 'path' basándose en el nuevo 'name'
-        new_path = f"./documents/{name}"
-        document.path = new_path  # type: ignore # El nuevo path basado en el nombre recibido
-        # Renombrar el archivo físico si el nombre del documento ha cambiado
-        if str(old_path) != str(new_path) and os.path.exists(str(old_path)):
-            # Renombrar el archivo físico en el sistema
-            os.rename(str(old_path), str(new_path))
+        # 'path' es la URL pública del objeto en Storage: no cambia con el nombre
 
         # Guardar los cambios en la base de datos
         db.commit()
+        committed = True
         db.refresh(document)  # Recargar el documento actualizado
 
+        # Con el documento ya en la colección nueva, quitar los originales
+        if moving:
+            await asyncio.to_thread(
+                delete_chunks_from_collection, chunk_ids, old_collection_name
+            )
+
         # Retornar respuesta exitosa
         return {
             "status": "Successfully Updated",
@@ -288,6 +391,11 @@ async def edit_document(
         }
     except Exception as e:
         db.rollback()  # Si ocurre un error, deshacer los cambios
+        if moving and not committed:
+            # Quitar las copias para que el documento quede solo en su colección
+            await asyncio.to_thread(
+                delete_chunks_from_collection, chunk_ids, collection_name
+            )
         raise HTTPException(
             status_code=500,
             detail="Error al actualizar el documento. Intente nuevamente.",
@@ -312,30 +420,19 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
         if os.path.exists(str(document.path)):
             os.remove(str(document.path))
 
-        if document.embeddings_uuids:  # type: ignore
-            print("[rt_documents] ingresa en el condicional")
-            collection = return_collection(document.collection_name)
-
-            # collection = return_collection(document.collection_name)
-            print(f"[rt_documents] collection: {collection}")
-            embeddings_to_delete = document.embeddings_uuids
-            print(f"[rt_documents] embeddings_to_delete: {embeddings_to_delete}")
-
-            for id_embedding in embeddings_to_delete:
-                try:
-                    if collection is not None:
-                        collection.delete(ids=id_embedding)  # type: ignore
-                        print(
-                            f"Embeddings con ID {id_embedding} eliminado exitosamente."
-                        )
-                    else:
-                        print(f"Collection not found for document {document.id}")
-                except Exception as e:
-                    print(f"Error al eliminar embedding con ID {id_embedding}: {e}")
+        if get_chunk_ids(document.id, db):  # type: ignore
+            # Un solo borrado por lotes con todos los ids del documento
+            deleted_chunks = await asyncio.to_thread(delete_document_chunks, document)
+            print(f"[rt_documents] {deleted_chunks} fragmentos eliminados")
         else:
-            raise HTTPException(
-                status_code=404, detail="Embeddings no encontrados para el documento"
-            )
+            # Documento de una ingesta que no llegó a indexarse: se elimina igual
+            print(f"[rt_documents] El documento {document_id} no tiene fragmentos")
+
+        # Eliminar el archivo en Storage si ningún otro documento lo comparte
+        try:
+            await asyncio.to_thread(delete_document_storage, document)
+        except Exception as e:
+            print(f"[rt_documents] No se pudo eliminar el archivo en Storage: {e}")
 
         # Eliminar el registro de la base de datos
         db.delete(document)
@@ -354,3 +451,30 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
         )
     finally:
         db.close()
+
+
+@router.delete("/collections/{collection_name}")
+async def delete_collection_endpoint(collection_name: str, truncate: bool = False):
+    """
+    Elimina una colección completa con sus documentos y archivos. Con
+    truncate=true la colección se conserva vacía.
+    """
+    if collection_name not in await asyncio.to_thread(get_list_collections):
+        raise HTTPException(status_code=404, detail="Colección no encontrada")
+
+    start_time = time.time()
+    try:
+        summary = await asyncio.to_thread(
+            delete_collection_bulk, collection_name, truncate
+        )
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=500, detail=f"Error al eliminar la colección: {str(e)}"
+        )
+
+    return {
+        "status": "Successfully Truncated" if truncate else "Successfully Deleted",
+        **summary,
+        "execution_time": time.time() - start_time,
+    }
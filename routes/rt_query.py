@@ -6,15 +6,24 @@ import json
 import uuid
 import pytz
 import asyncio
-from sqlalchemy.orm import Session
-from models.database import SessionLocal
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from services.helpers.system_usage import get_system_usage
-from services.documents.obtain_docs.context_sources_service import get_context_sources
+from services.helpers.single_flight import normalize_query, fingerprint
+from services.documents.obtain_docs.context_sources_service import (
+    get_context_sources_shared,
+)
 from services.query.ollama.ollama_generator import ollama_generator
+from services.query.ollama.response_buffer import (
+    start_response_stream,
+    get_response_stream,
+    relay_response,
+    reject_resume,
+)
+from services.query.ollama.stream_output import StreamWriter, negotiate_framing
+from services.ollama.model_residency_service import preload_chat_model
 from services.query.formatted.formatted_history import formatted_history
 from services.query.formatted.formatted_sources import formatted_sources
 from services.query.formatted.formatted_context import formatted_context
@@ -93,6 +102,8 @@ class QueryModel(BaseModel):
     use_considerations: bool
     n_documents: int
     word_list: List[str]
+    # Modelo que usará la respuesta; se precarga mientras se buscan los documentos
+    model_name: Optional[str] = None
 
 
 class FeedbackQueryModel(BaseModel):
@@ -223,8 +234,11 @@ async def context_sources(query_model: QueryModel):
     n_documents = query_model.n_documents
     word_list = query_model.word_list
 
+    preload_chat_model(query_model.model_name)
+
     search_documents_start = time.time()
-    response = get_context_sources(query, word_list, n_documents)
+    # En un hilo: la carga del modelo avanza en el event loop durante la búsqueda
+    response = await get_context_sources_shared(query, word_list, n_documents)
     search_documents_time = time.time() - search_documents_start
     context_to_send = response.get("context", "No hay contexto disponible")
     sources_to_send = response.get("sources", "No hay fuentes disponibles")
@@ -283,18 +297,65 @@ async def websocket_endpoint(websocket: WebSocket):
 
     user_session_uuid = None
     cancel_event = asyncio.Event()
+    # Framing acordado al conectar: ?framing=json (por defecto) o ?framing=msgpack
+    framing = negotiate_framing(websocket.query_params.get("framing"))
+    writer = StreamWriter(websocket, framing)
+    print(f"[rt_query] Framing del websocket: {framing}")
+
+    incoming = asyncio.Queue()
+
+    async def read_messages():
+        # Lee el socket todo el tiempo: la desconexión se detecta también mientras
+        # se genera una respuesta
+        try:
+            while True:
+                incoming.put_nowait(await websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            cancel_event.set()
+            incoming.put_nowait(None)
+
+    reader = asyncio.create_task(read_messages())
+
+    async def follow_response(stream, offset):
+        relay = asyncio.create_task(relay_response(stream, writer, offset))
+        disconnected = asyncio.create_task(cancel_event.wait())
+        await asyncio.wait({relay, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        disconnected.cancel()
+        if cancel_event.is_set():
+            # El cliente se fue: la generación sigue un tiempo por si se reconecta
+            # y se aborta (junto con el stream de Ollama) si nadie vuelve
+            relay.cancel()
+            await asyncio.gather(relay, return_exceptions=True)
+            raise WebSocketDisconnect()
+        await relay
 
     try:
 
-        db: Session = SessionLocal()
-        initial_cpu, initial_memory = get_system_usage()
+        initial_cpu, initial_memory = get_system_usage(interval=None)
 
         while True:
             # Recibiendo el mensaje del cliente (Streamlit)
-            data = await websocket.receive_text()
+            data = await incoming.get()
+            if data is None:
+                raise WebSocketDisconnect()
 
             message_data = json.loads(data)
 
+            if "resume" in message_data:
+                # Reconexión: {"resume": response_uuid, "offset": caracteres recibidos}
+                response_uuid = message_data["resume"]
+                offset = int(message_data.get("offset", 0))
+                stream = get_response_stream(response_uuid, offset)
+                print(f"[rt_query] Reanudando {response_uuid} desde {offset}")
+                if stream is None:
+                    await reject_resume(response_uuid, writer)
+                else:
+                    user_session_uuid = stream.session_id
+                    await follow_response(stream, offset)
+                continue
+
             user_session_uuid = message_data["user_session_uuid"]
             model_name = message_data.get("model_name")
             use_considerations = message_data.get("use_considerations")
@@ -332,26 +393,37 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 response_uuid = str(uuid.uuid4())
 
-                async for chunk in ollama_generator(
-                    db,
-                    query,
-                    model_name,
-                    historial_interactions,
-                    context,
+                def make_chunks(generation_cancel_event):
+                    return ollama_generator(
+                        query,
+                        model_name,
+                        historial_interactions,
+                        context,
+                        sources,
+                        considerations,
+                        search_documents_time,
+                        use_considerations,
+                        initial_cpu,
+                        initial_memory,
+                        generation_cancel_event,
+                    )
+
+                # Preguntas idénticas con el mismo material, historial y modelo
+                # comparten una sola generación
+                generation_key = fingerprint(
+                    normalize_query(query),
                     sources,
-                    considerations,
-                    search_documents_time,
-                    use_considerations,
-                    initial_cpu,
-                    initial_memory,
-                    cancel_event,
-                ):
-                    response_chunk = {
-                        "response_uuid": response_uuid,
-                        "content": chunk,
-                    }
-                    # Enviar cada fragmento al cliente con el mismo ID
-                    await websocket.send_text(json.dumps(response_chunk))
+                    context,
+                    considerations if use_considerations else None,
+                    historial_interactions[:-1],
+                    model_name,
+                )
+
+                # La generación corre aparte y guarda lo generado para reconexiones
+                stream = start_response_stream(
+                    response_uuid, user_session_uuid, make_chunks, key=generation_key
+                )
+                await follow_response(stream, 0)
     except WebSocketDisconnect:
         print("Disconnected client")
         cancel_event.set()
@@ -374,7 +446,8 @@ async def websocket_endpoint(websocket: WebSocket):
         print(traceback.format_exc())
         cancel_event.set()
     finally:
-        db.close()
+        reader.cancel()
+        writer.discard()
 
 
 # @router.post("/ai")
@@ -5,8 +5,22 @@ from models.database import get_db
 from models.document import Document
 from models.metric import Metric
 from models.metric_extra_document import MetricExtraDocument
+from models.metric_extra_response import MetricExtraResponse
 from models.requested_document import RequestedDocument
 from fastapi import APIRouter, Depends
+from services.documents.save_docs.chunk_service import get_chunk_stats
+from services.embeddings.get_embedding_service import embedding_scheduler
+from services.embeddings.embedding_cache_service import cache_stats
+from services.ollama.ollama_client_service import get_ollama_client_stats
+from services.query.ollama.generation_scheduler import generation_scheduler
+from services.query.ollama.stream_output import get_stream_output_stats
+from services.query.ollama.response_buffer import get_response_buffer_stats
+from services.documents.obtain_docs.context_sources_service import context_sources_flight
+from services.metrics.save_metrics.metrics_recorder import get_metrics_recorder_stats
+from services.ollama.model_residency_service import (
+    sync_resident_models,
+    get_model_residency_stats,
+)
 
 router = APIRouter()
 
@@ -295,3 +309,120 @@ async def get_resources_usage(limit: int = 5, db: Session = Depends(get_db)):
         }
         for row in resources_usage
     ]
+
+
+@router.get("/documents/chunk_stats")
+async def get_documents_chunk_stats(
+    limit: int = 100, offset: int = 0, db: Session = Depends(get_db)
+):
+    # Fragmentos y tokens por documento, desde la tabla chunks
+    return get_chunk_stats(db, limit=limit, offset=offset)
+
+
+@router.get("/responses/prompt_eval_by_version")
+async def get_prompt_eval_by_version(db: Session = Depends(get_db)):
+    # Evaluación del prompt por versión de plantilla (duraciones en ns de Ollama)
+    # Las respuestas anteriores a la columna usaban la plantilla v1
+    version = func.coalesce(MetricExtraResponse.prompt_version, "v1")
+    rows = (
+        db.query(
+            version,
+            func.count(MetricExtraResponse.id),
+            func.avg(MetricExtraResponse.time_evaluating_prompt),
+            func.avg(MetricExtraResponse.number_tokens_prompt),
+            func.avg(MetricExtraResponse.load_model_duration),
+        )
+        .filter(MetricExtraResponse.cancelled.is_(False))
+        .group_by(version)
+        .all()
+    )
+    return [
+        {
+            "prompt_version": row[0],
+            "responses": row[1],
+            "avg_prompt_eval_duration": float(row[2] or 0),
+            "avg_prompt_tokens": float(row[3] or 0),
+            "avg_load_duration": float(row[4] or 0),
+        }
+        for row in rows
+    ]
+
+
+@router.get("/responses/cancellations")
+async def get_response_cancellations(db: Session = Depends(get_db)):
+    # Respuestas completas frente a generaciones cortadas por desconexión
+    rows = (
+        db.query(
+            MetricExtraResponse.cancelled,
+            func.count(MetricExtraResponse.id),
+            func.avg(MetricExtraResponse.number_tokens_response),
+            func.avg(Metric.total_time),
+        )
+        .join(Metric, MetricExtraResponse.metric_id == Metric.id)
+        .group_by(MetricExtraResponse.cancelled)
+        .all()
+    )
+    result = {"completed": None, "cancelled": None}
+    for cancelled, count, avg_tokens, avg_time in rows:
+        result["cancelled" if cancelled else "completed"] = {
+            "responses": count,
+            "avg_tokens": float(avg_tokens or 0),
+            "avg_total_time": float(avg_time or 0),
+        }
+    return result
+
+
+@router.get("/embeddings/stats")
+async def get_embeddings_stats():
+    # Colas del planificador de embeddings y efectividad del caché
+    return {
+        "scheduler": embedding_scheduler.stats(),
+        "cache": dict(cache_stats),
+    }
+
+
+@router.get("/ollama/connections")
+async def get_ollama_connections():
+    # Reutilización de conexiones de los clientes compartidos de Ollama
+    return get_ollama_client_stats()
+
+
+@router.get("/ollama/models")
+async def get_ollama_models():
+    # Modelos residentes según este proceso, ajustados con lo que reporta Ollama
+    await sync_resident_models()
+    return get_model_residency_stats()
+
+
+@router.get("/generation/queue")
+async def get_generation_queue():
+    # Generaciones activas, cola por sesión y rechazos por el SLO de espera
+    return generation_scheduler.stats()
+
+
+@router.get("/generation/streams")
+async def get_generation_streams():
+    # Respuestas en curso o recientes guardadas para reconexiones
+    return get_response_buffer_stats()
+
+
+@router.get("/generation/single_flight")
+async def get_generation_single_flight():
+    # Solicitudes idénticas que compartieron búsqueda o generación
+    streams = get_response_buffer_stats()
+    return {
+        "get_sources": context_sources_flight.stats(),
+        "generations": {"started": streams["started"], "shared": streams["shared"]},
+    }
+
+
+@router.get("/generation/stream_output")
+async def get_generation_stream_output():
+    # Frames y bytes por respuesta enviados por el websocket
+    return get_stream_output_stats()
+
+
+@router.get("/metrics/recorder")
+async def get_metrics_recorder():
+    # Métricas de respuesta pendientes y guardadas por lotes
+    return get_metrics_recorder_stats()
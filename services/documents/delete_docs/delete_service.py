@@ -0,0 +1,187 @@
+from models.database import get_db
+from models.document import Document
+from models.collection_alias import CollectionAlias
+from models.requested_document import RequestedDocument
+from models.metric_extra_document import MetricExtraDocument
+from models.supabase_client import get_client_supabase
+from services.documents.save_docs.storage_service import (
+    STORAGE_LIST_PAGE_SIZE,
+    list_storage_files,
+    public_url_from_path,
+    storage_path_from_url,
+    remove_from_storage,
+)
+from services.documents.save_docs.chunk_service import get_chunk_ids
+from services.documents.save_docs.move_document_service import (
+    delete_chunks_from_collection,
+)
+from services.nr_database.nr_connection_service import (
+    create_collection,
+    delete_collection,
+)
+from services.nr_database.collection_alias_service import (
+    resolve_alias,
+    invalidate_aliases,
+)
+
+
+def _delete_document_rows(db, document_ids):
+    """Borra en bloque los documentos y sus filas dependientes."""
+    if not document_ids:
+        return 0
+    db.query(RequestedDocument).filter(
+        RequestedDocument.document_id.in_(document_ids)
+    ).delete(synchronize_session=False)
+    db.query(MetricExtraDocument).filter(
+        MetricExtraDocument.document_id.in_(document_ids)
+    ).delete(synchronize_session=False)
+    return (
+        db.query(Document)
+        .filter(Document.id.in_(document_ids))
+        .delete(synchronize_session=False)
+    )
+
+
+def _unshared_storage_paths(db, candidate_urls, deleted_ids):
+    """
+    Rutas de Storage que ningún otro documento usa. Un documento reutilizado
+    desde otra colección comparte el archivo con el original.
+
+    :param candidate_urls: {ruta en el bucket: URLs públicas con que se guarda}.
+    """
+    if not candidate_urls:
+        return []
+    paths_by_url = {
+        url: storage_path
+        for storage_path, urls in candidate_urls.items()
+        for url in urls
+    }
+    urls = list(paths_by_url)
+    still_used = set()
+    # Document.path está indexado: solo se leen las filas que usan los candidatos
+    for batch_start in range(0, len(urls), STORAGE_LIST_PAGE_SIZE):
+        rows = db.query(Document.path).filter(
+            Document.path.in_(urls[batch_start : batch_start + STORAGE_LIST_PAGE_SIZE]),
+            ~Document.id.in_(deleted_ids),
+        )
+        still_used.update(paths_by_url[path] for (path,) in rows)
+    return sorted(set(candidate_urls) - still_used)
+
+
+def delete_document_storage(document):
+    """Elimina el archivo del documento en Storage si ningún otro documento lo usa."""
+    storage_path = storage_path_from_url(document.path)
+    if storage_path is None:
+        return 0
+    db = next(get_db())
+    try:
+        candidate_urls = {
+            storage_path: {
+                document.path,
+                public_url_from_path(get_client_supabase(), storage_path),
+            }
+        }
+        paths = _unshared_storage_paths(db, candidate_urls, [document.id])
+    finally:
+        db.close()
+    return remove_from_storage(get_client_supabase(), paths) if paths else 0
+
+
+def delete_collection_bulk(collection_name: str, truncate=False):
+    """
+    Elimina una colección completa: fragmentos en Chroma, documentos en la base
+    de datos y archivos en Storage, todo en operaciones por lotes.
+
+    :param truncate: Si es True, la colección queda registrada y vacía.
+    :return: Resumen de lo eliminado.
+    """
+    alias = resolve_alias(collection_name)
+    db = next(get_db())
+    try:
+        documents = (
+            db.query(Document.id, Document.path)
+            .filter(Document.collection_name == collection_name)
+            .all()
+        )
+        document_ids = [document.id for document in documents]
+
+        # Archivos de la carpeta de la colección y los que apuntan los documentos
+        client_supabase = get_client_supabase()
+        candidate_urls = {}
+        for name in list_storage_files(client_supabase, collection_name):
+            storage_path = f"{collection_name}/{name}"
+            candidate_urls[storage_path] = {
+                public_url_from_path(client_supabase, storage_path)
+            }
+        for document in documents:
+            storage_path = storage_path_from_url(document.path)
+            if storage_path:
+                candidate_urls.setdefault(storage_path, set()).update(
+                    {document.path, public_url_from_path(client_supabase, storage_path)}
+                )
+        storage_paths = _unshared_storage_paths(db, candidate_urls, document_ids)
+
+        deleted_documents = _delete_document_rows(db, document_ids)
+        if not truncate:
+            db.query(CollectionAlias).filter(
+                CollectionAlias.name == collection_name
+            ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    # Chroma: eliminar la colección física es mucho más rápido que borrar por ids
+    delete_collection(alias["physical_name"])
+    if truncate:
+        create_collection(alias["physical_name"])
+    invalidate_aliases()
+
+    removed_files = remove_from_storage(client_supabase, storage_paths)
+    print(
+        f"[delete_service] Colección '{collection_name}': {deleted_documents} documentos, "
+        f"{removed_files} archivos eliminados"
+    )
+    return {
+        "collection_name": collection_name,
+        "documents_deleted": deleted_documents,
+        "files_deleted": removed_files,
+        "truncated": truncate,
+    }
+
+
+def discard_failed_document(document_id):
+    """
+    Elimina el documento de un trabajo de ingesta que falló: sus fragmentos
+    parciales, el archivo en Storage (si nadie más lo usa) y la fila. Así su
+    content_hash no bloquea como duplicado una nueva carga del mismo archivo.
+    """
+    db = next(get_db())
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if document is None:
+            return False
+        delete_document_chunks(document)
+        try:
+            delete_document_storage(document)
+        except Exception as e:
+            print(f"[delete_service] No se pudo eliminar el archivo en Storage: {e}")
+        _delete_document_rows(db, [document_id])
+        db.commit()
+        print(f"[delete_service] Documento {document_id} de una ingesta fallida eliminado")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"[delete_service] No se pudo eliminar el documento {document_id}: {e}")
+        return False
+    finally:
+        db.close()
+
+
+def delete_document_chunks(document):
+    """Una eliminación por lotes de todos los fragmentos del documento."""
+    chunk_ids = get_chunk_ids(document.id)
+    delete_chunks_from_collection(chunk_ids, str(document.collection_name))
+    return len(chunk_ids)
@@ -0,0 +1,497 @@
+import os
+import time
+import asyncio
+import threading
+import traceback
+from models.database import get_db
+from models.ingestion_job import JobStatus, JobStage
+from models.supabase_client import get_client_supabase
+from services.helpers.system_usage import get_system_usage
+from services.helpers.cpu_pool import INGESTION_CPU_WORKERS, run_cpu_task_async
+from services.helpers.clean_filename import clean_filename
+from services.helpers.return_collection import return_collection, get_collection_model
+from services.documents.save_docs.storage_service import (
+    STORAGE_BUCKET,
+    upload_to_storage,
+)
+from services.documents.save_docs.spool_service import remove_spooled_file
+from services.documents.save_docs.upload_service import (
+    save_document,
+    save_document_details,
+    document_details_from_parsed,
+)
+from services.documents.save_docs.dedup_service import (
+    find_document_by_hash,
+    find_document_by_path,
+    find_document_by_id,
+    duplicate_result,
+    copy_document_chunks,
+)
+from services.documents.save_docs.process_any_document_service import (
+    parse_pdf,
+    build_chunk_metadatas,
+)
+from services.documents.delete_docs.delete_service import discard_failed_document
+from services.documents.ingestion.job_service import (
+    get_job_state,
+    update_job,
+    touch_jobs,
+)
+from services.documents.ingestion.job_worker import WORKER_ID
+from services.embeddings.embedding_cache_service import get_embeddings_cached
+from services.embeddings.save_embedding_service import save_embeddings_batch
+from services.metrics.save_metrics.save_metrics_docs import save_metrics_docs
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+BULK_QUEUE_SIZE = int(os.getenv("BULK_QUEUE_SIZE", "8"))  # Capacidad entre etapas
+BULK_UPLOAD_CONCURRENCY = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "4"))
+# Documentos en análisis a la vez; el análisis corre en el pool de ingesta
+BULK_PARSE_WORKERS = int(os.getenv("BULK_PARSE_WORKERS", str(INGESTION_CPU_WORKERS)))
+BULK_EMBED_CONCURRENCY = int(os.getenv("BULK_EMBED_CONCURRENCY", "1"))
+BULK_EMBED_BATCH_SIZE = int(os.getenv("BULK_EMBED_BATCH_SIZE", "32"))
+BULK_WRITE_CONCURRENCY = int(os.getenv("BULK_WRITE_CONCURRENCY", "2"))
+BULK_HEARTBEAT_INTERVAL = int(os.getenv("BULK_HEARTBEAT_INTERVAL", "60"))
+
+# Marca de fin de cola entre etapas
+_STOP = object()
+
+# Referencias a los lotes en ejecución para que no los recoja el recolector
+_running_batches = set()
+
+
+class BulkBatch:
+    """Estado compartido por las etapas de un lote."""
+
+    def __init__(self, batch_id, collection_name):
+        self.batch_id = batch_id
+        self.collection_name = collection_name
+        self.client_supabase = get_client_supabase()  # Un cliente para todo el lote
+        self.seen_hashes = set()  # Contenidos ya tomados en la pasada actual
+        self.deferred = []  # Copias repetidas que esperan a la siguiente pasada
+        self.hashes_lock = threading.Lock()
+        self.active_jobs = set()
+        self.initial_cpu, self.initial_memory = get_system_usage(interval=None)
+        self.documents = 0
+        self.chunks = 0
+        self.failed = 0
+
+    def finish(self, job_id, spool_path, result):
+        update_job(
+            job_id,
+            status=JobStatus.completed,
+            stage=JobStage.completed,
+            result=result,
+        )
+        remove_spooled_file(spool_path)
+        self.active_jobs.discard(job_id)
+
+    def fail(self, job_id, message):
+        print(f"[bulk_pipeline] Trabajo {job_id} fallido: {message}")
+        job = update_job(job_id, status=JobStatus.failed, error=message)
+        if job and job["document_id"]:
+            # El documento registrado quedó sin indexar o a medias
+            discard_failed_document(job["document_id"])
+        self.active_jobs.discard(job_id)
+        self.failed += 1
+
+
+def _upload_and_register(batch: BulkBatch, job_id):
+    """Etapa 1 (hilo): subir a Storage y registrar el documento."""
+    job = get_job_state(job_id)
+    filename = job["filename"]
+    item = {"job": job, "timings": {}}
+
+    source = None
+    if job["stage"] == JobStage.spooled.value:
+        cleaned_filename = clean_filename(filename.replace(" ", "_"))
+        storage_path = f"{batch.collection_name}/{cleaned_filename}"
+        content_hash = job["content_hash"]
+
+        # Copias repetidas dentro del lote: esperan a que termine la primera.
+        # En la siguiente pasada son duplicados si la primera se registró, o
+        # una de ellas la reemplaza si falló
+        with batch.hashes_lock:
+            is_repeated = content_hash in batch.seen_hashes
+            batch.seen_hashes.add(content_hash)
+            if is_repeated:
+                batch.deferred.append(job_id)
+        if is_repeated:
+            return None
+
+        # Duplicados ya registrados: una consulta al índice de content_hash
+        existing = find_document_by_hash(content_hash, batch.collection_name)
+        if existing and existing["collection_name"] == batch.collection_name:
+            batch.finish(
+                job_id,
+                job["spool_path"],
+                duplicate_result(filename, batch.collection_name, existing),
+            )
+            return None
+
+        if existing:
+            # Mismo contenido en otra colección: se reutiliza su archivo y sus fragmentos
+            source = existing
+            job["public_url"] = existing["path"]
+        else:
+            public_url = batch.client_supabase.storage.from_(
+                STORAGE_BUCKET
+            ).get_public_url(storage_path)
+            if find_document_by_path(public_url):
+                batch.fail(
+                    job_id,
+                    f"Ya existe otro documento con el nombre '{cleaned_filename}' "
+                    f"en la colección '{batch.collection_name}'.",
+                )
+                return None
+
+            update_job(job_id, progress={"upload_started": True})
+            upload_start = time.time()
+            public_url = upload_to_storage(
+                batch.client_supabase,
+                storage_path,
+                job["spool_path"],
+                job["content_type"],
+            )
+            if not public_url:
+                batch.fail(job_id, f"No se pudo subir el archivo '{filename}'.")
+                return None
+            item["timings"]["upload_time"] = time.time() - upload_start
+            job["public_url"] = public_url
+        update_job(
+            job_id,
+            stage=JobStage.uploaded,
+            public_url=job["public_url"],
+            progress={
+                **item["timings"],
+                # Si el trabajo se retoma, sigue reutilizando los fragmentos
+                "reuse_document_id": source["id"] if source else None,
+            },
+        )
+        job["stage"] = JobStage.uploaded.value
+    else:
+        # Un trabajo retomado conserva el documento del que reutiliza fragmentos
+        reuse_document_id = job["progress"].get("reuse_document_id")
+        if reuse_document_id:
+            source = find_document_by_id(reuse_document_id)
+
+    if job["stage"] == JobStage.uploaded.value:
+        save_start = time.time()
+        document = save_document(
+            filename,
+            batch.collection_name,
+            job["public_url"],
+            physical_path=None,
+            content_hash=job["content_hash"],
+            job_id=job_id,
+        )
+        if document is None:
+            existing = find_document_by_hash(job["content_hash"], batch.collection_name)
+            if existing and existing["collection_name"] == batch.collection_name:
+                batch.finish(
+                    job_id,
+                    job["spool_path"],
+                    duplicate_result(filename, batch.collection_name, existing),
+                )
+                return None
+            batch.fail(job_id, "No se pudo guardar el archivo.")
+            return None
+        item["timings"]["save_time"] = time.time() - save_start
+        job["document_id"] = document.id
+        update_job(
+            job_id,
+            stage=JobStage.registered,
+            document_id=document.id,
+            progress=item["timings"],
+        )
+        job["stage"] = JobStage.registered.value
+
+    if source is not None and job["stage"] == JobStage.registered.value:
+        # Sin análisis ni embeddings: se copian los fragmentos existentes
+        chunk_count = copy_document_chunks(
+            source, job["document_id"], batch.collection_name
+        )
+        batch.finish(
+            job_id,
+            job["spool_path"],
+            {
+                "status": "Successfully Uploaded",
+                "filename": filename,
+                "collection_name": batch.collection_name,
+                "file_url": job["public_url"],
+                "doc_len": 1,
+                "chunks": chunk_count,
+                "reused_document_id": source["id"],
+                "execution_times": item["timings"],
+                "message": "El archivo ya existía en otra colección; se reutilizaron sus fragmentos.",
+            },
+        )
+        batch.documents += 1
+        batch.chunks += chunk_count
+        return None
+
+    return item
+
+
+def _embed_document(item):
+    """Etapa 3 (hilo): embeddings por lotes de todos los fragmentos del documento."""
+    chunks_to_embed = item["parsed"]["chunks_to_embed"]
+    embedding_model = get_collection_model(item["job"]["collection_name"])
+    embeddings = []
+    for batch_start in range(0, len(chunks_to_embed), BULK_EMBED_BATCH_SIZE):
+        embeddings.extend(
+            get_embeddings_cached(
+                chunks_to_embed[batch_start : batch_start + BULK_EMBED_BATCH_SIZE],
+                model=embedding_model,
+            )
+        )
+    item["embeddings"] = embeddings
+    return item
+
+
+def _write_document(batch: BulkBatch, item):
+    """Etapa 4 (hilo): escritura masiva en Chroma, métricas y cierre del trabajo."""
+    job = item["job"]
+    parsed = item["parsed"]
+    timings = item["timings"]
+    document_id = job["document_id"]
+
+    write_start = time.time()
+    chunk_metadatas = build_chunk_metadatas(parsed, batch.collection_name, document_id)
+    chunks_total = len(chunk_metadatas)
+    offsets = parsed.get("offsets")
+    save_document_details(document_id, document_details_from_parsed(parsed))
+    db = next(get_db())
+    try:
+        collection = return_collection(batch.collection_name)
+        # Por lotes, con el avance en el trabajo: si el proceso cae, el
+        # trabajo se retoma desde chunks_done
+        start_chunk = job["progress"].get("chunks_done", 0)
+        for batch_start in range(start_chunk, chunks_total, BULK_EMBED_BATCH_SIZE):
+            batch_end = min(batch_start + BULK_EMBED_BATCH_SIZE, chunks_total)
+            save_embeddings_batch(
+                parsed["chunks_to_embed"][batch_start:batch_end],
+                item["embeddings"][batch_start:batch_end],
+                collection,
+                [metadata for _, metadata in chunk_metadatas[batch_start:batch_end]],
+                document_id,
+                db,
+                ids=[
+                    fragment_id
+                    for fragment_id, _ in chunk_metadatas[batch_start:batch_end]
+                ],
+                offsets=offsets[batch_start:batch_end] if offsets else None,
+            )
+            update_job(
+                job["job_id"],
+                progress={"chunks_done": batch_end, "chunks_total": chunks_total},
+            )
+        timings["write_time"] = time.time() - write_start
+
+        final_cpu, final_memory = get_system_usage(interval=None)
+        process_time = (
+            timings.get("parse_time", 0)
+            + timings.get("embed_time", 0)
+            + timings["write_time"]
+        )
+        execution_times = {
+            "upload_time": timings.get("upload_time", 0),
+            "process_time": process_time,
+            "total_time": timings.get("upload_time", 0)
+            + timings.get("save_time", 0)
+            + process_time,
+            "save_time": timings.get("save_time", 0),
+        }
+        cpu_usage = {
+            "initial": batch.initial_cpu,
+            "save": batch.initial_cpu,
+            "process": final_cpu,
+            "final": final_cpu,
+        }
+        memory_usage = {
+            "initial": batch.initial_memory,
+            "save": batch.initial_memory,
+            "process": final_memory,
+            "final": final_memory,
+        }
+        save_metrics_docs(db, document_id, execution_times, cpu_usage, memory_usage)
+    finally:
+        db.close()
+
+    chunk_count = chunks_total
+    update_job(job["job_id"], stage=JobStage.processed)
+    batch.finish(
+        job["job_id"],
+        job["spool_path"],
+        {
+            "status": "Successfully Uploaded",
+            "filename": job["filename"],
+            "collection_name": batch.collection_name,
+            "file_url": job["public_url"],
+            "doc_len": parsed["doc_len"],
+            "chunks": chunk_count,
+            "execution_times": {**execution_times, **timings},
+            "message": "El archivo se subió y procesó correctamente.",
+        },
+    )
+    batch.documents += 1
+    batch.chunks += chunk_count
+
+
+async def _run_stage(worker_count, in_queue, out_queue, next_worker_count, handler):
+    """
+    Ejecuta una etapa con varios workers. Al terminar todos, envía una marca de
+    fin por cada worker de la etapa siguiente.
+    """
+
+    async def worker():
+        while True:
+            item = await in_queue.get()
+            if item is _STOP:
+                return
+            result = await handler(item)
+            if result is not None and out_queue is not None:
+                await out_queue.put(result)  # Bloquea si la siguiente etapa va lenta
+
+    await asyncio.gather(*[worker() for _ in range(worker_count)])
+    if out_queue is not None:
+        for _ in range(next_worker_count):
+            await out_queue.put(_STOP)
+
+
+async def run_bulk_pipeline(batch_id, job_ids, collection_name):
+    """
+    Ingesta masiva en etapas concurrentes conectadas por colas acotadas:
+    subida a Storage -> análisis del PDF (pool de procesos) -> embeddings por
+    lotes -> escritura masiva en Chroma y la base de datos.
+    """
+    start_time = time.time()
+    batch = BulkBatch(batch_id, collection_name)
+
+    # Los trabajos se crearon ya tomados por este proceso (create_job con
+    # worker_id), así el barrido no los procesa por separado mientras el lote
+    # se recibe; si el proceso cae, los retoma al vencer su heartbeat
+    claimed = list(job_ids)
+    batch.active_jobs.update(claimed)
+    print(f"[bulk_pipeline] Lote {batch_id}: {len(claimed)} documentos")
+
+    def guarded(stage_name, handler):
+        async def wrapped(item):
+            job_id = item if isinstance(item, str) else item["job"]["job_id"]
+            try:
+                return await handler(item)
+            except Exception as e:
+                traceback.print_exc()
+                await asyncio.to_thread(
+                    batch.fail, job_id, f"Error en la etapa {stage_name}: {e}"
+                )
+                return None
+
+        return wrapped
+
+    async def upload(job_id):
+        return await asyncio.to_thread(_upload_and_register, batch, job_id)
+
+    async def parse(item):
+        parse_start = time.time()
+        job = item["job"]
+        item["parsed"] = await run_cpu_task_async(
+            parse_pdf, job["spool_path"], job["filename"]
+        )
+        item["timings"]["parse_time"] = time.time() - parse_start
+        await asyncio.to_thread(
+            update_job,
+            job["job_id"],
+            progress={"chunks_total": len(item["parsed"]["chunks_to_embed"])},
+        )
+        return item
+
+    async def embed(item):
+        embed_start = time.time()
+        item = await asyncio.to_thread(_embed_document, item)
+        item["timings"]["embed_time"] = time.time() - embed_start
+        return item
+
+    async def write(item):
+        await asyncio.to_thread(_write_document, batch, item)
+        return None
+
+    async def run_pass(pass_jobs):
+        upload_queue = asyncio.Queue(maxsize=BULK_QUEUE_SIZE)
+        parse_queue = asyncio.Queue(maxsize=BULK_QUEUE_SIZE)
+        embed_queue = asyncio.Queue(maxsize=BULK_QUEUE_SIZE)
+        write_queue = asyncio.Queue(maxsize=BULK_QUEUE_SIZE)
+
+        async def feed():
+            for job_id in pass_jobs:
+                await upload_queue.put(job_id)
+            for _ in range(BULK_UPLOAD_CONCURRENCY):
+                await upload_queue.put(_STOP)
+
+        await asyncio.gather(
+            feed(),
+            _run_stage(
+                BULK_UPLOAD_CONCURRENCY,
+                upload_queue,
+                parse_queue,
+                BULK_PARSE_WORKERS,
+                guarded("upload", upload),
+            ),
+            _run_stage(
+                BULK_PARSE_WORKERS,
+                parse_queue,
+                embed_queue,
+                BULK_EMBED_CONCURRENCY,
+                guarded("parse", parse),
+            ),
+            _run_stage(
+                BULK_EMBED_CONCURRENCY,
+                embed_queue,
+                write_queue,
+                BULK_WRITE_CONCURRENCY,
+                guarded("embed", embed),
+            ),
+            _run_stage(
+                BULK_WRITE_CONCURRENCY,
+                write_queue,
+                None,
+                0,
+                guarded("write", write),
+            ),
+        )
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(BULK_HEARTBEAT_INTERVAL)
+            await asyncio.to_thread(touch_jobs, set(batch.active_jobs), WORKER_ID)
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        # Cada pasada procesa una copia de cada contenido; las copias repetidas
+        # se resuelven en la siguiente, cuando la primera ya terminó
+        pass_jobs = claimed
+        while pass_jobs:
+            batch.seen_hashes = set()
+            batch.deferred = []
+            await run_pass(pass_jobs)
+            pass_jobs = batch.deferred
+    finally:
+        heartbeat_task.cancel()
+
+    elapsed = max(time.time() - start_time, 1e-6)
+    print(
+        f"[bulk_pipeline] Lote {batch_id} terminado en {elapsed:.1f}s: "
+        f"{batch.documents} documentos, {batch.chunks} fragmentos, {batch.failed} fallidos, "
+        f"{batch.documents / elapsed * 60:.2f} docs/min, {batch.chunks / elapsed:.2f} fragmentos/s"
+    )
+
+
+def start_bulk_pipeline(batch_id, job_ids, collection_name):
+    """Lanza el lote en segundo plano dentro del event loop actual."""
+    task = asyncio.create_task(run_bulk_pipeline(batch_id, job_ids, collection_name))
+    _running_batches.add(task)
+    task.add_done_callback(_running_batches.discard)
+    return task
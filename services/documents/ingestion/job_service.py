@@ -0,0 +1,271 @@
+import os
+import pytz
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, func, select
+from sqlalchemy.orm.attributes import flag_modified
+from models.database import get_db
+from models.ingestion_job import IngestionJob, JobStatus, JobStage
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
+# Un trabajo "running" sin heartbeat durante este tiempo se considera abandonado
+INGESTION_JOB_STALE_SECONDS = int(os.getenv("INGESTION_JOB_STALE_SECONDS", "600"))
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+
+TERMINAL_STATUSES = (JobStatus.completed, JobStatus.failed)
+
+
+def _now():
+    return datetime.now(pytz.timezone(TIME_ZONE))
+
+
+def job_to_dict(job: IngestionJob):
+    return {
+        "job_id": job.id,
+        "batch_id": job.batch_id,
+        "status": job.status.value if job.status else None,
+        "stage": job.stage.value if job.stage else None,
+        "progress": job.progress or {},
+        "filename": job.filename,
+        "collection_name": job.collection_name,
+        "document_id": job.document_id,
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+def create_job(
+    job_id,
+    filename,
+    collection_name,
+    content_type,
+    spool_path,
+    batch_id=None,
+    content_hash=None,
+    worker_id=None,
+):
+    """
+    :param worker_id: Si se indica, el trabajo se crea ya tomado por ese worker
+        (p. ej. un lote masivo que aún está recibiendo archivos) y el barrido no
+        lo toma mientras su heartbeat siga vigente.
+    """
+    db = next(get_db())
+    try:
+        job = IngestionJob(
+            id=job_id,
+            batch_id=batch_id,
+            status=JobStatus.running if worker_id else JobStatus.pending,
+            stage=JobStage.spooled,
+            progress={},
+            filename=filename,
+            collection_name=collection_name,
+            content_type=content_type,
+            spool_path=spool_path,
+            content_hash=content_hash,
+            worker_id=worker_id,
+            attempts=1 if worker_id else 0,
+            created_at=_now(),
+            updated_at=_now(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job_to_dict(job)
+    finally:
+        db.close()
+
+
+def get_job(job_id):
+    db = next(get_db())
+    try:
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+        return job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+
+def get_job_state(job_id):
+    """Estado interno del trabajo, incluye los campos que no se exponen por la API."""
+    db = next(get_db())
+    try:
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+        if not job:
+            return None
+        return {
+            **job_to_dict(job),
+            "content_type": job.content_type,
+            "spool_path": job.spool_path,
+            "content_hash": job.content_hash,
+            "public_url": job.public_url,
+        }
+    finally:
+        db.close()
+
+
+def update_job(job_id, **fields):
+    """
+    Actualiza los campos indicados del trabajo y renueva su heartbeat.
+    El campo 'progress' se combina con el progreso existente.
+    """
+    db = next(get_db())
+    try:
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+        if not job:
+            return None
+
+        progress = fields.pop("progress", None)
+        if progress is not None:
+            job.progress = {**(job.progress or {}), **progress}  # type: ignore
+            flag_modified(job, "progress")
+
+        for key, value in fields.items():
+            setattr(job, key, value)
+        job.updated_at = _now()  # type: ignore
+
+        db.commit()
+        db.refresh(job)
+        return job_to_dict(job)
+    except Exception as e:
+        db.rollback()
+        print(f"[job_service] Error al actualizar el trabajo {job_id}: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def _claimable_filter():
+    stale_before = _now() - timedelta(seconds=INGESTION_JOB_STALE_SECONDS)
+    return and_(
+        IngestionJob.attempts < INGESTION_MAX_ATTEMPTS,
+        or_(
+            IngestionJob.status == JobStatus.pending,
+            and_(
+                IngestionJob.status == JobStatus.running,
+                IngestionJob.updated_at < stale_before,
+            ),
+        ),
+    )
+
+
+def claim_job(job_id, worker_id):
+    """
+    Marca el trabajo como 'running' para este worker de forma atómica.
+    Devuelve False si otro proceso ya lo tomó o si terminó.
+    """
+    db = next(get_db())
+    try:
+        claimed = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.id == job_id, _claimable_filter())
+            .update(
+                {
+                    IngestionJob.status: JobStatus.running,
+                    IngestionJob.worker_id: worker_id,
+                    IngestionJob.attempts: IngestionJob.attempts + 1,
+                    IngestionJob.updated_at: _now(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return claimed == 1
+    except Exception as e:
+        db.rollback()
+        print(f"[job_service] Error al reclamar el trabajo {job_id}: {e}")
+        return False
+    finally:
+        db.close()
+
+
+def list_resumable_jobs():
+    """Trabajos pendientes o abandonados por un worker que se reinició."""
+    db = next(get_db())
+    try:
+        jobs = (
+            db.query(IngestionJob.id)
+            .filter(_claimable_filter())
+            .order_by(IngestionJob.created_at)
+            .all()
+        )
+        return [job.id for job in jobs]
+    finally:
+        db.close()
+
+
+def touch_jobs(job_ids, worker_id):
+    """Renueva el heartbeat de los trabajos que este worker sigue ejecutando."""
+    if not job_ids:
+        return
+    db = next(get_db())
+    try:
+        db.query(IngestionJob).filter(
+            IngestionJob.id.in_(list(job_ids)),
+            IngestionJob.status == JobStatus.running,
+            IngestionJob.worker_id == worker_id,
+        ).update({IngestionJob.updated_at: _now()}, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[job_service] Error al renovar el heartbeat: {e}")
+    finally:
+        db.close()
+
+
+def get_batch_summary(batch_id):
+    """
+    Resumen de un lote de carga masiva: estado de cada trabajo y rendimiento
+    agregado en documentos/minuto y fragmentos/segundo.
+    """
+    db = next(get_db())
+    try:
+        jobs = (
+            db.query(IngestionJob)
+            .filter(IngestionJob.batch_id == batch_id)
+            .order_by(IngestionJob.created_at)
+            .all()
+        )
+        if not jobs:
+            return None
+
+        status_counts = {status.value: 0 for status in JobStatus}
+        documents = 0
+        chunks = 0
+        for job in jobs:
+            status_counts[job.status.value] += 1
+            result = job.result or {}
+            if job.status == JobStatus.completed and result.get("chunks") is not None:
+                documents += 1
+                chunks += result.get("chunks", 0)
+
+        started_at = min(job.created_at for job in jobs)
+        finished = [job.updated_at for job in jobs if job.status in TERMINAL_STATUSES]
+        is_done = len(finished) == len(jobs)
+        if is_done:
+            ended_at = max(finished)
+        else:
+            # Las columnas son timestamp sin zona y guardan la hora en la zona
+            # de la sesión de PostgreSQL; "ahora" se toma con la misma base
+            ended_at = db.scalar(select(func.localtimestamp()))
+        elapsed = max((ended_at - started_at).total_seconds(), 1e-6)
+
+        return {
+            "batch_id": batch_id,
+            "done": is_done,
+            "total_jobs": len(jobs),
+            "status_counts": status_counts,
+            "documents_indexed": documents,
+            "chunks_indexed": chunks,
+            "elapsed_seconds": elapsed,
+            "documents_per_minute": documents / elapsed * 60,
+            "chunks_per_second": chunks / elapsed,
+            "jobs": [job_to_dict(job) for job in jobs],
+        }
+    finally:
+        db.close()
@@ -0,0 +1,398 @@
+import os
+import time
+import socket
+import asyncio
+import traceback
+from models.database import get_db
+from models.ingestion_job import JobStatus, JobStage
+from models.supabase_client import get_client_supabase
+from services.helpers.system_usage import get_system_usage
+from services.helpers.clean_filename import clean_filename
+from services.documents.save_docs.storage_service import (
+    STORAGE_BUCKET,
+    file_exists_in_storage,
+    upload_to_storage,
+)
+from services.documents.save_docs.spool_service import remove_spooled_file
+from services.documents.save_docs.upload_service import save_document
+from services.documents.save_docs.dedup_service import (
+    find_document_by_hash,
+    find_document_by_path,
+    find_document_by_id,
+    duplicate_result,
+    copy_document_chunks,
+)
+from services.documents.save_docs.process_any_document_service import process_pdf
+from services.documents.delete_docs.delete_service import discard_failed_document
+from services.documents.ingestion.job_service import (
+    claim_job,
+    get_job_state,
+    update_job,
+    list_resumable_jobs,
+    touch_jobs,
+)
+from services.metrics.save_metrics.save_metrics_docs import save_metrics_docs
+from services.embeddings.embedding_limits import EmbeddingUnavailableError
+from services.helpers.cpu_pool import INGESTION_CPU_WORKERS, shutdown_cpu_pool
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Un trabajo más que procesos de CPU: mientras el pool analiza los siguientes
+# documentos, al menos un trabajo está generando embeddings
+INGESTION_WORKERS = int(
+    os.getenv("INGESTION_WORKERS", str(INGESTION_CPU_WORKERS + 1))
+)
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "100"))
+INGESTION_SWEEP_INTERVAL = int(os.getenv("INGESTION_SWEEP_INTERVAL", "30"))
+# Debe ser bastante menor que INGESTION_JOB_STALE_SECONDS: una subida, un OCR
+# largo o una copia de fragmentos no pasan por update_job durante minutos
+INGESTION_HEARTBEAT_INTERVAL = int(os.getenv("INGESTION_HEARTBEAT_INTERVAL", "60"))
+
+# Identificador de este proceso (uvicorn puede levantar varios workers)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+STAGE_ORDER = [
+    JobStage.spooled,
+    JobStage.uploaded,
+    JobStage.registered,
+    JobStage.processed,
+    JobStage.completed,
+]
+
+_job_queue = None
+_queued_ids = set()
+_running_jobs = set()  # Trabajos que run_job está ejecutando en este proceso
+_worker_tasks = []
+
+
+def _finish_job(job_id, spool_path, result):
+    update_job(
+        job_id,
+        status=JobStatus.completed,
+        stage=JobStage.completed,
+        result=result,
+    )
+    remove_spooled_file(spool_path)
+
+
+def _fail_job(job_id, message):
+    print(f"[job_worker] Trabajo {job_id} fallido: {message}")
+    job = update_job(job_id, status=JobStatus.failed, error=message)
+    if job and job["document_id"]:
+        # El documento registrado quedó sin indexar o a medias
+        discard_failed_document(job["document_id"])
+
+
+def run_job(job_id):
+    """
+    Ejecuta el pipeline de ingesta de un trabajo. Cada etapa deja su resultado
+    en la tabla de trabajos, por lo que un trabajo interrumpido continúa desde
+    la última etapa completada.
+    """
+    if not claim_job(job_id, WORKER_ID):
+        print(f"[job_worker] Trabajo {job_id} tomado por otro worker o terminado")
+        return
+
+    # El heartbeat periódico lo renueva mientras dure el trabajo
+    _running_jobs.add(job_id)
+    try:
+        _run_claimed_job(job_id)
+    finally:
+        _running_jobs.discard(job_id)
+
+
+def _run_claimed_job(job_id):
+    job = get_job_state(job_id)
+    if job is None:
+        return
+
+    filename = job["filename"]
+    collection_name = job["collection_name"]
+    spool_path = job["spool_path"]
+    public_url = job["public_url"]
+    document_id = job["document_id"]
+    progress = job["progress"]
+    stage_index = STAGE_ORDER.index(JobStage(job["stage"]))
+
+    print(
+        f"[job_worker] Ejecutando trabajo {job_id} ({filename}) desde la etapa {job['stage']}"
+    )
+
+    start_time = time.time()
+    initial_cpu, initial_memory = get_system_usage()
+
+    try:
+        # Etapa 1: subir el archivo a Supabase Storage
+        if stage_index < STAGE_ORDER.index(JobStage.uploaded):
+            cleaned_filename = clean_filename(filename.replace(" ", "_"))
+            storage_path = f"{collection_name}/{cleaned_filename}"
+            client_supabase = get_client_supabase()
+
+            # Duplicado por contenido: una consulta al índice de content_hash
+            existing = find_document_by_hash(job["content_hash"], collection_name)
+            if existing and existing["collection_name"] == collection_name:
+                _finish_job(
+                    job_id,
+                    spool_path,
+                    {
+                        **duplicate_result(filename, collection_name, existing),
+                        "execution_time": time.time() - start_time,
+                    },
+                )
+                return
+
+            if existing:
+                # Mismo contenido en otra colección: se reutiliza su archivo
+                public_url = existing["path"]
+                progress["reuse_document_id"] = existing["id"]
+            else:
+                public_url = client_supabase.storage.from_(
+                    STORAGE_BUCKET
+                ).get_public_url(storage_path)
+                same_name = find_document_by_path(public_url)
+                if same_name:
+                    _fail_job(
+                        job_id,
+                        f"Ya existe otro documento con el nombre '{cleaned_filename}' "
+                        f"en la colección '{collection_name}'.",
+                    )
+                    return
+
+                # Si la subida ocurrió en un intento anterior que no llegó a
+                # registrarse, se conserva el archivo ya subido
+                if not (
+                    progress.get("upload_started")
+                    and file_exists_in_storage(
+                        client_supabase, collection_name, cleaned_filename
+                    )
+                ):
+                    update_job(job_id, progress={"upload_started": True})
+                    upload_start = time.time()
+                    public_url = upload_to_storage(
+                        client_supabase, storage_path, spool_path, job["content_type"]
+                    )
+                    progress["upload_time"] = time.time() - upload_start
+
+            if not public_url:
+                _fail_job(job_id, f"No se pudo subir el archivo '{filename}'.")
+                return
+
+            update_job(
+                job_id,
+                stage=JobStage.uploaded,
+                public_url=public_url,
+                progress={
+                    "upload_time": progress.get("upload_time", 0),
+                    "reuse_document_id": progress.get("reuse_document_id"),
+                },
+            )
+
+        # Etapa 2: registrar el documento en la base de datos
+        if stage_index < STAGE_ORDER.index(JobStage.registered):
+            save_start = time.time()
+            document = save_document(
+                filename,
+                collection_name,
+                public_url,
+                physical_path=None,
+                content_hash=job["content_hash"],
+                job_id=job_id,
+            )
+            if document is None:
+                # Otro trabajo pudo registrar el mismo contenido entre tanto
+                existing = find_document_by_hash(job["content_hash"], collection_name)
+                if existing and existing["collection_name"] == collection_name:
+                    _finish_job(
+                        job_id,
+                        spool_path,
+                        duplicate_result(filename, collection_name, existing),
+                    )
+                    return
+                _fail_job(job_id, "No se pudo guardar el archivo.")
+                return
+            document_id = document.id
+            progress["save_time"] = time.time() - save_start
+            save_cpu, save_memory = get_system_usage()
+            update_job(
+                job_id,
+                stage=JobStage.registered,
+                document_id=document_id,
+                progress={
+                    "save_time": progress["save_time"],
+                    "cpu_save": save_cpu,
+                    "memory_save": save_memory,
+                },
+            )
+            progress.update({"cpu_save": save_cpu, "memory_save": save_memory})
+
+        # Etapa 3: extraer, fragmentar y guardar embeddings
+        if stage_index < STAGE_ORDER.index(JobStage.processed):
+            process_cpu, process_memory = get_system_usage()
+            process_start = time.time()
+
+            def on_progress(chunks_done, chunks_total):
+                update_job(
+                    job_id,
+                    progress={"chunks_done": chunks_done, "chunks_total": chunks_total},
+                )
+
+            reuse_document_id = progress.get("reuse_document_id")
+            source = find_document_by_id(reuse_document_id) if reuse_document_id else None
+            if source and source["chunk_ids"]:
+                # Los fragmentos y embeddings se copian del documento idéntico
+                doc_len = 1
+                chunk_len = copy_document_chunks(
+                    source, document_id, collection_name
+                )
+            else:
+                doc_len, chunk_len = process_pdf(
+                    spool_path,
+                    filename,
+                    collection_name,
+                    document_id,
+                    start_chunk=progress.get("chunks_done", 0),
+                    on_progress=on_progress,
+                )
+            progress.update(
+                {
+                    "doc_len": doc_len,
+                    "chunks": chunk_len,
+                    "process_time": time.time() - process_start,
+                    "cpu_process": process_cpu,
+                    "memory_process": process_memory,
+                }
+            )
+            update_job(job_id, stage=JobStage.processed, progress=progress)
+
+        # Etapa 4: guardar métricas y cerrar el trabajo
+        final_cpu, final_memory = get_system_usage()
+        execution_times = {
+            "upload_time": progress.get("upload_time", 0),
+            "process_time": progress.get("process_time", 0),
+            "total_time": time.time() - start_time,
+            "save_time": progress.get("save_time", 0),
+        }
+        cpu_usage = {
+            "initial": initial_cpu,
+            "save": progress.get("cpu_save", 0),
+            "process": progress.get("cpu_process", 0),
+            "final": final_cpu,
+        }
+        memory_usage = {
+            "initial": initial_memory,
+            "save": progress.get("memory_save", 0),
+            "process": progress.get("memory_process", 0),
+            "final": final_memory,
+        }
+
+        db = next(get_db())
+        try:
+            save_metrics_docs(
+                db, document_id, execution_times, cpu_usage, memory_usage
+            )
+        finally:
+            db.close()
+
+        _finish_job(
+            job_id,
+            spool_path,
+            {
+                "status": "Successfully Uploaded",
+                "filename": filename,
+                "collection_name": collection_name,
+                "file_url": public_url,
+                "doc_len": progress.get("doc_len", 0),
+                "chunks": progress.get("chunks", 0),
+                "execution_times": execution_times,
+                "cpu_usage": cpu_usage,
+                "memory_usage": memory_usage,
+                "message": "El archivo se subió y procesó correctamente.",
+            },
+        )
+        print(f"[job_worker] Trabajo {job_id} completado")
+
+    except EmbeddingUnavailableError as e:
+        # Ollama no responde: el trabajo vuelve a 'pending' y el barrido lo
+        # retoma desde chunks_done (hasta INGESTION_MAX_ATTEMPTS intentos)
+        print(f"[job_worker] Trabajo {job_id} en espera: {e}")
+        update_job(job_id, status=JobStatus.pending, error=str(e))
+    except Exception as e:
+        print(f"Error en el trabajo de ingesta {job_id}: {e}")
+        traceback.print_exc()
+        _fail_job(job_id, f"Ocurrió un error procesando el archivo: {e}")
+
+
+def enqueue_job(job_id):
+    """
+    Encola el trabajo en este proceso. Si la cola está llena el trabajo queda
+    'pending' en la base de datos y lo recoge el siguiente barrido.
+    """
+    if _job_queue is None or job_id in _queued_ids:
+        return False
+    try:
+        _job_queue.put_nowait(job_id)
+        _queued_ids.add(job_id)
+        return True
+    except asyncio.QueueFull:
+        print(f"[job_worker] Cola llena, el trabajo {job_id} queda pendiente")
+        return False
+
+
+async def _worker(worker_number):
+    while True:
+        job_id = await _job_queue.get()  # type: ignore
+        try:
+            await asyncio.to_thread(run_job, job_id)
+        except Exception as e:
+            print(f"[job_worker] Worker {worker_number} error en {job_id}: {e}")
+        finally:
+            _queued_ids.discard(job_id)
+            _job_queue.task_done()  # type: ignore
+
+
+async def _sweeper():
+    """Reencola trabajos pendientes y los abandonados por un worker caído."""
+    while True:
+        try:
+            job_ids = await asyncio.to_thread(list_resumable_jobs)
+            for job_id in job_ids:
+                enqueue_job(job_id)
+        except Exception as e:
+            print(f"[job_worker] Error al buscar trabajos pendientes: {e}")
+        await asyncio.sleep(INGESTION_SWEEP_INTERVAL)
+
+
+async def _heartbeat():
+    """
+    Renueva el heartbeat de los trabajos en curso para que el barrido de otro
+    proceso no los tome por abandonados en medio de una etapa larga.
+    """
+    while True:
+        await asyncio.sleep(INGESTION_HEARTBEAT_INTERVAL)
+        await asyncio.to_thread(touch_jobs, set(_running_jobs), WORKER_ID)
+
+
+async def start_ingestion_workers():
+    global _job_queue
+    if _job_queue is not None:
+        return
+    _job_queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+    for worker_number in range(INGESTION_WORKERS):
+        _worker_tasks.append(asyncio.create_task(_worker(worker_number)))
+    _worker_tasks.append(asyncio.create_task(_sweeper()))
+    _worker_tasks.append(asyncio.create_task(_heartbeat()))
+    print(f"[job_worker] {INGESTION_WORKERS} workers de ingesta iniciados ({WORKER_ID})")
+
+
+async def stop_ingestion_workers():
+    global _job_queue
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+    _queued_ids.clear()
+    _job_queue = None
+    shutdown_cpu_pool()
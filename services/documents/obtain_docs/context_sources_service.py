@@ -1,15 +1,30 @@
 import json
 import time
+import asyncio
 import numpy as np
 from services.documents.save_docs.save_requested_document import save_requested_document
 from services.documents.treat_word_list.generate_variations import generate_variations
 from services.helpers.return_collection import return_collection
 from services.helpers.extract_numbers import extract_numbers
-from services.nr_database.nr_connection_service import get_collection_names
+from services.nr_database.collection_alias_service import list_logical_collections
 from services.embeddings.get_embedding_service import get_embeddings
+from services.documents.save_docs.chunk_service import get_document_ids_by_chunk
+from services.documents.obtain_docs.document_details_service import (
+    get_documents_details,
+    details_from_metadata,
+)
+from services.helpers.single_flight import SingleFlight, normalize_query, fingerprint
 
+# Búsquedas idénticas simultáneas comparten una sola recuperación
+context_sources_flight = SingleFlight("get_sources")
 
-def get_context_sources(query: str, word_list, n_documents):
+
+def get_context_sources(query: str, word_list, n_documents, record_request=True):
+    """
+    :param record_request: Si es False no se registran los documentos
+        solicitados; lo hace el llamador (p. ej. cada solicitud que comparte
+        una misma búsqueda).
+    """
     print(
         f"\n\n--------------[contex_sources_service] Iniciando búsqueda con query: {query}"
     )
@@ -22,19 +37,29 @@ def get_context_sources(query: str, word_list, n_documents):
 
     try:
         # Obtener colecciones disponibles
-        collection_names = get_collection_names()
+        collections_info = list_logical_collections()
+        collection_names = [info["name"] for info in collections_info]
         print(f"Valor de colecction names que se obtiene: {collection_names}")
         if not collection_names:
             return {"error": "No se encontraron colecciones en la base de datos."}
 
-        # Generar embedding para la consulta
-        query_embedding = get_embeddings(query)
+        # Generar embedding para la consulta, uno por cada modelo en uso
+        # (durante una reindexación conviven colecciones con modelos distintos)
+        query_embeddings = {}
+        for info in collections_info:
+            model = info["embedding_model"]
+            if model not in query_embeddings:
+                query_embeddings[model] = get_embeddings(query, model=model)
         # print(f"[QUERY_PDF] Embedding generado para la consulta: {query_embedding}")
 
         # Buscar documentos relevantes en todas las colecciones
         all_documents_global = []
         sources_global = []
         considerations_global = []
+        # Un fragmento que se está moviendo de colección existe en ambas por un
+        # momento; se cuenta una sola vez por su id
+        seen_chunk_ids = set()
+        hits = []
         metadata_filters = {}
         full_text_filters = []
         filter_where_document = {"$or": []}
@@ -78,7 +103,9 @@ def get_context_sources(query: str, word_list, n_documents):
         else:
             filter_where_document = {}
 
-        for collection_name in collection_names:
+        for info in collections_info:
+            collection_name = info["name"]
+            query_embedding = query_embeddings[info["embedding_model"]]
             print(f"[contex_sources_service] Buscando en colección: {collection_name}")
             collection = return_collection(collection_name)
             print(f"[contex_sources_service] Tipo de collection: {type(collection)}")
@@ -111,52 +138,18 @@ def get_context_sources(query: str, word_list, n_documents):
                 distances = search_results["distances"][
                     0
                 ]  # Obtener las distancias correspondientes
+                chunk_ids = search_results["ids"][0]
 
                 # print(f"----\nDocumentos\n\n[contex_sources_service] Documentos encontrados en {collection_name}: {documents}")
 
-                # Almacenar los textos de los documentos encontrados y las fuentes
+                # Guardar los fragmentos encontrados; los datos de cada documento
+                # se completan después con una sola consulta a la base de datos
                 for i, doc in enumerate(documents):
+                    if chunk_ids[i] in seen_chunk_ids:
+                        continue
+                    seen_chunk_ids.add(chunk_ids[i])
                     if doc:  # Verificar que el documento no sea None o vacío
-                        # Obtener metadatos correspondientes
-                        document_metadata = metadatas[i]
-                        considerations = document_metadata.get("considerations", "")
-                        copia = document_metadata.get("copia", "")
-                        resolve_page = document_metadata.get("resolve_page", "")
-                        file_path = document_metadata.get("file_path", "")
-                        document_name = document_metadata.get("document_name", "")
-
-                        # Agregar documento y metadatos a las listas correspondientes
-                        all_documents_global.append(
-                            {
-                                "document_name": document_name,
-                                "content": doc,
-                                "resolve_page": resolve_page,
-                                "distance": distances[i],
-                            }
-                        )
-
-                        # Agregar metadatos a la lista de fuentes
-                        sources_global.append(
-                            {
-                                "file_path": file_path,
-                                "document_name": document_name,
-                                "resolve_page": resolve_page,
-                            }
-                        )
-
-                        considerations_global.append(
-                            {
-                                "document_name": document_name,
-                                "considerations": considerations,
-                                "copia": copia,
-                            }
-                        )
-
-                        # Imprimir para depuración
-                        print(
-                            f"[cntx-src-srv] Documento: {document_name}, Página: {resolve_page}, Distancia: {distances[i]}"
-                        )
-
+                        hits.append((chunk_ids[i], doc, metadatas[i], distances[i]))
                     else:
                         print(
                             f"[contex_sources_service] El documento está vacío o es None"
@@ -166,6 +159,60 @@ def get_context_sources(query: str, word_list, n_documents):
                     f"\n\n-----[contex_sources_service] No se encontraron documentos en la colección {collection_name}"
                 )
 
+        # Documento de cada fragmento: de su metadata o, para fragmentos
+        # antiguos, de la tabla chunks (búsqueda inversa por id)
+        document_ids = {
+            chunk_id: metadata["document_id"]
+            for chunk_id, _, metadata, _ in hits
+            if metadata.get("document_id") is not None
+        }
+        document_ids.update(
+            get_document_ids_by_chunk(
+                chunk_id for chunk_id, _, _, _ in hits if chunk_id not in document_ids
+            )
+        )
+        # Datos de los documentos encontrados: una sola consulta para todos
+        documents_details = get_documents_details(document_ids.values())
+
+        for chunk_id, doc, document_metadata, distance in hits:
+            details = documents_details.get(document_ids.get(chunk_id))
+            if details is None:
+                details = details_from_metadata(document_metadata)
+            document_name = details["document_name"]
+            resolve_page = details["resolve_page"]
+
+            # Agregar documento y metadatos a las listas correspondientes
+            all_documents_global.append(
+                {
+                    "document_name": document_name,
+                    "content": doc,
+                    "resolve_page": resolve_page,
+                    "distance": distance,
+                }
+            )
+
+            # Agregar metadatos a la lista de fuentes
+            sources_global.append(
+                {
+                    "file_path": details["file_path"],
+                    "document_name": document_name,
+                    "resolve_page": resolve_page,
+                }
+            )
+
+            considerations_global.append(
+                {
+                    "document_name": document_name,
+                    "considerations": details["considerations"],
+                    "copia": details["copia"],
+                }
+            )
+
+            # Imprimir para depuración
+            print(
+                f"[cntx-src-srv] Documento: {document_name}, Página: {resolve_page}, Distancia: {distance}"
+            )
+
         # Una vez que se han procesado todas las colecciones, puedes ordenar y generar el contexto global
         if all_documents_global:
             all_documents_global.sort(key=lambda x: x["distance"])
@@ -185,7 +232,8 @@ def get_context_sources(query: str, word_list, n_documents):
             # print("\n\n----------------------CONSIDERATIONS--------------------")
             # print(f"[contex_sources_service] consideratios combinado: {json.dumps(considerations_global, indent=4, default=str)}\n\n\n\n")
 
-            save_requested_document(sources_global[:n_documents])
+            if record_request:
+                save_requested_document(sources_global[:n_documents])
 
             return {
                 "context": context,
@@ -198,3 +246,23 @@ def get_context_sources(query: str, word_list, n_documents):
     except Exception as e:
         print(f"[contex_sources_service] Error al procesar la consulta: {str(e)}")
         return {"error": f"Error al procesar la consulta: {str(e)}"}
+
+
+async def get_context_sources_shared(query: str, word_list, n_documents):
+    """
+    get_context_sources en un hilo; las solicitudes simultáneas con la misma
+    pregunta normalizada y parámetros esperan la misma búsqueda. Los
+    documentos solicitados se registran por cada solicitud.
+    """
+    key = fingerprint(normalize_query(query), word_list, n_documents)
+    response = await context_sources_flight.run(
+        key,
+        lambda: asyncio.to_thread(
+            get_context_sources, query, word_list, n_documents, False
+        ),
+    )
+    # Cada solicitud cuenta para la popularidad de los documentos, aunque
+    # haya compartido la búsqueda con otras
+    if response.get("sources"):
+        await asyncio.to_thread(save_requested_document, response["sources"])
+    return dict(response)  # Copia propia: el resultado puede ser compartido
@@ -0,0 +1,51 @@
+from models.database import get_db
+from models.document import Document
+
+
+def details_from_metadata(metadata):
+    """Fragmentos antiguos: los datos del documento vienen en su metadata."""
+    return {
+        "document_name": metadata.get("document_name", ""),
+        "file_path": metadata.get("file_path", ""),
+        "resolve_page": metadata.get("resolve_page", ""),
+        "considerations": metadata.get("considerations", ""),
+        "copia": metadata.get("copia", ""),
+    }
+
+
+def get_documents_details(document_ids):
+    """
+    Datos de varios documentos en una sola consulta.
+
+    :return: Diccionario {document_id: datos} con los documentos encontrados.
+    """
+    document_ids = {int(document_id) for document_id in document_ids}
+    if not document_ids:
+        return {}
+    db = next(get_db())
+    try:
+        documents = (
+            db.query(
+                Document.id,
+                Document.path,
+                Document.resolution_name,
+                Document.resolve_page,
+                Document.considerations,
+                Document.copia,
+            )
+            .filter(Document.id.in_(document_ids))
+            .all()
+        )
+        return {
+            document.id: {
+                "document_name": document.resolution_name,
+                "file_path": document.path,
+                "resolve_page": document.resolve_page or "",
+                "considerations": document.considerations or "",
+                "copia": document.copia or "",
+            }
+            for document in documents
+            if document.resolution_name  # Documentos antiguos: datos en la metadata
+        }
+    finally:
+        db.close()
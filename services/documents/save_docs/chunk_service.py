@@ -0,0 +1,111 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from models.chunk import Chunk
+from models.document import Document
+from models.database import get_db
+from services.embeddings.embedding_cache_service import chunk_text_hash
+
+
+def count_tokens(text: str):
+    # Aproximación por palabras; suficiente para estadísticas por documento
+    return len(text.split())
+
+
+def build_chunk_rows(ids, texts, chunk_indexes, id_document: int, offsets=None):
+    """Filas de la tabla chunks para un lote de fragmentos."""
+    rows = []
+    for position, (chunk_id, text, chunk_index) in enumerate(
+        zip(ids, texts, chunk_indexes)
+    ):
+        char_start, char_end = offsets[position] if offsets else (None, None)
+        rows.append(
+            {
+                "id": chunk_id,
+                "document_id": id_document,
+                "chunk_index": int(chunk_index),
+                "text_hash": chunk_text_hash(text),
+                "token_count": count_tokens(text),
+                "char_start": char_start,
+                "char_end": char_end,
+            }
+        )
+    return rows
+
+
+def insert_chunks(db, rows):
+    """Inserta un lote de fragmentos en una sola sentencia (idempotente al reanudar)."""
+    if not rows:
+        return
+    db.execute(insert(Chunk).values(rows).on_conflict_do_nothing())
+
+
+def get_chunk_ids(document_id: int, db=None):
+    """Ids de los fragmentos del documento en orden; usa embeddings_uuids si es antiguo."""
+    own_session = db is None
+    db = db or next(get_db())
+    try:
+        ids = [
+            row.id
+            for row in db.query(Chunk.id)
+            .filter(Chunk.document_id == document_id)
+            .order_by(Chunk.chunk_index)
+        ]
+        if not ids:
+            document = db.query(Document.embeddings_uuids).filter(
+                Document.id == document_id
+            ).first()
+            ids = list(document.embeddings_uuids or []) if document else []
+        return ids
+    finally:
+        if own_session:
+            db.close()
+
+
+def get_document_ids_by_chunk(chunk_ids):
+    """Búsqueda inversa fragmento -> documento: {chunk_id: document_id}."""
+    chunk_ids = list(chunk_ids)
+    if not chunk_ids:
+        return {}
+    db = next(get_db())
+    try:
+        return {
+            row.id: row.document_id
+            for row in db.query(Chunk.id, Chunk.document_id).filter(
+                Chunk.id.in_(chunk_ids)
+            )
+        }
+    finally:
+        db.close()
+
+
+def get_chunk_stats(db, limit: int = 100, offset: int = 0):
+    """Estadísticas de fragmentos por documento, paginadas."""
+    rows = (
+        db.query(
+            Document.id,
+            Document.name,
+            Document.collection_name,
+            func.count(Chunk.id).label("chunks"),
+            func.coalesce(func.sum(Chunk.token_count), 0).label("tokens"),
+            func.avg(Chunk.token_count).label("avg_tokens"),
+            func.max(Chunk.token_count).label("max_tokens"),
+        )
+        .outerjoin(Chunk, Chunk.document_id == Document.id)
+        .group_by(Document.id)
+        .order_by(Document.id)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    return [
+        {
+            "document_id": row.id,
+            "name": row.name,
+            "collection_name": row.collection_name,
+            "chunks": row.chunks,
+            "tokens": int(row.tokens),
+            "avg_tokens": float(row.avg_tokens) if row.avg_tokens is not None else None,
+            "max_tokens": row.max_tokens,
+        }
+        for row in rows
+    ]
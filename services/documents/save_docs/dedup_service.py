@@ -0,0 +1,165 @@
+from sqlalchemy import case
+from models.database import get_db
+from models.document import Document
+from services.helpers.return_collection import return_collection
+from services.embeddings.save_embedding_service import save_embeddings_batch
+from services.documents.save_docs.upload_service import save_document_details
+from services.documents.save_docs.chunk_service import get_chunk_ids
+from services.documents.save_docs.process_any_document_service import (
+    EMBEDDING_BATCH_SIZE,
+    chunk_uuid,
+)
+
+
+def _document_to_dict(document: Document, db):
+    return {
+        "id": document.id,
+        "name": document.name,
+        "collection_name": document.collection_name,
+        "path": document.path,
+        "chunk_ids": get_chunk_ids(document.id, db),
+        "details": {
+            "resolution_name": document.resolution_name,
+            "number_resolution": document.number_resolution,
+            "resolve_page": document.resolve_page,
+            "considerations": document.considerations,
+            "copia": document.copia,
+        },
+    }
+
+
+def _legacy_details(metadata):
+    """Fragmentos antiguos guardaban los datos de la resolución en su metadata."""
+    return {
+        "resolution_name": metadata.get("document_name"),
+        "number_resolution": metadata.get("number_resolution"),
+        "resolve_page": metadata.get("resolve_page"),
+        "considerations": metadata.get("considerations"),
+        "copia": metadata.get("copia"),
+    }
+
+
+def find_document_by_hash(content_hash, collection_name: str):
+    """
+    Busca un documento con el mismo contenido usando el índice de content_hash.
+    Prefiere el de la misma colección; si no existe, devuelve uno de otra
+    colección para reutilizar sus fragmentos. Solo cuenta un documento que ya
+    tiene fragmentos: uno sin fragmentos aún se está procesando o su ingesta
+    falló, y no es un duplicado.
+
+    :return: Diccionario con los datos del documento o None.
+    """
+    if not content_hash:
+        return None
+
+    db = next(get_db())
+    try:
+        document = (
+            db.query(Document)
+            .filter(Document.content_hash == content_hash)
+            .order_by(
+                case((Document.collection_name == collection_name, 0), else_=1),
+                Document.id,
+            )
+            .first()
+        )
+        if document is None:
+            return None
+        found = _document_to_dict(document, db)
+        if not found["chunk_ids"]:
+            return None  # Sin fragmentos que copiar ni documento indexado
+        return found
+    finally:
+        db.close()
+
+
+def find_document_by_id(document_id):
+    db = next(get_db())
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        return _document_to_dict(document, db) if document else None
+    finally:
+        db.close()
+
+
+def find_document_by_path(path):
+    """Documento registrado con la misma URL pública (mismo nombre en Storage)."""
+    db = next(get_db())
+    try:
+        document = db.query(Document).filter(Document.path == path).first()
+        return _document_to_dict(document, db) if document else None
+    finally:
+        db.close()
+
+
+def duplicate_result(filename, collection_name: str, document):
+    return {
+        "status": "Documento existente en la colección",
+        "filename": filename,
+        "document_id": document["id"],
+        "existing_name": document["name"],
+        "message": f"Este documento ya está registrado en la colección '{collection_name}'.",
+    }
+
+
+def copy_document_chunks(source, id_document: int, collection_name: str):
+    """
+    Copia los fragmentos y embeddings de un documento con el mismo contenido
+    en otra colección, sin volver a extraer el PDF ni llamar a Ollama.
+
+    :param source: Documento de origen (ver find_document_by_hash).
+    :param id_document: ID del documento nuevo.
+    :param collection_name: Colección destino.
+    :return: Número de fragmentos copiados.
+    """
+    source_collection = return_collection(source["collection_name"])
+    target_collection = return_collection(collection_name)
+    if source_collection is None or target_collection is None:
+        raise ValueError("No se encontró la colección de origen o de destino.")
+
+    stored = source_collection.get(
+        ids=source["chunk_ids"],
+        include=["embeddings", "documents", "metadatas"],
+    )
+    rows = sorted(
+        zip(stored["documents"], stored["embeddings"], stored["metadatas"]),  # type: ignore
+        key=lambda row: int(row[2].get("chunk_index", 0)),
+    )
+
+    details = source["details"]
+    if not details["resolution_name"] and rows:
+        details = _legacy_details(rows[0][2])
+    save_document_details(id_document, details)
+
+    db = next(get_db())
+    try:
+        for batch_start in range(0, len(rows), EMBEDDING_BATCH_SIZE):
+            batch = rows[batch_start : batch_start + EMBEDDING_BATCH_SIZE]
+            ids = []
+            metadatas = []
+            for _, _, metadata in batch:
+                chunk_index = int(metadata.get("chunk_index", 0))
+                ids.append(chunk_uuid(id_document, chunk_index))
+                chunk_metadata = {
+                    "document_id": id_document,
+                    "collection_name": collection_name,
+                    "chunk_index": chunk_index,
+                }
+                if metadata.get("number_resolution") is not None:
+                    chunk_metadata["number_resolution"] = metadata["number_resolution"]
+                metadatas.append(chunk_metadata)
+            save_embeddings_batch(
+                [chunk for chunk, _, _ in batch],
+                [list(embedding) for _, embedding, _ in batch],
+                target_collection,
+                metadatas,
+                id_document,
+                db,
+                ids=ids,
+            )
+        print(
+            f"[dedup_service] {len(rows)} fragmentos reutilizados del documento {source['id']}"
+        )
+        return len(rows)
+    finally:
+        db.close()
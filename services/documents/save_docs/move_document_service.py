@@ -0,0 +1,62 @@
+import os
+from services.helpers.return_collection import return_collection, get_collection_model
+from services.embeddings.embedding_cache_service import get_embeddings_cached
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Fragmentos por lectura/escritura al mover entre colecciones
+MOVE_BATCH_SIZE = int(os.getenv("MOVE_BATCH_SIZE", "256"))
+
+
+def copy_chunks_to_collection(chunk_ids, source_name: str, target_name: str):
+    """
+    Copia los fragmentos con sus embeddings, textos y metadata a otra
+    colección, conservando los ids. Si ambas colecciones usan el mismo modelo
+    no se genera ningún embedding.
+
+    :return: Número de fragmentos copiados.
+    """
+    source = return_collection(source_name)
+    target = return_collection(target_name)
+    if source is None or target is None:
+        raise ValueError("No se encontró la colección de origen o de destino.")
+
+    target_model = get_collection_model(target_name)
+    same_model = get_collection_model(source_name) == target_model
+
+    copied = 0
+    for batch_start in range(0, len(chunk_ids), MOVE_BATCH_SIZE):
+        stored = source.get(
+            ids=chunk_ids[batch_start : batch_start + MOVE_BATCH_SIZE],
+            include=["embeddings", "documents", "metadatas"],  # type: ignore
+        )
+        if not stored["ids"]:
+            continue
+        if same_model:
+            embeddings = [list(embedding) for embedding in stored["embeddings"]]  # type: ignore
+        else:
+            # La colección destino se reindexó con otro modelo
+            embeddings = get_embeddings_cached(stored["documents"], model=target_model)
+        target.upsert(
+            ids=stored["ids"],
+            embeddings=embeddings,
+            documents=stored["documents"],
+            metadatas=[
+                {**metadata, "collection_name": target_name}
+                for metadata in stored["metadatas"]  # type: ignore
+            ],
+        )
+        copied += len(stored["ids"])
+    return copied
+
+
+def delete_chunks_from_collection(chunk_ids, collection_name: str):
+    """Elimina los fragmentos indicados en lotes."""
+    collection = return_collection(collection_name)
+    if collection is None:
+        return
+    for batch_start in range(0, len(chunk_ids), MOVE_BATCH_SIZE):
+        collection.delete(ids=chunk_ids[batch_start : batch_start + MOVE_BATCH_SIZE])
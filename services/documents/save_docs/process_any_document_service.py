@@ -1,83 +1,26 @@
 import re
 import os
+import mmap
 import uuid
-import pytesseract
-from pdf2image import convert_from_path
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.schema import Document
 from models.database import get_db
-from services.embeddings.save_embedding_service import save_embeddings
-from services.helpers.return_collection import return_collection
+from services.helpers.cpu_pool import run_cpu_task
+from services.embeddings.embedding_cache_service import get_embeddings_cached
+from services.embeddings.save_embedding_service import save_embeddings_batch
+from services.helpers.return_collection import return_collection, get_collection_model
 from services.documents.treat_docs.info_documents_service import get_info_document
+from services.documents.treat_docs.chunking_service import chunk_documents
+from services.documents.save_docs.upload_service import (
+    document_details_from_parsed,
+    save_document_details,
+)
 from dotenv import load_dotenv
 
 # Especifica la ruta al archivo .env
 dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
 load_dotenv(dotenv_path)
 
-# Leer el contenido del archivo .env
-CHUNK_SIZE = os.getenv("CHUNK_SIZE", "512")  # Establecer valor predeterminado
-CHUNK_OVERLAP = os.getenv("CHUNK_OVERLAP", "40")  # Establecer valor predeterminado
-LENGTH_FUNCTION = os.getenv("LENGTH_FUNCTION", "len")  # Se asigna por defecto a 'len'
-IS_SEPARATOR_REGEX = os.getenv(
-    "IS_SEPARATOR_REGEX", "False"
-)  # Predeterminado a 'False'
-
-# Convertir las variables a los tipos correctos
-try:
-    # Convertir CHUNK_SIZE y CHUNK_OVERLAP a enteros
-    CHUNK_SIZE = int(CHUNK_SIZE)
-    CHUNK_OVERLAP = int(CHUNK_OVERLAP)
-
-    # Convertir LENGTH_FUNCTION (especificamos la función que queremos usar)
-    if LENGTH_FUNCTION == "len":
-        LENGTH_FUNCTION = len  # Asignamos la función len
-
-    # Convertir IS_SEPARATOR_REGEX a booleano
-    IS_SEPARATOR_REGEX = IS_SEPARATOR_REGEX.lower() in ["true", "1", "t", "y", "yes"]
-except ValueError as e:
-    print(f"Error en la conversión de las variables del .env: {e}")
-    # Asignar valores predeterminados si algo falla
-    CHUNK_SIZE = 1024
-    CHUNK_OVERLAP = 80
-    LENGTH_FUNCTION = len
-    IS_SEPARATOR_REGEX = False
-
-# Ahora pasamos estas variables al text_splitter
-print(f"[process_any_doc] CHUNK_SIZE: {CHUNK_SIZE}")
-print(f"[process_any_doc] CHUNK_OVERLAP: {CHUNK_OVERLAP}")
-# print(f"[process_any_doc] LENGTH_FUNCTION: {LENGTH_FUNCTION} ({type(LENGTH_FUNCTION)})")
-# print(
-#     f"[process_any_doc] IS_SEPARATOR_REGEX: {IS_SEPARATOR_REGEX} ({type(IS_SEPARATOR_REGEX)})"
-# )
-
-# Configuración del splitter de texto
-# text_splitter = RecursiveCharacterTextSplitter(
-#     chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=LENGTH_FUNCTION, is_separator_regex=IS_SEPARATOR_REGEX
-# )
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=CHUNK_SIZE,
-    chunk_overlap=CHUNK_OVERLAP,
-    length_function=LENGTH_FUNCTION,
-    is_separator_regex=IS_SEPARATOR_REGEX,
-)
-
-
-def ocr_from_pdf(file_path: str):
-    """Convertir PDF con imágenes a texto usando OCR"""
-    try:
-        pages = convert_from_path(file_path)
-        docs = []
-
-        for page_number, page in enumerate(pages, start=1):
-            text = pytesseract.image_to_string(page)
-            if text.strip():  # Si se detectó texto en la imagen
-                docs.append({"page_content": text, "metadata": {"page": page_number}})
-        print(f"[ocr_from_pdf] Docs generados con OCR: {len(docs)}")
-        return docs
-    except Exception as e:
-        print(f"Error al procesar OCR: {e}")
-        return []
+# Número de fragmentos que se envían juntos a Ollama y a Chroma
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
 
 
 # Función para extraer el número de resolución
@@ -89,135 +32,179 @@ def extract_resolution_from_name(document_name):
     return None  # Si no se encuentra una resolución
 
 
-def process_pdf(file, public_url, collection_name: str, id_document: int):
-    print("\n\n--------------------------[PROCESS_PDF]--------------------------")
-    # print("[process_pdf] file: ", file)
-    # print("[process_pdf] collection_name: ", collection_name)
-    # print("[process_pdf] id_document: ", id_document)
-    db = next(get_db())
-    try:
+def chunk_uuid(id_document: int, chunk_index: int):
+    """ID determinista del fragmento, permite reanudar una ingesta sin duplicar."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"document/{id_document}/chunk/{chunk_index}"))
+
+
+def parse_pdf(file_path: str, filename: str):
+    """
+    Etapa de CPU: extrae la información del PDF y genera los fragmentos.
+    Devuelve solo tipos simples para poder ejecutarse en un pool de procesos.
+
+    :param file_path: Ruta del PDF en disco.
+    :param filename: Nombre original del archivo (se usa si no hay resolución).
+    :return: Diccionario con la metadata del documento y sus fragmentos.
+    """
+    # El PDF se lee desde un mapeo en memoria del archivo: las páginas se cargan
+    # bajo demanda desde el disco en lugar de copiar el archivo a un buffer
+    with open(file_path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped_file:
         (
             resolution,
             number_resolution,
             articles_entities,
             copia,
             resolve,
-            resolve_to_embed,
+            _,
             resolve_page,
-        ) = get_info_document(file)
-        # print(f"\n\n-resolution 1: \n{resolution}")
-        if not resolution:
-            resolution = [f"{os.path.splitext(os.path.basename(file.filename))[0]}"]
-        # print(f"\n\n-number_resolution: \n{number_resolution}")
-        # print("\n----------------------------------------------------------")
-        # print(f"\n-resolution 2: \n{resolution}")
-        # print(f"\n----------------------------------------------------------")
-        # print(f"\n\n-articles_entities: {articles_entities} \n")
-        # print(f"\n\n----------------------------------------------------------")
-        # print(f"\n\n[proces_any_doc] resolve \n{resolve}")
-        # print(f"\n\n----------------------------------------------------------")
-        # print(f"\n\n----------------------------------------------------------")
-        # print("\n\copia: ", copia)
-        if resolve_page is None:
-            resolve_page = 0
-        # print("\n\nresolve_page: ", resolve_page)
-        # print("\ntipo resolve_page: ", type(resolve_page))
-        # print(f"\n\n----------------------------------------------------------")
-        resolve_page = str(resolve_page)
-        # print("\n\nresolve_page: ", resolve_page)
-        # print("\ntipo resolve_page: ", type(resolve_page))
-        # time.sleep(1000)
-
-        if resolve is None:
-            resolve = ""
-        if resolve_to_embed is None:
-            resolve_to_embed = ""
-        documents = [Document(page_content=resolve)]
-        documents_to_embed = [Document(page_content=resolve_to_embed)]
-        # print(f"\n\n----------------------------------------------------------")
-        # print(f"\n\nDocuments: {documents}")
-        ##Generar los chunks a partir del contenido de 'resolve'
-        text_chunks = text_splitter.split_documents(documents)
-        text_chunks_to_embed = text_splitter.split_documents(documents_to_embed)
-        # print(f"\n\n----------------------------------------------------------")
-        # print(f"\n\nText text_chunks_to_embed: {text_chunks}")
-
-        ##Obtener el nombre de la resolución (de la variable 'resolution' que debes haber definido anteriormente)
-        document_name = resolution  # Suponiendo que 'resolution' es la variable que contiene el nombre de la resolución
-        # print(f"\n\n----------------------------------------------------------")
-        # print(f"\n\nDocument name: {document_name}")
-
-        # Procesar los artículos y asociarlos con su página
-        considerations = []
-        if articles_entities is None:
-            articles_entities = []
-        for article in articles_entities:
-            consideration_metadata = {"consideration": article}
-            considerations.append(consideration_metadata)
-        # print(f"\n\n----------------------------------------------------------")
-        # print(f"\n\nConsiderations: {considerations}")
-
-        # Crear metadata base fuera del loop
-        base_metadata = {
-            "document_name": document_name,
-            "file_path": public_url,
-            "resolve_page": resolve_page,  # Asignamos la página de la resolución
-            "collection_name": collection_name,
-            "considerations": considerations,  # Asignamos las consideraciones a la metadata
-            "copia": copia,  #!! Cambiar a copy
-        }
-
-        if number_resolution is not None:
-            base_metadata["number_resolution"] = str(number_resolution)
-        # print(
-        #     f"\n\n-------------------------[proc_any_doc_srv]---------------------------------"
-        # )
-        # print(f"\n\nBase metadata: \n{base_metadata}")
-        # time.sleep(10000)
-
-        # Crear la metadata para los fragmentos de 'resolve'
-        for idx, chunk in enumerate(text_chunks_to_embed):
-            # time.sleep(5)
+        ) = get_info_document(mapped_file, file_path=file_path, embed_text=False)
+    # print(f"\n\n-resolution 1: \n{resolution}")
+    if not resolution:
+        resolution = [f"{os.path.splitext(os.path.basename(filename))[0]}"]
+    if resolve_page is None:
+        resolve_page = 0
+    resolve_page = str(resolve_page)
+
+    if resolve is None:
+        resolve = ""
+    # Una sola fragmentación: el texto para embeddings se deriva de cada
+    # fragmento, por lo que ambas listas quedan alineadas con sus posiciones.
+    # El texto a mostrar no se devuelve: se obtiene de resolve con las posiciones
+    chunked = chunk_documents([resolve])[0]
+
+    # Procesar los artículos y asociarlos con su página
+    considerations = []
+    if articles_entities is None:
+        articles_entities = []
+    for article in articles_entities:
+        consideration_metadata = {"consideration": article}
+        considerations.append(consideration_metadata)
+
+    return {
+        "document_name": resolution,
+        "number_resolution": number_resolution,
+        "resolve_page": resolve_page,
+        "considerations": considerations,
+        "copia": copia,
+        "doc_len": 1,
+        "resolve": resolve,
+        "chunks_to_embed": chunked["chunks_to_embed"],
+        "offsets": chunked["offsets"],
+    }
+
+
+def build_chunk_metadatas(parsed, collection_name: str, id_document: int):
+    """
+    Genera el id y la metadata de cada fragmento a partir del documento procesado.
+    La metadata solo lleva el id del documento, el índice del fragmento y las
+    claves por las que se filtra; los datos de la resolución se guardan una
+    vez en la tabla de documentos.
+
+    :return: Lista de tuplas (fragment_id, metadata) en el orden de los fragmentos.
+    """
+    base_metadata = {
+        "document_id": id_document,
+        "collection_name": collection_name,
+    }
+    if parsed["number_resolution"] is not None:
+        base_metadata["number_resolution"] = str(parsed["number_resolution"])
+
+    return [
+        (chunk_uuid(id_document, idx), {**base_metadata, "chunk_index": idx})
+        for idx in range(len(parsed["chunks_to_embed"]))
+    ]
+
+
+def index_parsed_document(
+    parsed,
+    collection_name: str,
+    id_document: int,
+    start_chunk: int = 0,
+    on_progress=None,
+):
+    """
+    Etapa de E/S: genera los embeddings por lotes y los guarda en la colección.
+    Los fragmentos cuyo texto ya tiene embedding en el caché no pasan por Ollama.
+
+    :param start_chunk: Índice del primer fragmento a procesar (para reanudar).
+    :param on_progress: Callback opcional on_progress(chunks_done, chunks_total).
+    :return: Número de fragmentos del documento.
+    """
+    db = next(get_db())
+    try:
+        collection = return_collection(collection_name)
+        embedding_model = get_collection_model(collection_name)
+        chunks_to_embed = parsed["chunks_to_embed"]
+        offsets = parsed.get("offsets")
+        chunk_metadatas = build_chunk_metadatas(parsed, collection_name, id_document)
+        chunks_total = len(chunk_metadatas)
+        save_document_details(id_document, document_details_from_parsed(parsed))
+
+        for batch_start in range(start_chunk, chunks_total, EMBEDDING_BATCH_SIZE):
+            batch_end = min(batch_start + EMBEDDING_BATCH_SIZE, chunks_total)
+            print(
+                f"\n[process_any_doc] Procesando fragmentos {batch_start + 1}-{batch_end} de {chunks_total}..."
+            )
             try:
+                batch_chunks = chunks_to_embed[batch_start:batch_end]
+                embeddings = get_embeddings_cached(batch_chunks, model=embedding_model)
+                save_embeddings_batch(
+                    batch_chunks,
+                    embeddings,
+                    collection,
+                    [metadata for _, metadata in chunk_metadatas[batch_start:batch_end]],
+                    id_document,
+                    db,
+                    ids=[
+                        fragment_id
+                        for fragment_id, _ in chunk_metadatas[batch_start:batch_end]
+                    ],
+                    offsets=offsets[batch_start:batch_end] if offsets else None,
+                )
+            except Exception as e:
+                # Sin este lote el documento quedaría incompleto: el trabajo
+                # no debe cerrarse, se retoma desde el último lote guardado
                 print(
-                    f"\n[process_resolve_and_articles] Procesando fragmento {idx + 1}..."
+                    f"Error procesando los fragmentos {batch_start + 1}-{batch_end}: {e}"
                 )
+                raise
 
-                # Verificar tipo de chunk y sus atributos
-                # print(f"[process_resolve_and_articles] Tipo de chunk: {type(chunk)}")
-                # print(
-                #     f"\n[process_resolve_and_articles] Contenido del chunk: \n{chunk}"
-                # )
-
-                fragment_id = str(uuid.uuid4())
-                # print("[process_any_doc_service] fragment_id = ", fragment_id)
-
-                # Crear metadata para el fragmento
-                document_metadata = {
-                    **base_metadata,
-                    "uuid": fragment_id,
-                    "chunk_index": str(idx),
-                    "text": text_chunks[idx].page_content,
-                }
-                # print(f"\n\n----------------------------------------------------------")
-                # print(
-                #     f"\n\n[process_resolve_and_articles] Metadata para el fragmento: {json.dumps(document_metadata, indent=4)}"
-                # )
-
-                # Llamar a la función que guarda las embeddings
-                collection = return_collection(collection_name)
-                # print(f"\n\n----------------------------------------------------------")
-                # print(f"\n\n[process_resolve_and_articles] Collection: {collection}")
-
-                save_embeddings(
-                    [chunk.page_content], collection, document_metadata, id_document, db
-                )
+            if on_progress is not None:
+                on_progress(batch_end, chunks_total)
+        return chunks_total
+    finally:
+        db.close()
 
-            except Exception as e:
-                print(f"Error procesando el fragmento {idx + 1}: {e}")
-        return len(documents), len(text_chunks_to_embed)
+
+def process_pdf(
+    file_path: str,
+    filename: str,
+    collection_name: str,
+    id_document: int,
+    start_chunk: int = 0,
+    on_progress=None,
+):
+    """
+    Extrae, fragmenta y guarda los embeddings de un PDF almacenado en disco.
+    El análisis corre en el pool de procesos de la ingesta; este hilo solo
+    espera el resultado y después genera los embeddings.
+
+    :param start_chunk: Índice del primer fragmento a procesar (para reanudar).
+    :param on_progress: Callback opcional on_progress(chunks_done, chunks_total).
+    """
+    print("\n\n--------------------------[PROCESS_PDF]--------------------------")
+    try:
+        parsed = run_cpu_task(parse_pdf, file_path, filename)
+        chunks_total = index_parsed_document(
+            parsed,
+            collection_name,
+            id_document,
+            start_chunk=start_chunk,
+            on_progress=on_progress,
+        )
+        return parsed["doc_len"], chunks_total
     except Exception as e:
         print(f"Error procesando el PDF: {e}")
-        return 0, 0
-    finally:
-        db.close()
+        raise
@@ -0,0 +1,86 @@
+import os
+import hashlib
+import zipfile
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Carpeta donde se guardan los archivos recibidos hasta terminar su ingesta
+INGESTION_SPOOL_PATH = os.getenv("INGESTION_SPOOL_PATH", "./ingestion_spool")
+SPOOL_CHUNK_SIZE = 1024 * 1024  # 1 MB por lectura
+
+
+def spool_stream(stream, spool_name: str):
+    """
+    Copia un flujo binario al directorio de spool por bloques, sin cargarlo
+    completo en memoria, y calcula su hash SHA-256 durante la copia.
+
+    :param stream: Objeto tipo archivo abierto en modo binario.
+    :param spool_name: Nombre del archivo dentro del spool (p. ej. el id del trabajo).
+    :return: Tupla (ruta del archivo en disco, hash SHA-256 en hexadecimal).
+    """
+    os.makedirs(INGESTION_SPOOL_PATH, exist_ok=True)
+    spool_path = os.path.join(INGESTION_SPOOL_PATH, f"{spool_name}.pdf")
+
+    content_hash = hashlib.sha256()
+    with open(spool_path, "wb") as out:
+        while True:
+            block = stream.read(SPOOL_CHUNK_SIZE)
+            if not block:
+                break
+            content_hash.update(block)
+            out.write(block)
+
+    return spool_path, content_hash.hexdigest()
+
+
+def spool_upload(file, spool_name: str):
+    """Guarda en el spool un UploadFile recibido por FastAPI."""
+    file.file.seek(0)
+    return spool_stream(file.file, spool_name)
+
+
+def remove_spooled_file(spool_path):
+    """Elimina la copia local una vez terminada la ingesta."""
+    try:
+        if spool_path and os.path.exists(spool_path):
+            os.remove(spool_path)
+    except Exception as e:
+        print(f"[spool_service] No se pudo eliminar {spool_path}: {e}")
+
+
+def is_zip_upload(file):
+    filename = (file.filename or "").lower()
+    return filename.endswith(".zip") or file.content_type in (
+        "application/zip",
+        "application/x-zip-compressed",
+    )
+
+
+def iter_zip_pdfs(file, max_members: int, max_member_bytes: int):
+    """
+    Recorre los PDF contenidos en un ZIP subido, sin extraerlo completo en memoria.
+
+    :return: Iterador de tuplas (nombre del archivo, flujo binario del miembro).
+    """
+    file.file.seek(0)
+    with zipfile.ZipFile(file.file) as archive:
+        members = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(".pdf")
+            and not os.path.basename(info.filename).startswith(".")
+        ]
+        if len(members) > max_members:
+            raise ValueError(
+                f"El ZIP contiene {len(members)} PDF, el máximo permitido es {max_members}."
+            )
+        for info in members:
+            if info.file_size > max_member_bytes:
+                print(f"[spool_service] Se omite {info.filename}: excede el tamaño máximo")
+                continue
+            with archive.open(info) as member:
+                yield os.path.basename(info.filename), member
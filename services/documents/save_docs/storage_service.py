@@ -0,0 +1,72 @@
+from urllib.parse import unquote
+
+STORAGE_BUCKET = "documents"
+STORAGE_LIST_PAGE_SIZE = 1000
+
+
+def list_storage_files(client_supabase, collection_name: str):
+    """Lista todos los archivos de la carpeta de la colección, página por página."""
+    names = []
+    offset = 0
+    while True:
+        response = client_supabase.storage.from_(STORAGE_BUCKET).list(
+            collection_name,
+            {"limit": STORAGE_LIST_PAGE_SIZE, "offset": offset},
+        )
+        names.extend(item["name"] for item in response if "name" in item)
+        if len(response) < STORAGE_LIST_PAGE_SIZE:
+            return names
+        offset += STORAGE_LIST_PAGE_SIZE
+
+
+def file_exists_in_storage(client_supabase, collection_name: str, filename: str):
+    """Verifica si el archivo ya existe en la carpeta de la colección."""
+    return filename in list_storage_files(client_supabase, collection_name)
+
+
+def upload_to_storage(client_supabase, storage_path: str, file_path: str, content_type):
+    """
+    Sube un archivo local a Supabase Storage y devuelve su URL pública.
+
+    :param client_supabase: Cliente de Supabase.
+    :param storage_path: Ruta de destino dentro del bucket.
+    :param file_path: Ruta del archivo local.
+    :param content_type: Tipo MIME del archivo.
+    :return: URL pública del archivo o None si la subida falla.
+    """
+    # Se pasa la ruta y no los bytes: el cliente abre el archivo y httpx lo
+    # envía por bloques en el multipart, sin cargarlo completo en memoria
+    response = client_supabase.storage.from_(STORAGE_BUCKET).upload(
+        storage_path,
+        file_path,
+        file_options={"Content-Type": f"{content_type}"},  # type: ignore
+    )
+    print("[storage_service] response: ", response)
+
+    if not response.full_path:
+        return None
+
+    return client_supabase.storage.from_(STORAGE_BUCKET).get_public_url(storage_path)
+
+
+def public_url_from_path(client_supabase, storage_path):
+    """URL pública de una ruta del bucket, igual a la que se guarda en Document.path."""
+    return client_supabase.storage.from_(STORAGE_BUCKET).get_public_url(storage_path)
+
+
+def storage_path_from_url(public_url):
+    """Ruta dentro del bucket a partir de la URL pública (None si no es de Storage)."""
+    marker = f"/object/public/{STORAGE_BUCKET}/"
+    if not public_url or marker not in public_url:
+        return None
+    return unquote(public_url.split(marker, 1)[1].split("?", 1)[0])
+
+
+def remove_from_storage(client_supabase, storage_paths):
+    """Elimina varios archivos del bucket, una llamada por cada página de rutas."""
+    storage_paths = list(storage_paths)
+    for batch_start in range(0, len(storage_paths), STORAGE_LIST_PAGE_SIZE):
+        client_supabase.storage.from_(STORAGE_BUCKET).remove(
+            storage_paths[batch_start : batch_start + STORAGE_LIST_PAGE_SIZE]
+        )
+    return len(storage_paths)
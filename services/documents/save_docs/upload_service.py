@@ -1,8 +1,10 @@
 import os
 import pytz
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from models.database import get_db
 from models.document import Document
+from models.ingestion_job import IngestionJob, JobStage
 from dotenv import load_dotenv
 
 # Especifica la ruta al archivo .env
@@ -13,14 +15,25 @@ load_dotenv(dotenv_path)
 TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
 
 
-async def save_document(file, collection_name: str, public_url, physical_path=None):
+def save_document(
+    filename: str,
+    collection_name: str,
+    public_url,
+    physical_path=None,
+    content_hash=None,
+    job_id=None,
+):
     """
     Guarda un archivo en Supabase y registra su información en la base de datos.
     Esta versión no guarda el archivo en el sistema de archivos local.
 
-    :param file: Objeto de archivo cargado por el usuario.
+    :param filename: Nombre original del archivo cargado por el usuario.
     :param collection_name: Nombre de la colección asociada al documento.
     :param storage_path: Ruta donde el archivo está almacenado en Supabase.
+    :param content_hash: Hash SHA-256 del contenido del archivo.
+    :param job_id: Trabajo de ingesta que registra el documento. Su etapa y
+        document_id se guardan en la misma transacción, así un reintento no
+        confunde el documento del propio trabajo con un duplicado.
     :return: Documento registrado en la base de datos o None si ocurre un error.
     """
     db = next(get_db())
@@ -28,24 +41,78 @@ async def save_document(file, collection_name: str, public_url, physical_path=No
     try:
         # Crear un nuevo documento en la base de datos
         document = Document(
-            name=file.filename,
+            name=filename,
             collection_name=collection_name,
             path=public_url,
             physical_path=physical_path,
             created_at=datetime.now(pytz.timezone(TIME_ZONE)),
             embeddings_uuids=[],
+            content_hash=content_hash,
         )
 
         # Registrar el documento en la base de datos
         db.add(document)
+        if job_id is not None:
+            db.flush()  # Asigna document.id
+            db.query(IngestionJob).filter(IngestionJob.id == job_id).update(
+                {
+                    IngestionJob.stage: JobStage.registered,
+                    IngestionJob.document_id: document.id,
+                    IngestionJob.updated_at: datetime.now(pytz.timezone(TIME_ZONE)),
+                },
+                synchronize_session=False,
+            )
         db.commit()
         db.refresh(document)  # Obtener el documento recién creado para devolverlo
 
         return document
 
+    except IntegrityError as e:
+        # Otro trabajo registró el mismo contenido en la colección
+        print(f"Documento duplicado en la colección '{collection_name}': {e}")
+        db.rollback()
+        return None
     except Exception as e:
         print(f"Error al guardar el documento en la base de datos: {e}")
         db.rollback()
         return None
     finally:
         db.close()
+
+
+def document_details_from_parsed(parsed):
+    """Campos de la resolución que se guardan una vez por documento."""
+    document_name = parsed["document_name"]
+    if isinstance(document_name, list):
+        document_name = " ".join(document_name)
+    return {
+        "resolution_name": document_name,
+        "number_resolution": (
+            str(parsed["number_resolution"])
+            if parsed["number_resolution"] is not None
+            else None
+        ),
+        "resolve_page": parsed["resolve_page"],
+        "considerations": " | ".join(
+            c["consideration"] for c in parsed["considerations"]
+        ),
+        "copia": parsed["copia"],
+        # El texto de cada fragmento es resolve[char_start:char_end]
+        "resolve": parsed["resolve"],
+    }
+
+
+def save_document_details(id_document: int, details):
+    """Guarda en el documento los datos de la resolución extraídos del PDF."""
+    db = next(get_db())
+    try:
+        db.query(Document).filter(Document.id == id_document).update(
+            details, synchronize_session=False
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error al guardar los datos del documento {id_document}: {e}")
+        raise
+    finally:
+        db.close()
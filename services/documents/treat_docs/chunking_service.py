@@ -0,0 +1,99 @@
+import os
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from services.documents.treat_docs.info_documents_service import get_resolve_to_embed
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Leer el contenido del archivo .env
+CHUNK_SIZE = os.getenv("CHUNK_SIZE", "512")  # Establecer valor predeterminado
+CHUNK_OVERLAP = os.getenv("CHUNK_OVERLAP", "40")  # Establecer valor predeterminado
+LENGTH_FUNCTION = os.getenv("LENGTH_FUNCTION", "len")  # Se asigna por defecto a 'len'
+IS_SEPARATOR_REGEX = os.getenv(
+    "IS_SEPARATOR_REGEX", "False"
+)  # Predeterminado a 'False'
+
+# Convertir las variables a los tipos correctos
+try:
+    # Convertir CHUNK_SIZE y CHUNK_OVERLAP a enteros
+    CHUNK_SIZE = int(CHUNK_SIZE)
+    CHUNK_OVERLAP = int(CHUNK_OVERLAP)
+
+    # Convertir LENGTH_FUNCTION (especificamos la función que queremos usar)
+    if LENGTH_FUNCTION == "len":
+        LENGTH_FUNCTION = len  # Asignamos la función len
+
+    # Convertir IS_SEPARATOR_REGEX a booleano
+    IS_SEPARATOR_REGEX = IS_SEPARATOR_REGEX.lower() in ["true", "1", "t", "y", "yes"]
+except ValueError as e:
+    print(f"Error en la conversión de las variables del .env: {e}")
+    # Asignar valores predeterminados si algo falla
+    CHUNK_SIZE = 1024
+    CHUNK_OVERLAP = 80
+    LENGTH_FUNCTION = len
+    IS_SEPARATOR_REGEX = False
+
+print(f"[chunking_service] CHUNK_SIZE: {CHUNK_SIZE}")
+print(f"[chunking_service] CHUNK_OVERLAP: {CHUNK_OVERLAP}")
+
+# add_start_index guarda la posición de cada fragmento en el texto original
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=LENGTH_FUNCTION,
+    is_separator_regex=IS_SEPARATOR_REGEX,
+    add_start_index=True,
+)
+
+# Separador entre fragmentos al normalizarlos juntos: solo usa caracteres que
+# get_resolve_to_embed conserva y que ninguno de sus reemplazos modifica
+_SPAN_SEPARATOR = " =(0)= "
+
+
+def _normalize_spans(texts):
+    """
+    Aplica get_resolve_to_embed a todos los fragmentos en una sola pasada sobre
+    un texto concatenado, en lugar de una pasada por fragmento.
+    """
+    if not texts:
+        return []
+    joined = get_resolve_to_embed(_SPAN_SEPARATOR.join(texts))
+    normalized = [part.strip() for part in joined.split(_SPAN_SEPARATOR.strip())]
+    if len(normalized) != len(texts):
+        # El separador apareció en el propio texto: normalizar uno por uno
+        return [get_resolve_to_embed(text) for text in texts]
+    return normalized
+
+
+def chunk_documents(texts):
+    """
+    Fragmenta varios textos en una sola pasada del splitter. Cada fragmento
+    conserva su posición en el texto original, y el texto para embeddings se
+    obtiene normalizando exactamente ese mismo tramo.
+
+    :param texts: Textos a fragmentar (p. ej. la parte resolutiva de cada documento).
+    :return: Por cada texto, un diccionario con listas paralelas 'chunks'
+             (texto a mostrar), 'chunks_to_embed' y 'offsets' (inicio, fin).
+    """
+    results = [{"chunks": [], "chunks_to_embed": [], "offsets": []} for _ in texts]
+    split = text_splitter.create_documents(
+        [text or "" for text in texts],
+        metadatas=[{"text_index": index} for index in range(len(texts))],
+    )
+
+    for chunk in split:
+        result = results[chunk.metadata["text_index"]]
+        start = chunk.metadata["start_index"]
+        result["chunks"].append(chunk.page_content)
+        result["offsets"].append((start, start + len(chunk.page_content)))
+
+    embed_texts = _normalize_spans([chunk.page_content for chunk in split])
+    position = 0
+    for result in results:
+        count = len(result["chunks"])
+        result["chunks_to_embed"] = embed_texts[position : position + count]
+        position += count
+
+    return results
@@ -1,6 +1,11 @@
 import PyPDF2
+import os
+import mmap
 import re
+import shutil
+import tempfile
 import unicodedata
+from services.documents.treat_docs.ocr_service import page_needs_ocr, ocr_missing_pages
 
 
 def clean_text(text):
@@ -14,12 +19,44 @@ def clean_text(text):
     return text
 
 
-def extract_text_from_pages(reader):
+def extract_page_texts(reader, release_memory=None):
     """
-    Extrae el texto de todas las páginas de un archivo PDF desde el inicio hasta encontrar el patrón "RESUELVE:".
+    Extrae una sola vez la capa de texto de cada página del PDF.
 
     Args:
         reader (PdfReader): Objeto PdfReader.
+        release_memory (callable): Opcional, se llama después de cada página para
+            liberar la memoria del archivo (p. ej. las páginas de un mmap).
+
+    Returns:
+        list: Texto de cada página (cadena vacía si la página no tiene texto).
+    """
+    page_texts = []
+    pages = reader.pages
+    if release_memory is not None and len(pages) > 0:
+        release_memory()  # Recorrer el árbol de páginas también toca el archivo
+
+    for page_num, page in enumerate(pages):
+        try:
+            page_texts.append(page.extract_text() or "")
+        except Exception as e:
+            print(f"Error extrayendo texto de la página {page_num}: {e}")
+            page_texts.append("")
+
+        # PyPDF2 guarda en caché cada objeto leído (contenido, imágenes); se
+        # vacía por página para que la memoria no crezca con el tamaño del archivo
+        reader.resolved_objects.clear()
+        if release_memory is not None:
+            release_memory()
+    return page_texts
+
+
+def extract_text_from_pages(page_texts):
+    """
+    Extrae el texto de todas las páginas de un archivo PDF desde el inicio hasta encontrar el patrón "RESUELVE:".
+
+    Args:
+        page_texts (list): Texto de cada página del PDF.
 
     Returns:
         tuple: Texto combinado de todas las páginas desde el inicio hasta encontrar el patrón "RESUELVE:" y el número de la página en la que se encontró.
@@ -39,12 +76,11 @@ def extract_text_from_pages(reader):
     search_patterns = [r"unanimidad,.*?RESUELVE\s*:\s*(Art[íi]culo)"]
 
     try:
-        total_pages = len(reader.pages)
+        total_pages = len(page_texts)
 
         # Iterar desde la página inicial hasta la última página
         for page_num in range(total_pages):
-            page = reader.pages[page_num]
-            page_text = page.extract_text().strip()
+            page_text = page_texts[page_num].strip()
 
             # Primer procesamiento: Replace patterns
             for pattern, replacement in replace_patterns:
@@ -59,7 +95,7 @@ def extract_text_from_pages(reader):
             )
 
             # Actualizar la penúltima página (solo si es válida)
-            if page_num == len(reader.pages) - 3:
+            if page_num == total_pages - 3:
                 third_last_page = page_num
 
             # Buscar el patrón "unanimidad, - - RESUELVE - - : - - Art[ií]culo"
@@ -91,13 +127,13 @@ def extract_text_from_pages(reader):
         return "Error extrayendo texto de varias páginas.", 0
 
 
-def extract_text_resolve(reader, start_page):
+def extract_text_resolve(page_texts, start_page):
     """
     Extrae el texto desde una página específica hasta el final del documento, comenzando en la página especificada.
     Procesa el texto para buscar y remover un patrón específico, almacenando las partes separadamente.
 
     Args:
-        reader (PdfReader): Objeto PdfReader.
+        page_texts (list): Texto de cada página del PDF.
         start_page (int): Número de página desde la cual comenzar a extraer (1-indexed).
 
     Returns:
@@ -134,9 +170,8 @@ def extract_text_resolve(reader, start_page):
 
     try:
         # Iterar desde la página especificada hasta la última página
-        for page_num in range(start_page, len(reader.pages)):
-            page = reader.pages[page_num]
-            page_text = page.extract_text().strip()
+        for page_num in range(start_page, len(page_texts)):
+            page_text = page_texts[page_num].strip()
 
             # Aplicar los patrones de reemplazo
             for pattern, replacement in replace_patterns:
@@ -164,19 +199,18 @@ def extract_text_resolve(reader, start_page):
         return "Error extrayendo resuelve.", "Error extrayendo copia"
 
 
-def extract_text_from_first_page(reader):
+def extract_text_from_first_page(page_texts):
     """
-    Extrae el texto de la primera página de un archivo PDF usando un PdfReader.
+    Extrae el texto de la primera página de un archivo PDF.
 
     Args:
-        reader (PdfReader): Objeto PdfReader.
+        page_texts (list): Texto de cada página del PDF.
 
     Returns:
         str: Texto extraído de la primera página.
     """
     try:
-        first_page = reader.pages[0]
-        return first_page.extract_text()
+        return page_texts[0]
     except Exception as e:
         print(f"Error extrayendo texto de la primera página: {e}")
         return "Error extrayendo texto de la primera página."
@@ -367,50 +401,90 @@ def get_resolve_to_embed(text):
     return text
 
 
-def get_info_document(document):
-    if document:
-        # print(f"\n[info_docs_service] Procesando archivo: {document}")
+def fill_scanned_pages(file, reader, page_texts, file_path=None):
+    """
+    Completa con OCR las páginas que no tienen capa de texto. Tesseract necesita
+    el PDF en disco, por lo que el archivo se copia a un temporal solo si no se
+    conoce su ruta.
+    """
+    if not any(page_needs_ocr(text) for text in page_texts):
+        return page_texts
+
+    if file_path is None:
+        file_path = getattr(file, "name", None)
+    if isinstance(file_path, str) and os.path.isfile(file_path):
+        return ocr_missing_pages(file_path, reader, page_texts)
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    try:
+        file.seek(0)
+        shutil.copyfileobj(file, tmp)
+        tmp.close()
+        return ocr_missing_pages(tmp.name, reader, page_texts)
+    finally:
+        tmp.close()
+        os.remove(tmp.name)
+
+
+def get_info_document(file, file_path=None, embed_text=True):
+    """
+    :param embed_text: Si es False no se genera resolve_to_embed (se devuelve None);
+        el chunking lo obtiene de cada fragmento del texto resolutivo.
+    """
+    if file is not None:
+        # print(f"\n[info_docs_service] Procesando archivo: {file}")
+
+        reader = PyPDF2.PdfReader(file)
+
+        # Con un mmap, las páginas ya leídas se devuelven al kernel (siguen en
+        # la caché de disco y se vuelven a cargar si hacen falta)
+        release_memory = None
+        if isinstance(file, mmap.mmap) and hasattr(mmap, "MADV_DONTNEED"):
+            release_memory = lambda: file.madvise(mmap.MADV_DONTNEED)
 
-        with document.file as file:
-            reader = PyPDF2.PdfReader(file)
+        # Extraer el texto de cada página una sola vez y completar con OCR
+        page_texts = extract_page_texts(reader, release_memory)
+        page_texts = fill_scanned_pages(file, reader, page_texts, file_path)
 
-            # Extraer texto de la primera página
-            text_name_resolution = extract_text_from_first_page(reader)
-            # print("\n\n\Text_name_resolution:\n\n", text_name_resolution)
+        # Extraer texto de la primera página
+        text_name_resolution = extract_text_from_first_page(page_texts)
+        # print("\n\n\Text_name_resolution:\n\n", text_name_resolution)
 
-            resolution, number_resolution = get_resolution(text_name_resolution)
+        resolution, number_resolution = get_resolution(text_name_resolution)
 
-            # Extraer texto de varias páginas
-            total_text, final_page = extract_text_from_pages(reader)
-            # Extraer texto desde "RESUELVE:" y "Copia:"
-            text_resolve, copia = extract_text_resolve(reader, final_page)
+        # Extraer texto de varias páginas
+        total_text, final_page = extract_text_from_pages(page_texts)
+        # Extraer texto desde "RESUELVE:" y "Copia:"
+        text_resolve, copia = extract_text_resolve(page_texts, final_page)
 
-            resolve = get_resolve(text_resolve)
+        resolve = get_resolve(text_resolve)
 
-            if resolution:
-                resolve = resolution + " resuelve: por " + resolve
-            # print("\n\n\n[info_docs_service] RESOLVE:\n", resolve)
+        if resolution:
+            resolve = resolution + " resuelve: por " + resolve
+        # print("\n\n\n[info_docs_service] RESOLVE:\n", resolve)
 
+        resolve_to_embed = None
+        if embed_text:
             resolve_to_embed = get_resolve_to_embed(resolve)
             # print(f"[info_documents_service] resolve_to_embed: {resolve_to_embed[-1000:]}")
             print(
                 f"[info_documents_service] len resolve_to_embed: {len(resolve_to_embed)}"
             )
-            # time.sleep(4000)
+        # time.sleep(4000)
 
-            paragraphs = separate_text_into_paragraphs(total_text)
-            # print("\n\n\t [info_docs_service] Paragraphs:", paragraphs)
+        paragraphs = separate_text_into_paragraphs(total_text)
+        # print("\n\n\t [info_docs_service] Paragraphs:", paragraphs)
 
-            # Procesar los párrafos y extraer los artículos y sus entidades
-            # print("[info_documents_service] resolution: ", resolution)
-            articles_entities = process_paragraphs(paragraphs)
-            # time.sleep(200)
+        # Procesar los párrafos y extraer los artículos y sus entidades
+        # print("[info_documents_service] resolution: ", resolution)
+        articles_entities = process_paragraphs(paragraphs)
+        # time.sleep(200)
 
-            # Imprimir artículos y entidades
-            # if articles_entities:
-            #     # print("\nArtículos y Entidades encontradas:")
-            #     for i, (article_entity, delimiter) in enumerate(articles_entities):
-            #         print(f"{i + 1}: {article_entity.strip()}")
+        # Imprimir artículos y entidades
+        # if articles_entities:
+        #     # print("\nArtículos y Entidades encontradas:")
+        #     for i, (article_entity, delimiter) in enumerate(articles_entities):
+        #         print(f"{i + 1}: {article_entity.strip()}")
 
         return (
             resolution,
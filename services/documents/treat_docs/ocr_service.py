@@ -0,0 +1,242 @@
+import os
+import time
+import hashlib
+import pytesseract
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pdf2image import convert_from_path
+from pdf2image.exceptions import PDFPopplerTimeoutError
+from services.helpers.cpu_pool import (
+    INGESTION_CPU_WORKERS,
+    confine_ingestion_process,
+    in_ingestion_worker,
+)
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Configuración del OCR
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_LANG = os.getenv("OCR_LANG", "spa")
+# Los procesos de OCR comparten los núcleos reservados para la ingesta
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(INGESTION_CPU_WORKERS)))
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "60"))  # Segundos por página
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", "20"))
+OCR_TARGET_PIXELS = int(os.getenv("OCR_TARGET_PIXELS", "3300"))  # Lado mayor en px
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "400"))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "./ocr_cache")
+
+
+def _new_ocr_pool():
+    """
+    Pool de OCR para una sola llamada fuera del pool de ingesta. Cada llamada
+    tiene el suyo: reciclarlo cuando una página se cuelga no afecta las
+    páginas de otros llamadores.
+    """
+    return ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=confine_ingestion_process)
+
+
+def page_needs_ocr(page_text):
+    """Una página necesita OCR si no tiene capa de texto útil."""
+    return len((page_text or "").strip()) < OCR_MIN_TEXT_CHARS
+
+
+def adaptive_dpi(page):
+    """
+    Calcula el DPI para rasterizar una página de modo que su lado mayor
+    tenga aproximadamente OCR_TARGET_PIXELS píxeles.
+
+    Args:
+        page (PageObject): Página de PyPDF2 (mediabox en puntos, 72 por pulgada).
+
+    Returns:
+        int: DPI acotado entre OCR_MIN_DPI y OCR_MAX_DPI.
+    """
+    try:
+        width = float(page.mediabox.width)
+        height = float(page.mediabox.height)
+        longest_inches = max(width, height) / 72
+        if longest_inches <= 0:
+            return OCR_MIN_DPI
+        dpi = int(OCR_TARGET_PIXELS / longest_inches)
+    except Exception:
+        dpi = OCR_MIN_DPI
+    return max(OCR_MIN_DPI, min(OCR_MAX_DPI, dpi))
+
+
+def _cache_key(image, dpi):
+    """Clave de caché: la imagen, el idioma y el DPI con que se reconoció."""
+    digest = hashlib.sha256(f"{OCR_LANG}:{dpi}:".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _cache_file(cache_key):
+    return os.path.join(OCR_CACHE_PATH, cache_key[:2], f"{cache_key}.txt")
+
+
+def _ocr_page(file_path, page_number, dpi):
+    """
+    Rasteriza una sola página y aplica Tesseract. El resultado se guarda en
+    caché por hash de la imagen, idioma y DPI.
+
+    Args:
+        file_path (str): Ruta del PDF en disco.
+        page_number (int): Número de página (0-indexed).
+        dpi (int): Resolución de rasterizado.
+
+    Returns:
+        tuple: (page_number, texto, bool si vino de caché)
+    """
+    try:
+        images = convert_from_path(
+            file_path,
+            dpi=dpi,
+            first_page=page_number + 1,
+            last_page=page_number + 1,
+            timeout=OCR_PAGE_TIMEOUT,
+        )
+    except PDFPopplerTimeoutError as e:
+        print(f"[ocr_service] Timeout al rasterizar la página {page_number}: {e}")
+        return page_number, "", False
+    if not images:
+        return page_number, "", False
+    image = images[0]
+
+    cache_file = _cache_file(_cache_key(image, dpi))
+    if os.path.exists(cache_file):
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return page_number, f.read(), True
+
+    try:
+        text = pytesseract.image_to_string(
+            image, lang=OCR_LANG, timeout=OCR_PAGE_TIMEOUT
+        )
+    except RuntimeError as e:
+        # pytesseract lanza RuntimeError cuando se excede el timeout
+        print(f"[ocr_service] Timeout de OCR en la página {page_number}: {e}")
+        return page_number, "", False
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_file, cache_file)
+    return page_number, text, False
+
+
+def ocr_missing_pages(file_path, reader, page_texts):
+    """
+    Detecta las páginas sin capa de texto, las rasteriza con un DPI adaptativo
+    y ejecuta Tesseract. Los textos obtenidos se insertan en la lista de textos
+    por página.
+
+    Dentro de un worker del pool de ingesta las páginas se procesan en serie
+    (el paralelismo viene de procesar varios documentos a la vez); fuera de él
+    se reparten en el pool de OCR.
+
+    Args:
+        file_path (str): Ruta del PDF en disco.
+        reader (PdfReader): Objeto PdfReader del mismo archivo.
+        page_texts (list): Texto extraído de cada página (se modifica en sitio).
+
+    Returns:
+        list: La lista de textos por página con las páginas escaneadas completadas.
+    """
+    if not OCR_ENABLED:
+        return page_texts
+
+    missing_pages = [
+        page_num for page_num, text in enumerate(page_texts) if page_needs_ocr(text)
+    ]
+    if not missing_pages:
+        return page_texts
+
+    print(f"[ocr_service] Páginas sin capa de texto: {missing_pages}")
+
+    if in_ingestion_worker():
+        results = (
+            _ocr_serial(file_path, page_num, adaptive_dpi(reader.pages[page_num]))
+            for page_num in missing_pages
+        )
+    else:
+        results = _ocr_parallel(file_path, reader, missing_pages)
+
+    cached = 0
+    for page_num, text, from_cache in results:
+        if from_cache:
+            cached += 1
+        if text.strip():
+            page_texts[page_num] = text
+
+    print(
+        f"[ocr_service] OCR completado: {len(missing_pages)} páginas, {cached} desde caché"
+    )
+    return page_texts
+
+
+def _ocr_serial(file_path, page_num, dpi):
+    """
+    OCR de una página en el proceso actual. pdftoppm y Tesseract tienen su
+    propio timeout, así que cada página queda acotada.
+    """
+    try:
+        return _ocr_page(file_path, page_num, dpi)
+    except Exception as e:
+        print(f"[ocr_service] Error al procesar OCR en la página {page_num}: {e}")
+        return page_num, "", False
+
+
+def _ocr_parallel(file_path, reader, missing_pages):
+    """
+    Reparte las páginas en el pool de OCR y devuelve (página, texto, de caché)
+    a medida que terminan.
+    """
+    # Nunca hay más páginas en vuelo que procesos, así cada página empieza al
+    # enviarse y su plazo se cuenta desde ese momento. Margen extra sobre el
+    # timeout de Tesseract para el rasterizado.
+    page_deadline = OCR_PAGE_TIMEOUT * 2
+    pending = list(missing_pages)
+    in_flight = {}  # {future: (page_num, deadline)}
+    pool = _new_ocr_pool()
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < OCR_WORKERS:
+                page_num = pending.pop(0)
+                future = pool.submit(
+                    _ocr_page, file_path, page_num, adaptive_dpi(reader.pages[page_num])
+                )
+                in_flight[future] = (page_num, time.monotonic() + page_deadline)
+
+            next_deadline = min(deadline for _, deadline in in_flight.values())
+            done, _ = wait(
+                in_flight,
+                timeout=max(0, next_deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED,
+            )
+
+            for future in done:
+                page_num, _ = in_flight.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    print(f"[ocr_service] Error al procesar OCR en la página {page_num}: {e}")
+
+            now = time.monotonic()
+            overdue = [future for future, (_, deadline) in in_flight.items() if deadline <= now]
+            if overdue:
+                for future in overdue:
+                    page_num, _ = in_flight.pop(future)
+                    print(f"[ocr_service] La página {page_num} excedió el tiempo máximo")
+                # Las demás páginas en vuelo se reenvían a un pool nuevo; los
+                # procesos del anterior terminan al vencer los timeouts de
+                # pdftoppm y Tesseract
+                pending = [page_num for page_num, _ in in_flight.values()] + pending
+                in_flight = {}
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _new_ocr_pool()
+                print("[ocr_service] Pool de OCR reciclado")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
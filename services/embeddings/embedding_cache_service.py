@@ -0,0 +1,129 @@
+import os
+import re
+import hashlib
+import unicodedata
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+from models.database import get_db
+from models.embedding_cache import EmbeddingCache
+from services.embeddings.get_embedding_service import (
+    MODEL_EMBEDDING,
+    get_embeddings_batch,
+)
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
+load_dotenv(dotenv_path)
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Contadores del proceso para revisar la efectividad del caché
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def normalize_chunk_text(text: str):
+    """Normaliza el texto para que diferencias de espacios o Unicode no cambien la clave."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def chunk_text_hash(text: str):
+    return hashlib.sha256(normalize_chunk_text(text).encode("utf-8")).hexdigest()
+
+
+def _to_bytes(embedding):
+    return np.asarray(embedding, dtype="<f4").tobytes()
+
+
+def _from_bytes(vector):
+    return np.frombuffer(vector, dtype="<f4").tolist()
+
+
+def get_cached_embeddings(text_hashes, model=MODEL_EMBEDDING):
+    """
+    Busca en una sola consulta los embeddings ya calculados.
+
+    :return: Diccionario {text_hash: embedding} con los encontrados.
+    """
+    if not text_hashes:
+        return {}
+    db = next(get_db())
+    try:
+        rows = (
+            db.query(EmbeddingCache.text_hash, EmbeddingCache.vector)
+            .filter(
+                EmbeddingCache.model == model,
+                EmbeddingCache.text_hash.in_(list(set(text_hashes))),
+            )
+            .all()
+        )
+        return {row.text_hash: _from_bytes(row.vector) for row in rows}
+    finally:
+        db.close()
+
+
+def store_embeddings(embeddings_by_hash, model=MODEL_EMBEDDING):
+    """Guarda los embeddings nuevos; si otro proceso ya los guardó, se ignoran."""
+    if not embeddings_by_hash:
+        return
+    db = next(get_db())
+    try:
+        statement = insert(EmbeddingCache).values(
+            [
+                {
+                    "model": model,
+                    "text_hash": text_hash,
+                    "dimensions": len(embedding),
+                    "vector": _to_bytes(embedding),
+                }
+                for text_hash, embedding in embeddings_by_hash.items()
+            ]
+        )
+        db.execute(statement.on_conflict_do_nothing())
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[embedding_cache] No se pudo guardar en el caché: {e}")
+    finally:
+        db.close()
+
+
+def get_embeddings_cached(text_chunks, model=MODEL_EMBEDDING):
+    """
+    Igual que get_embeddings_batch, pero solo envía a Ollama los fragmentos
+    cuyo texto normalizado no está en el caché.
+
+    :return: Un embedding por fragmento, en el mismo orden.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return get_embeddings_batch(text_chunks, model=model)
+    if not text_chunks:
+        return []
+
+    text_hashes = [chunk_text_hash(chunk) for chunk in text_chunks]
+    try:
+        cached = get_cached_embeddings(text_hashes, model)
+    except Exception as e:
+        print(f"[embedding_cache] Caché no disponible, se calcula todo: {e}")
+        cached = {}
+
+    # Un solo embedding por texto repetido dentro del lote
+    missing = {}
+    for text_hash, chunk in zip(text_hashes, text_chunks):
+        if text_hash not in cached and text_hash not in missing:
+            missing[text_hash] = chunk
+
+    cache_stats["hits"] += len(text_hashes) - len(missing)
+    cache_stats["misses"] += len(missing)
+
+    if missing:
+        computed = get_embeddings_batch(list(missing.values()), model=model)
+        new_embeddings = dict(zip(missing.keys(), computed))
+        store_embeddings(new_embeddings, model)
+        cached.update(new_embeddings)
+    else:
+        print(f"[embedding_cache] {len(text_chunks)} embeddings tomados del caché")
+
+    return [cached[text_hash] for text_hash in text_hashes]
@@ -0,0 +1,159 @@
+import time
+
+
+class EmbeddingUnavailableError(RuntimeError):
+    """Ollama no responde: el circuito está abierto y la solicitud se rechaza."""
+
+    pass
+
+
+def _key_name(key):
+    if isinstance(key, tuple):
+        return "/".join(str(part) for part in key)
+    return str(key)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Límite de llamadas simultáneas estilo AIMD. Mientras la latencia de cada
+    llamada se mantiene cerca de la línea base de su clase, el límite sube de a
+    poco (+1 por cada `limit` llamadas exitosas); ante un pico de latencia o un
+    error se reduce multiplicativamente. No es seguro entre hilos: el llamador
+    sostiene el lock.
+
+    La clase de una llamada (p. ej. modelo y tamaño del lote) la decide el
+    llamador: una consulta de un texto no se compara con lotes grandes ni con
+    otro modelo, que tienen otra latencia sin congestión.
+    """
+
+    def __init__(
+        self,
+        min_limit=1,
+        max_limit=4,
+        initial_limit=1,
+        latency_tolerance=2.0,
+        backoff=0.5,
+        baseline_drift=0.02,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.baseline_drift = baseline_drift
+        self.baselines = {}  # {clase: segundos por llamada sin congestión}
+        self.last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def current(self):
+        return max(self.min_limit, int(self.limit))
+
+    def _decrease(self, started_at):
+        # Las llamadas que empezaron antes del último recorte vieron la misma
+        # congestión; no se recorta otra vez por ellas
+        if started_at < self.last_decrease:
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        self.last_decrease = time.monotonic()
+        self.decreases += 1
+
+    def on_success(self, latency, started_at, key=None):
+        baseline = self.baselines.get(key)
+        if baseline is None:
+            # Primera muestra de la clase: solo fija la línea base
+            self.baselines[key] = latency
+            return
+        if latency > baseline * self.latency_tolerance:
+            self._decrease(started_at)
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self.increases += 1
+        # La línea base sigue al mínimo, pero sube despacio si Ollama se vuelve
+        # más lento de forma permanente (otra carga del equipo)
+        if latency < baseline:
+            self.baselines[key] = latency
+        else:
+            self.baselines[key] = baseline + (latency - baseline) * self.baseline_drift
+
+    def on_failure(self, started_at):
+        self._decrease(started_at)
+
+    def stats(self):
+        return {
+            "limit": self.current,
+            "limit_exact": round(self.limit, 3),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "baseline_ms": {
+                _key_name(key): round(baseline * 1000, 1)
+                for key, baseline in self.baselines.items()
+            },
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class CircuitBreaker:
+    """
+    Tras `failure_threshold` errores seguidos el circuito se abre y las
+    solicitudes fallan de inmediato durante `cooldown` segundos. Luego se deja
+    pasar una sola llamada de prueba: si responde, el circuito se cierra; si
+    falla, se abre de nuevo. No es seguro entre hilos: el llamador sostiene el lock.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def rejecting(self):
+        """True mientras el circuito está abierto y no ha pasado el tiempo de espera."""
+        return (
+            self.state == self.OPEN
+            and time.monotonic() - self.opened_at < self.cooldown
+        )
+
+    def can_dispatch(self, in_flight):
+        """Si se puede enviar una llamada ahora; en prueba, solo una a la vez."""
+        if self.state == self.OPEN:
+            if self.rejecting():
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            return in_flight == 0
+        return True
+
+    def on_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+
+    def on_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_in_s": (
+                max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+                if self.state == self.OPEN
+                else 0.0
+            ),
+        }
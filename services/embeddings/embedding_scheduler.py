@@ -0,0 +1,361 @@
+import os
+import time
+import bisect
+import threading
+from collections import deque
+from concurrent.futures import Future
+from services.embeddings.embedding_limits import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    EmbeddingUnavailableError,
+)
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
+load_dotenv(dotenv_path)
+
+# Llamadas simultáneas a Ollama desde este proceso: el límite se ajusta solo
+# (AIMD) entre el mínimo y el máximo según la latencia observada
+EMBEDDING_MIN_CONCURRENCY = int(os.getenv("EMBEDDING_MIN_CONCURRENCY", "1"))
+EMBEDDING_INITIAL_CONCURRENCY = int(os.getenv("EMBEDDING_INITIAL_CONCURRENCY", "1"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+# Latencia por texto sobre la línea base que se considera congestión
+EMBEDDING_LATENCY_TOLERANCE = float(os.getenv("EMBEDDING_LATENCY_TOLERANCE", "2.0"))
+EMBEDDING_BACKOFF = float(os.getenv("EMBEDDING_BACKOFF", "0.5"))
+# Intentos por solicitud; los reintentos vuelven a la cola sin esperas fijas
+EMBEDDING_MAX_ATTEMPTS = int(os.getenv("EMBEDDING_MAX_ATTEMPTS", "3"))
+# Errores seguidos que abren el circuito y segundos hasta la llamada de prueba
+EMBEDDING_BREAKER_FAILURES = int(os.getenv("EMBEDDING_BREAKER_FAILURES", "5"))
+EMBEDDING_BREAKER_COOLDOWN = float(os.getenv("EMBEDDING_BREAKER_COOLDOWN", "30"))
+# Máximo de textos por llamada al juntar solicitudes de la misma prioridad
+EMBEDDING_MICRO_BATCH_SIZE = int(os.getenv("EMBEDDING_MICRO_BATCH_SIZE", "32"))
+# Tiempo que se espera a que lleguen más solicitudes antes de enviar un lote
+EMBEDDING_MICRO_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_MICRO_BATCH_WAIT_MS", "5"))
+# Lo mismo para las consultas de usuarios: preguntas que llegan casi a la vez
+# se envían a Ollama en una sola llamada
+EMBEDDING_QUERY_BATCH_SIZE = int(os.getenv("EMBEDDING_QUERY_BATCH_SIZE", "16"))
+EMBEDDING_QUERY_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_QUERY_BATCH_WAIT_MS", "5"))
+
+# Clases de prioridad: un número menor se atiende primero
+INTERACTIVE = 0  # Consultas de usuarios
+BATCH = 1  # Ingesta, reindexación y movimientos entre colecciones
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Límites superiores (ms) del histograma de espera en cola
+WAIT_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# Límites superiores (textos) del histograma de tamaño de lote
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+
+
+def _size_class(size):
+    """Cubeta del histograma de tamaños: '<=N' o '>N' para el último."""
+    index = bisect.bisect_left(BATCH_SIZE_BUCKETS, size)
+    if index < len(BATCH_SIZE_BUCKETS):
+        return f"<={BATCH_SIZE_BUCKETS[index]}"
+    return f">{BATCH_SIZE_BUCKETS[-1]}"
+
+
+class _EmbeddingRequest:
+    def __init__(self, texts, model, priority):
+        self.texts = texts
+        self.model = model
+        self.priority = priority
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class EmbeddingScheduler:
+    """
+    Cola única de solicitudes de embeddings del proceso. Las consultas de
+    usuarios se atienden antes que la ingesta y las solicitudes pequeñas de
+    la misma prioridad y modelo se envían juntas en una sola llamada.
+
+    El número de llamadas a Ollama en curso lo fija un limitador AIMD, nunca
+    por encima de `max_concurrency`. Si Ollama deja de responder, un circuit
+    breaker rechaza las solicitudes de inmediato en lugar de bloquear a los
+    workers durante los reintentos.
+
+    :param call: Función call(texts, model) que devuelve un embedding por texto.
+    """
+
+    def __init__(
+        self,
+        call,
+        max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+        micro_batch_size=EMBEDDING_MICRO_BATCH_SIZE,
+        micro_batch_wait_ms=EMBEDDING_MICRO_BATCH_WAIT_MS,
+        query_batch_size=EMBEDDING_QUERY_BATCH_SIZE,
+        query_batch_wait_ms=EMBEDDING_QUERY_BATCH_WAIT_MS,
+    ):
+        self._call = call
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_attempts = max(1, EMBEDDING_MAX_ATTEMPTS)
+        self.limiter = AdaptiveConcurrencyLimiter(
+            min_limit=EMBEDDING_MIN_CONCURRENCY,
+            max_limit=self.max_concurrency,
+            initial_limit=EMBEDDING_INITIAL_CONCURRENCY,
+            latency_tolerance=EMBEDDING_LATENCY_TOLERANCE,
+            backoff=EMBEDDING_BACKOFF,
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=EMBEDDING_BREAKER_FAILURES,
+            cooldown=EMBEDDING_BREAKER_COOLDOWN,
+        )
+        # Tamaño y ventana de los lotes por prioridad
+        self.batch_size = {
+            INTERACTIVE: max(1, query_batch_size),
+            BATCH: max(1, micro_batch_size),
+        }
+        self.batch_wait = {
+            INTERACTIVE: max(0.0, query_batch_wait_ms) / 1000,
+            BATCH: max(0.0, micro_batch_wait_ms) / 1000,
+        }
+        self._condition = threading.Condition()
+        self._queues = {priority: deque() for priority in PRIORITY_NAMES}
+        self._workers = []
+        self._in_flight = 0
+        self._stats = {
+            priority: {
+                "requests": 0,
+                "texts": 0,
+                "wait_total_ms": 0.0,
+                "wait_max_ms": 0.0,
+                "wait_histogram": [0] * (len(WAIT_BUCKETS_MS) + 1),
+                "batches": 0,
+                "batched_texts": 0,
+                "batch_size_histogram": [0] * (len(BATCH_SIZE_BUCKETS) + 1),
+            }
+            for priority in PRIORITY_NAMES
+        }
+        self._batches = 0
+        self._batched_texts = 0
+        self._errors = 0
+        self._retries = 0
+
+    def _start_workers(self):
+        # Bajo el lock; los hilos se crean con la primera solicitud
+        while len(self._workers) < self.max_concurrency:
+            worker = threading.Thread(
+                target=self._run,
+                name=f"embedding-scheduler-{len(self._workers)}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def submit(self, texts, model, priority=BATCH):
+        """Encola la solicitud; devuelve un Future con la lista de embeddings."""
+        request = _EmbeddingRequest(list(texts), model, priority)
+        if not request.texts:
+            request.future.set_result([])
+            return request.future
+        with self._condition:
+            if self.breaker.rejecting():
+                self.breaker.rejected += 1
+                request.future.set_exception(self._unavailable())
+                return request.future
+            self._start_workers()
+            self._queues[priority].append(request)
+            self._condition.notify()
+        return request.future
+
+    def embed(self, texts, model, priority=BATCH):
+        """Encola la solicitud y espera sus embeddings."""
+        return self.submit(texts, model, priority).result()
+
+    def _unavailable(self):
+        return EmbeddingUnavailableError(
+            "El servicio de embeddings no responde; se reintentará en "
+            f"{self.breaker.stats()['retry_in_s']:.0f} s."
+        )
+
+    def _reject_queued(self):
+        # Bajo el lock: con el circuito abierto nada de lo encolado se enviará
+        for queue in self._queues.values():
+            while queue:
+                request = queue.popleft()
+                self.breaker.rejected += 1
+                request.future.set_exception(self._unavailable())
+
+    def _can_dispatch(self):
+        if self._next_priority() is None:
+            return False
+        if self._in_flight >= self.limiter.current:
+            return False
+        return self.breaker.can_dispatch(self._in_flight)
+
+    def _next_priority(self):
+        for priority in sorted(self._queues):
+            if self._queues[priority]:
+                return priority
+        return None
+
+    def _take_same_model(self, queue, model, batch, size, limit):
+        """Mueve al lote las solicitudes encoladas del mismo modelo que quepan."""
+        for request in list(queue):
+            if size + len(request.texts) > limit:
+                continue
+            if request.model == model:
+                queue.remove(request)
+                batch.append(request)
+                size += len(request.texts)
+        return size
+
+    def _take_batch(self):
+        with self._condition:
+            while not self._can_dispatch():
+                if self.breaker.rejecting():
+                    self._reject_queued()
+                # Con timeout: el fin del tiempo de espera del circuito no avisa
+                self._condition.wait(timeout=1.0)
+            priority = self._next_priority()
+            queue = self._queues[priority]
+            head = queue.popleft()
+            batch = [head]
+            # El cupo se reserva antes de la ventana, que suelta el lock
+            self._in_flight += 1
+            limit = self.batch_size[priority]
+            size = self._take_same_model(queue, head.model, batch, len(head.texts), limit)
+
+            # Ventana corta para juntar solicitudes que llegan casi a la vez;
+            # se corta si aparece trabajo de mayor prioridad
+            deadline = time.monotonic() + self.batch_wait[priority]
+            while size < limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+                size = self._take_same_model(queue, head.model, batch, size, limit)
+                higher = self._next_priority()
+                if higher is not None and higher < priority:
+                    self._condition.notify()
+                    break
+
+            started = time.monotonic()
+            stats = self._stats[priority]
+            for request in batch:
+                request.attempts += 1
+                if request.attempts > 1:
+                    continue  # La espera se cuenta solo la primera vez
+                wait_ms = (started - request.enqueued_at) * 1000
+                stats["requests"] += 1
+                stats["texts"] += len(request.texts)
+                stats["wait_total_ms"] += wait_ms
+                stats["wait_max_ms"] = max(stats["wait_max_ms"], wait_ms)
+                stats["wait_histogram"][bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            self._batches += 1
+            self._batched_texts += size
+            stats["batches"] += 1
+            stats["batched_texts"] += size
+            stats["batch_size_histogram"][bisect.bisect_left(BATCH_SIZE_BUCKETS, size)] += 1
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            started = time.monotonic()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                embeddings = self._call(texts, batch[0].model)
+            except Exception as e:
+                self._on_failure(batch, started, e)
+                continue
+            with self._condition:
+                self._in_flight -= 1
+                # Línea base por modelo y tamaño de lote
+                self.limiter.on_success(
+                    time.monotonic() - started,
+                    started,
+                    key=(batch[0].model, _size_class(len(texts))),
+                )
+                self.breaker.on_success()
+                self._condition.notify_all()
+            position = 0
+            for request in batch:
+                count = len(request.texts)
+                request.future.set_result(embeddings[position : position + count])
+                position += count
+
+    def _on_failure(self, batch, started, error):
+        print(f"[embedding_scheduler] Error al obtener embeddings: {error}")
+        with self._condition:
+            self._in_flight -= 1
+            self._errors += 1
+            self.limiter.on_failure(started)
+            self.breaker.on_failure()
+            # Los reintentos vuelven al frente de su cola: el límite recién
+            # reducido hace de espera en lugar de un sleep fijo
+            for request in reversed(batch):
+                if self.breaker.rejecting() or request.attempts >= self.max_attempts:
+                    request.future.set_exception(
+                        self._unavailable() if self.breaker.rejecting() else error
+                    )
+                else:
+                    self._retries += 1
+                    self._queues[request.priority].appendleft(request)
+            if self.breaker.rejecting():
+                print("[embedding_scheduler] Circuito abierto: Ollama no responde")
+                self._reject_queued()
+            self._condition.notify_all()
+
+    def stats(self):
+        """Profundidad de las colas y tiempos de espera por prioridad."""
+        with self._condition:
+            priorities = {}
+            for priority, name in PRIORITY_NAMES.items():
+                stats = self._stats[priority]
+                queue = self._queues[priority]
+                priorities[name] = {
+                    "queue_depth": len(queue),
+                    "queued_texts": sum(len(request.texts) for request in queue),
+                    "oldest_wait_ms": (
+                        (time.monotonic() - queue[0].enqueued_at) * 1000 if queue else 0.0
+                    ),
+                    "requests": stats["requests"],
+                    "texts": stats["texts"],
+                    "wait_avg_ms": (
+                        stats["wait_total_ms"] / stats["requests"]
+                        if stats["requests"]
+                        else 0.0
+                    ),
+                    "wait_max_ms": stats["wait_max_ms"],
+                    "wait_histogram_ms": {
+                        **{
+                            f"le_{bucket}": count
+                            for bucket, count in zip(
+                                WAIT_BUCKETS_MS, stats["wait_histogram"]
+                            )
+                        },
+                        "inf": stats["wait_histogram"][-1],
+                    },
+                    "batch_size": self.batch_size[priority],
+                    "batch_wait_ms": self.batch_wait[priority] * 1000,
+                    "batches": stats["batches"],
+                    "avg_batch_size": (
+                        stats["batched_texts"] / stats["batches"] if stats["batches"] else 0.0
+                    ),
+                    "batch_size_histogram": {
+                        **{
+                            f"le_{bucket}": count
+                            for bucket, count in zip(
+                                BATCH_SIZE_BUCKETS, stats["batch_size_histogram"]
+                            )
+                        },
+                        "inf": stats["batch_size_histogram"][-1],
+                    },
+                }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "concurrency": self.limiter.stats(),
+                "circuit_breaker": self.breaker.stats(),
+                "retries": self._retries,
+                "batches": self._batches,
+                "avg_batch_size": (
+                    self._batched_texts / self._batches if self._batches else 0.0
+                ),
+                "errors": self._errors,
+                "priorities": priorities,
+            }
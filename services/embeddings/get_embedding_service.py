@@ -1,7 +1,11 @@
-import ollama
 from dotenv import load_dotenv
 import os
-import time
+from services.ollama.ollama_client_service import get_ollama_client, keep_alive_for
+from services.embeddings.embedding_scheduler import (
+    EmbeddingScheduler,
+    INTERACTIVE,
+    BATCH,
+)
 
 # Especifica la ruta al archivo .env
 dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
@@ -18,44 +22,73 @@ class EmbeddingError(Exception):
     pass
 
 
-def get_embeddings(text_chunk, retries=3, delay=2):
-    # print("[get_embeddings] valor de text_chunk: ", text_chunk)
-    # print("[get_embeddings] tipo de tex_chunk: ", type(text_chunk))
+def request_embeddings(text_chunks, model):
     """
-    Obtiene los embeddings para un fragmento de texto.
+    Una llamada directa a Ollama. Solo la usa el planificador, que decide los
+    reintentos, la concurrencia y cuándo dejar de llamar si Ollama no responde;
+    el resto del código pasa por get_embeddings / get_embeddings_batch.
+    """
+    response = get_ollama_client().embed(
+        model=model, input=text_chunks, keep_alive=keep_alive_for(model)
+    )
+    embeddings = response.get("embeddings")
+
+    if not embeddings or len(embeddings) != len(text_chunks):
+        raise EmbeddingError(
+            f"El modelo no devolvió un embedding por fragmento ({len(text_chunks)} esperados)."
+        )
+
+    print(f"{len(embeddings)} embeddings generados exitosamente.")
+    return embeddings
+
+
+# Todas las solicitudes de embeddings del proceso pasan por este planificador
+embedding_scheduler = EmbeddingScheduler(request_embeddings)
+
+
+def get_embeddings(text_chunk, model=None, priority=INTERACTIVE):
+    """
+    Obtiene los embeddings para un fragmento de texto. Por defecto se encola
+    con prioridad interactiva (consultas de usuarios).
 
     Parámetros:
     - text_chunk (str): El fragmento de texto para el cual se quieren obtener embeddings.
-    - retries (int): Número de reintentos en caso de fallo.
-    - delay (int): Tiempo (en segundos) entre reintentos.
+    - model (str): Modelo de embeddings; por defecto MODEL_EMBEDDING.
+    - priority (int): INTERACTIVE o BATCH.
 
     Retorna:
     - embeddings (list): Lista de embeddings generados.
 
     Lanza:
     - EmbeddingError: Si no se logran obtener embeddings después de varios intentos.
+    - EmbeddingUnavailableError: Si Ollama no responde (circuito abierto).
     """
     if not isinstance(text_chunk, str):
         raise ValueError("El fragmento proporcionado no es una cadena de texto válida.")
 
-    for attempt in range(retries):
-        try:
-            response = ollama.embeddings(model=MODEL_EMBEDDING, prompt=text_chunk)
-            embeddings = response.get("embedding")
+    return embedding_scheduler.embed([text_chunk], model or MODEL_EMBEDDING, priority)[0]
 
-            if embeddings is None:
-                raise ValueError(
-                    f"El modelo no devolvió embeddings válidos. Respuesta: {response}"
-                )
 
-            print(f"Embeddings generados exitosamente en el intento {attempt + 1}.")
-            return embeddings
+def get_embeddings_batch(text_chunks, model=None, priority=BATCH):
+    """
+    Obtiene los embeddings de varios fragmentos. Por defecto se encola con
+    prioridad de ingesta, detrás de las consultas de usuarios.
+
+    Parámetros:
+    - text_chunks (list): Lista de fragmentos de texto.
+    - model (str): Modelo de embeddings; por defecto MODEL_EMBEDDING.
+    - priority (int): INTERACTIVE o BATCH.
+
+    Retorna:
+    - embeddings (list): Un embedding por fragmento, en el mismo orden.
 
-        except Exception as e:
-            print(f"Error al obtener embeddings en el intento {attempt + 1}: {e}")
-            if attempt < retries - 1:
-                print(f"Reintentando en {delay} segundos...")
-                time.sleep(delay)
+    Lanza:
+    - EmbeddingError: Si no se logran obtener embeddings después de varios intentos.
+    - EmbeddingUnavailableError: Si Ollama no responde (circuito abierto).
+    """
+    if not text_chunks:
+        return []
+    if not all(isinstance(chunk, str) for chunk in text_chunks):
+        raise ValueError("Todos los fragmentos deben ser cadenas de texto válidas.")
 
-    # Si llegamos aquí, todos los intentos fallaron
-    raise EmbeddingError("No se pudo generar embeddings después de varios intentos.")
+    return embedding_scheduler.embed(text_chunks, model or MODEL_EMBEDDING, priority)
@@ -0,0 +1,567 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import threading
+import traceback
+import pytz
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import or_, and_
+from models.database import get_db
+from models.document import Document
+from models.ingestion_job import JobStatus
+from models.reindex_job import ReindexJob
+from services.documents.save_docs.chunk_service import get_document_ids_by_chunk
+from services.embeddings.get_embedding_service import MODEL_EMBEDDING
+from services.embeddings.embedding_cache_service import get_embeddings_cached
+from services.nr_database.nr_connection_service import (
+    get_collection,
+    create_collection,
+    delete_collection,
+)
+from services.nr_database.collection_alias_service import (
+    COLLECTION_ALIAS_TTL,
+    get_aliases,
+    swap_alias,
+    invalidate_aliases,
+)
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
+load_dotenv(dotenv_path)
+
+TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
+REINDEX_PAGE_SIZE = int(os.getenv("REINDEX_PAGE_SIZE", "256"))  # Fragmentos por lectura
+REINDEX_CONCURRENCY = int(os.getenv("REINDEX_CONCURRENCY", "2"))  # Lotes en paralelo
+REINDEX_STALE_SECONDS = int(os.getenv("REINDEX_STALE_SECONDS", "600"))
+REINDEX_MAX_ATTEMPTS = int(os.getenv("REINDEX_MAX_ATTEMPTS", "3"))
+REINDEX_RECONCILE_ROUNDS = int(os.getenv("REINDEX_RECONCILE_ROUNDS", "5"))
+REINDEX_SWEEP_INTERVAL = int(os.getenv("REINDEX_SWEEP_INTERVAL", "60"))
+REINDEX_HEARTBEAT_INTERVAL = int(os.getenv("REINDEX_HEARTBEAT_INTERVAL", "60"))
+# Eliminar la colección anterior una vez hecho el cambio
+REINDEX_DROP_OLD = os.getenv("REINDEX_DROP_OLD", "true").lower() == "true"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Referencias a las tareas en ejecución para que no las recoja el recolector
+_running_tasks = set()
+# Trabajos encolados o en curso en este proceso
+_active_jobs = set()
+_sweeper_task = None
+
+
+def _now():
+    return datetime.now(pytz.timezone(TIME_ZONE))
+
+
+def reindex_job_to_dict(job: ReindexJob):
+    return {
+        "job_id": job.id,
+        "collection_name": job.collection_name,
+        "source_collection": job.source_collection,
+        "target_collection": job.target_collection,
+        "source_model": job.source_model,
+        "target_model": job.target_model,
+        "status": job.status.value if job.status else None,
+        "offset": job.offset,
+        "total": job.total,
+        "processed": job.processed,
+        "swapped": bool(job.swapped),
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+def _shadow_name(collection_name):
+    # Chroma admite hasta 63 caracteres en el nombre de la colección
+    return f"{collection_name[:50]}-{uuid.uuid4().hex[:8]}"
+
+
+def create_reindex_jobs(collection_names=None, target_model=MODEL_EMBEDDING):
+    """
+    Crea un trabajo por cada colección cuyo modelo de embeddings difiere del
+    modelo destino. Las colecciones con un trabajo activo se omiten.
+
+    :param collection_names: Nombres lógicos a migrar; todas si es None.
+    :return: Lista de trabajos creados.
+    """
+    aliases = get_aliases(refresh=True)
+    db = next(get_db())
+    try:
+        active = {
+            job.collection_name
+            for job in db.query(ReindexJob).filter(
+                ReindexJob.status.in_([JobStatus.pending, JobStatus.running])
+            )
+        }
+        jobs = []
+        for name, alias in sorted(aliases.items()):
+            if collection_names and name not in collection_names:
+                continue
+            if alias["embedding_model"] == target_model or name in active:
+                continue
+            job = ReindexJob(
+                id=str(uuid.uuid4()),
+                collection_name=name,
+                source_collection=alias["physical_name"],
+                target_collection=_shadow_name(name),
+                source_model=alias["embedding_model"],
+                target_model=target_model,
+                status=JobStatus.pending,
+                created_at=_now(),
+                updated_at=_now(),
+            )
+            db.add(job)
+            jobs.append(job)
+        db.commit()
+        return [reindex_job_to_dict(job) for job in jobs]
+    finally:
+        db.close()
+
+
+def get_reindex_job(job_id):
+    db = next(get_db())
+    try:
+        job = db.query(ReindexJob).filter(ReindexJob.id == job_id).first()
+        return reindex_job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+
+def _claimable_filter():
+    stale_before = _now() - timedelta(seconds=REINDEX_STALE_SECONDS)
+    return and_(
+        ReindexJob.attempts < REINDEX_MAX_ATTEMPTS,
+        or_(
+            ReindexJob.status == JobStatus.pending,
+            and_(
+                ReindexJob.status == JobStatus.running,
+                ReindexJob.updated_at < stale_before,
+            ),
+        ),
+    )
+
+
+def _claim(job_id):
+    db = next(get_db())
+    try:
+        claimed = (
+            db.query(ReindexJob)
+            .filter(ReindexJob.id == job_id, _claimable_filter())
+            .update(
+                {
+                    ReindexJob.status: JobStatus.running,
+                    ReindexJob.worker_id: WORKER_ID,
+                    ReindexJob.attempts: ReindexJob.attempts + 1,
+                    ReindexJob.updated_at: _now(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return claimed == 1
+    finally:
+        db.close()
+
+
+def _update(job_id, **fields):
+    db = next(get_db())
+    try:
+        fields[ReindexJob.updated_at.key] = _now()
+        db.query(ReindexJob).filter(ReindexJob.id == job_id).update(
+            fields, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _touch(job_id):
+    """Renueva el heartbeat mientras el trabajo siga siendo de este worker."""
+    db = next(get_db())
+    try:
+        db.query(ReindexJob).filter(
+            ReindexJob.id == job_id,
+            ReindexJob.status == JobStatus.running,
+            ReindexJob.worker_id == WORKER_ID,
+        ).update({ReindexJob.updated_at: _now()}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+@contextmanager
+def _heartbeat(job_id):
+    """
+    Renueva el heartbeat cada REINDEX_HEARTBEAT_INTERVAL mientras dura el
+    bloque, para que otro proceso no tome el trabajo por abandonado durante
+    una ronda, una reconciliación o la espera del paso 4.
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(REINDEX_HEARTBEAT_INTERVAL):
+            try:
+                _touch(job_id)
+            except Exception as e:
+                print(f"[reindex_service] Error al renovar el heartbeat de {job_id}: {e}")
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def list_resumable_reindex_jobs():
+    db = next(get_db())
+    try:
+        return [
+            job.id
+            for job in db.query(ReindexJob.id)
+            .filter(_claimable_filter())
+            .order_by(ReindexJob.created_at)
+        ]
+    finally:
+        db.close()
+
+
+def _reindex_page(target, target_model, page):
+    """Genera los embeddings de una página con el modelo nuevo y la escribe en la sombra."""
+    if not page["ids"]:
+        return 0
+    embeddings = get_embeddings_cached(page["documents"], model=target_model)
+    # upsert: repetir una página al reanudar no duplica fragmentos
+    target.upsert(
+        ids=page["ids"],
+        embeddings=embeddings,
+        documents=page["documents"],
+        metadatas=page["metadatas"],
+    )
+    return len(page["ids"])
+
+
+def _documents_in_collection(document_ids, collection_name):
+    """Devuelve los documentos que siguen registrados en la colección lógica."""
+    db = next(get_db())
+    try:
+        return {
+            row.id
+            for row in db.query(Document.id).filter(
+                Document.id.in_(set(document_ids)),
+                Document.collection_name == collection_name,
+            )
+        }
+    finally:
+        db.close()
+
+
+def _copy_missing(source, target, target_model, pool, delete_extra=True, collection_name=None):
+    """
+    Sincroniza por ids los fragmentos escritos o borrados en el origen
+    mientras se recorría. Con collection_name solo se copian los fragmentos
+    que siguen en la tabla chunks con su documento en la colección; así no
+    reviven los borrados o movidos después del cambio de alias. Devuelve el
+    número de diferencias encontradas.
+    """
+    source_ids = set(source.get(include=[])["ids"])
+    target_ids = set(target.get(include=[])["ids"])
+    missing = sorted(source_ids - target_ids)
+    if collection_name is not None and missing:
+        document_ids = get_document_ids_by_chunk(missing)
+        kept_documents = _documents_in_collection(document_ids.values(), collection_name)
+        missing = [
+            chunk_id
+            for chunk_id in missing
+            if document_ids.get(chunk_id) in kept_documents
+        ]
+    extra = sorted(target_ids - source_ids) if delete_extra else []
+
+    pages = []
+    for batch_start in range(0, len(missing), REINDEX_PAGE_SIZE):
+        pages.append(
+            source.get(
+                ids=missing[batch_start : batch_start + REINDEX_PAGE_SIZE],
+                include=["documents", "metadatas"],
+            )
+        )
+    list(pool.map(lambda page: _reindex_page(target, target_model, page), pages))
+    if extra:
+        target.delete(ids=extra)
+    return len(missing) + len(extra)
+
+
+def _apply_late_deletes(source, target, collection_name):
+    """
+    Borra de la sombra los fragmentos que se eliminaron o movieron desde un
+    proceso que aún usaba el alias anterior. Un fragmento que falta en el
+    origen se conserva solo si su documento sigue en la colección (p. ej. uno
+    escrito en la sombra con el alias nuevo). Devuelve los fragmentos borrados.
+    """
+    source_ids = set(source.get(include=[])["ids"])
+    candidates = sorted(set(target.get(include=[])["ids"]) - source_ids)
+    if not candidates:
+        return 0
+
+    document_ids = {}
+    for batch_start in range(0, len(candidates), REINDEX_PAGE_SIZE):
+        page = target.get(
+            ids=candidates[batch_start : batch_start + REINDEX_PAGE_SIZE],
+            include=["metadatas"],
+        )
+        for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+            if metadata and metadata.get("document_id") is not None:
+                document_ids[chunk_id] = int(metadata["document_id"])
+    document_ids.update(
+        get_document_ids_by_chunk(
+            chunk_id for chunk_id in candidates if chunk_id not in document_ids
+        )
+    )
+
+    kept_documents = _documents_in_collection(document_ids.values(), collection_name)
+    deleted = [
+        chunk_id
+        for chunk_id in candidates
+        if document_ids.get(chunk_id) not in kept_documents
+    ]
+    for batch_start in range(0, len(deleted), REINDEX_PAGE_SIZE):
+        target.delete(ids=deleted[batch_start : batch_start + REINDEX_PAGE_SIZE])
+    return len(deleted)
+
+
+def _finalize(job_id, job, target, pool, wait_for_aliases=True):
+    """
+    Paso 4, después del cambio de alias: copia lo que llegó al origen mientras
+    otros procesos refrescaban sus alias, aplica los borrados de esa ventana,
+    elimina el origen y recién entonces marca el trabajo como completado.
+    Si el proceso cae aquí, el trabajo sigue 'running' con swapped=True y se
+    retoma desde este paso.
+    """
+    source = get_collection(job["source_collection"])
+    if source is not None:
+        if wait_for_aliases:
+            # Otros procesos pueden escribir en el origen hasta refrescar sus alias
+            time.sleep(COLLECTION_ALIAS_TTL + 1)
+        # Lo borrado o movido con el alias nuevo sigue en el origen: no se copia
+        _copy_missing(
+            source,
+            target,
+            job["target_model"],
+            pool,
+            delete_extra=False,
+            collection_name=job["collection_name"],
+        )
+        deleted = _apply_late_deletes(source, target, job["collection_name"])
+        if deleted:
+            print(f"[reindex_service] {deleted} fragmentos borrados durante el cambio de alias")
+        if REINDEX_DROP_OLD:
+            delete_collection(job["source_collection"])
+            print(f"[reindex_service] Colección anterior '{job['source_collection']}' eliminada")
+
+    _update(job_id, status=JobStatus.completed, processed=target.count())
+
+
+def _drop_shadow(target_collection):
+    """Elimina la colección sombra de un trabajo que falló antes del cambio de alias."""
+    try:
+        if get_collection(target_collection) is not None:
+            delete_collection(target_collection)
+            print(f"[reindex_service] Colección sombra '{target_collection}' eliminada")
+    except Exception as e:
+        print(f"[reindex_service] Error al eliminar la sombra '{target_collection}': {e}")
+
+
+def run_reindex_job(job_id):
+    """
+    Copia todos los fragmentos de la colección a una colección sombra con los
+    embeddings del modelo nuevo y luego cambia el alias. Mientras tanto las
+    consultas siguen usando la colección anterior. El avance se guarda después
+    de cada ronda, por lo que un trabajo interrumpido continúa desde ahí.
+    """
+    if not _claim(job_id):
+        print(f"[reindex_service] Trabajo {job_id} tomado por otro worker o terminado")
+        return
+
+    job = get_reindex_job(job_id)
+    if job is None:
+        return
+    print(
+        f"[reindex_service] Reindexando '{job['collection_name']}': "
+        f"{job['source_model']} -> {job['target_model']} desde el fragmento {job['offset']}"
+    )
+
+    try:
+        with _heartbeat(job_id):
+            if job["swapped"]:
+                # El alias ya apunta a la sombra; solo falta cerrar la migración
+                target = get_collection(job["target_collection"])
+                if target is None:
+                    raise ValueError(f"La colección '{job['target_collection']}' no existe.")
+                with ThreadPoolExecutor(max_workers=REINDEX_CONCURRENCY) as pool:
+                    _finalize(job_id, job, target, pool, wait_for_aliases=False)
+                print(f"[reindex_service] Trabajo {job_id} completado")
+                return
+
+            source = get_collection(job["source_collection"])
+            if source is None:
+                raise ValueError(f"La colección '{job['source_collection']}' no existe.")
+            target = get_collection(job["target_collection"]) or create_collection(
+                job["target_collection"]
+            )
+
+            offset = job["offset"]
+            processed = job["processed"]
+            _update(job_id, total=source.count())
+
+            with ThreadPoolExecutor(max_workers=REINDEX_CONCURRENCY) as pool:
+                # 1. Recorrer el origen por páginas, varias páginas en paralelo por ronda
+                while True:
+                    pages = []
+                    for page_number in range(REINDEX_CONCURRENCY):
+                        page = source.get(
+                            limit=REINDEX_PAGE_SIZE,
+                            offset=offset + page_number * REINDEX_PAGE_SIZE,
+                            include=["documents", "metadatas"],
+                        )
+                        if not page["ids"]:
+                            break
+                        pages.append(page)
+                    if not pages:
+                        break
+
+                    written = list(
+                        pool.map(
+                            lambda page: _reindex_page(target, job["target_model"], page),
+                            pages,
+                        )
+                    )
+                    offset += sum(len(page["ids"]) for page in pages)
+                    processed += sum(written)
+                    _update(job_id, offset=offset, processed=processed)  # Checkpoint
+
+                # 2. Aplicar lo que cambió en el origen durante el recorrido
+                for _ in range(REINDEX_RECONCILE_ROUNDS):
+                    if _copy_missing(source, target, job["target_model"], pool) == 0:
+                        break
+
+                # 3. Cambio atómico del alias junto con la marca swapped del trabajo
+                db = next(get_db())
+                try:
+                    swapped = swap_alias(
+                        job["collection_name"],
+                        job["source_collection"],
+                        job["target_collection"],
+                        job["target_model"],
+                        db,
+                    )
+                    if not swapped:
+                        db.rollback()
+                        raise ValueError("El alias de la colección cambió durante la migración.")
+                    db.query(ReindexJob).filter(ReindexJob.id == job_id).update(
+                        {
+                            ReindexJob.swapped: True,
+                            ReindexJob.processed: target.count(),
+                            ReindexJob.updated_at: _now(),
+                        },
+                        synchronize_session=False,
+                    )
+                    db.commit()
+                finally:
+                    db.close()
+                invalidate_aliases()
+                print(f"[reindex_service] Alias '{job['collection_name']}' -> '{job['target_collection']}'")
+
+                # 4. Escrituras y borrados tardíos, eliminar el origen y completar
+                _finalize(job_id, job, target, pool)
+            print(f"[reindex_service] Trabajo {job_id} completado")
+
+    except Exception as e:
+        print(f"[reindex_service] Error en el trabajo {job_id}: {e}")
+        traceback.print_exc()
+        current = get_reindex_job(job_id)
+        if current["swapped"] and current["attempts"] < REINDEX_MAX_ATTEMPTS:
+            # El alias ya cambió: el trabajo vuelve a 'pending' y el barrido lo
+            # retoma para terminar el paso 4 (hasta REINDEX_MAX_ATTEMPTS intentos)
+            _update(job_id, status=JobStatus.pending, error=str(e))
+        elif current["swapped"]:
+            # Las consultas ya usan la sombra; solo queda el origen sin eliminar
+            print(
+                f"[reindex_service] Trabajo {job_id} agotó sus intentos; la colección "
+                f"'{job['source_collection']}' no se eliminó"
+            )
+            _update(job_id, status=JobStatus.failed, error=str(e))
+        else:
+            _update(job_id, status=JobStatus.failed, error=str(e))
+            _drop_shadow(job["target_collection"])
+
+
+async def _run_jobs(job_ids):
+    # Una colección a la vez: la concurrencia se limita dentro de cada trabajo
+    for job_id in job_ids:
+        try:
+            await asyncio.to_thread(run_reindex_job, job_id)
+        finally:
+            _active_jobs.discard(job_id)
+
+
+def start_reindex(job_ids):
+    """Ejecuta los trabajos en segundo plano dentro del event loop actual."""
+    job_ids = [job_id for job_id in job_ids if job_id not in _active_jobs]
+    if not job_ids:
+        return None
+    _active_jobs.update(job_ids)
+    task = asyncio.create_task(_run_jobs(job_ids))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return task
+
+
+async def _sweeper():
+    """Retoma los trabajos pendientes y los abandonados por un proceso caído."""
+    while True:
+        try:
+            job_ids = await asyncio.to_thread(list_resumable_reindex_jobs)
+            job_ids = [job_id for job_id in job_ids if job_id not in _active_jobs]
+            if job_ids:
+                print(f"[reindex_service] Retomando {len(job_ids)} trabajos de reindexación")
+                start_reindex(job_ids)
+        except Exception as e:
+            print(f"[reindex_service] Error al buscar trabajos pendientes: {e}")
+        await asyncio.sleep(REINDEX_SWEEP_INTERVAL)
+
+
+async def resume_reindex_jobs():
+    """Inicia el barrido periódico de trabajos de reindexación."""
+    global _sweeper_task
+    if _sweeper_task is None:
+        _sweeper_task = asyncio.create_task(_sweeper())
+
+
+async def stop_reindex_jobs():
+    global _sweeper_task
+    tasks = [task for task in [_sweeper_task, *_running_tasks] if task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _sweeper_task = None
+
+
+if __name__ == "__main__":
+    # python -m services.embeddings.reindex_service --collections 2023 2024
+    parser = argparse.ArgumentParser(description="Reindexa colecciones con otro modelo")
+    parser.add_argument("--collections", nargs="*", default=None)
+    parser.add_argument("--model", default=MODEL_EMBEDDING)
+    args = parser.parse_args()
+
+    created = create_reindex_jobs(args.collections, args.model)
+    for job_id in [job["job_id"] for job in created] or list_resumable_reindex_jobs():
+        run_reindex_job(job_id)
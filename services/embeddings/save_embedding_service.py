@@ -1,102 +1,63 @@
-from sqlalchemy import func
-from models.document import Document
-from services.embeddings.get_embedding_service import get_embeddings
+from services.documents.save_docs.chunk_service import build_chunk_rows, insert_chunks
 
 
-def save_embeddings(chunk, collection, document_metadata, id_document, db):
-    # print(f"\n\n\n\n------------------[save_embeddings]-------------------")
-    # print("\n[save_embedding_service] id_document: ", id_document)
-    # print("\n[save_embedding_service] db: ", db)
-    # print(
-    #     "\n[save_embedding_service] document_metadata['uuid']: ",
-    #     document_metadata["uuid"],
-    # )
-
-    # print(f"\nValor de chunk: \n{chunk}")
-    # print(f"\nValor de chunk[0]: \n{chunk[0]}")
-    print(f"\nValor de collection: \n{collection}")
-    print(f"\nValor de collection type: \n{type(collection)}")
-    # print(f"\nValor de document_metadata: \n{json.dumps(document_metadata, indent=4)}")
-    # print(
-    #     f"\nValor de chunk_index: {document_metadata['chunk_index']} \n(Tipo: {type(document_metadata['chunk_index'])})"
-    # )
-
-    try:
-        # Llamada a Ollama para obtener el embedding del fragmento
-        embedding = get_embeddings(chunk[0])
-
-        # Comprobamos si el embedding se generó correctamente
-        if not embedding:
-            raise ValueError(
-                "Error al generar el embedding: el resultado está vacío o no es válido."
-            )
-
-        # Aplanar los metadatos de las consideraciones en una cadena simple
-        simplified_metadata = document_metadata.copy()
-        if "considerations" in simplified_metadata:
-            simplified_metadata["considerations"] = " | ".join(
-                c["consideration"]  # Solo tomamos la consideración, sin la página
-                for c in simplified_metadata["considerations"]
-            )
-
-        # Guardamos el embedding en la colección Chroma
-        collection.add(
-            ids=[str(document_metadata["uuid"])],  # ID único para cada fragmento
-            embeddings=[embedding],  # El embedding generado
-            documents=[chunk[0]],  # El fragmento de texto
-            metadatas=[simplified_metadata],  # Los metadatos asociados
+def flatten_metadata(document_metadata):
+    """Aplana las consideraciones en una cadena simple (Chroma no admite listas)."""
+    simplified_metadata = document_metadata.copy()
+    if isinstance(simplified_metadata.get("considerations"), list):
+        simplified_metadata["considerations"] = " | ".join(
+            c["consideration"] for c in simplified_metadata["considerations"]
         )
+    return simplified_metadata
+
+
+def save_embeddings_batch(
+    chunks, embeddings, collection, metadatas, id_document, db, ids=None, offsets=None
+):
+    """
+    Guarda varios fragmentos con sus embeddings en una sola escritura a Chroma
+    y un solo INSERT en la tabla chunks.
+
+    :param chunks: Textos de los fragmentos.
+    :param embeddings: Embedding de cada fragmento (mismo orden).
+    :param collection: Colección de Chroma destino.
+    :param metadatas: Metadata de cada fragmento, debe incluir 'chunk_index'.
+    :param id_document: ID del documento en la base de datos.
+    :param db: Sesión de la base de datos.
+    :param ids: ID de cada fragmento; si no se indica se toma de metadata['uuid'].
+    :param offsets: Posiciones (inicio, fin) de cada fragmento en el texto, opcional.
+    """
+    if not chunks:
+        return []
+    if len(chunks) != len(embeddings) or len(chunks) != len(metadatas):
+        raise ValueError("Fragmentos, embeddings y metadatos no tienen el mismo tamaño.")
+
+    if ids is None:
+        ids = [str(metadata["uuid"]) for metadata in metadatas]
+
+    collection.add(
+        ids=ids,
+        embeddings=embeddings,
+        documents=chunks,
+        metadatas=[flatten_metadata(metadata) for metadata in metadatas],
+    )
+    print(f"{len(ids)} embeddings guardados en la colección.")
 
-        print(
-            f"Embedding guardado para el fragmento {document_metadata['chunk_index']}."
+    try:
+        insert_chunks(
+            db,
+            build_chunk_rows(
+                ids,
+                chunks,
+                [metadata["chunk_index"] for metadata in metadatas],
+                id_document,
+                offsets=offsets,
+            ),
         )
+        db.commit()
+    except Exception as db_error:
+        db.rollback()
+        print(f"Error al guardar datos en la base de datos: {db_error}")
+        raise
 
-        try:
-            # Recuperar el documento correspondiente
-            document = db.query(Document).filter_by(id=id_document).first()
-            # print("[\n\nACTUALIZAR EMBEDDING]")
-            # print("[save_embeddings] document antes de actualizar: ", document)
-            # print(
-            #     "[save_embeddings] document.embeddings_uuids antes de actualizar: ",
-            #     document.embeddings_uuids,
-            # )
-            # print(
-            #     "[save_embeddings] document_metadata['uuid']: ",
-            #     document_metadata["uuid"],
-            # )
-
-            if not document:
-                raise ValueError(
-                    f"Documento con ID {id_document} no encontrado en la base de datos."
-                )
-
-            if document.embeddings_uuids is None:
-                document.embeddings_uuids = []
-
-            # print(f"[save_embeddings] Añadiendo UUID: {document_metadata['uuid']}")
-            document.embeddings_uuids = func.array_append(
-                document.embeddings_uuids, str(document_metadata["uuid"])
-            )
-
-            # print(
-            #     f"[save_embeddings] document.embeddings_uuids después de append: {document.embeddings_uuids}"
-            # )
-
-            db.commit()
-            # Imprime el estado del documento después de la actualización
-            # print("[save_embeddings] document después de actualizar: ", document)
-            # print(
-            #     "[save_embeddings] document.embeddings_uuids después de actualizar: ",
-            #     document.embeddings_uuids,
-            # )
-
-            print(
-                f"Documento actualizado en embedding_uuid {document_metadata['chunk_index']}."
-            )
-        except Exception as db_error:
-            db.rollback()  # Revertir cualquier cambio en caso de error
-            print(f"Error al guardar datos en la base de datos: {db_error}")
-    except ValueError as ve:
-        print(f"Error de validación: {ve}")
-    except Exception as e:
-        print(f"Error inesperado al guardar embeddings: {e}")
+    return ids
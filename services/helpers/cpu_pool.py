@@ -0,0 +1,125 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
+load_dotenv(dotenv_path)
+
+
+def _parse_cores(value):
+    """Convierte '2-5,7' en {2, 3, 4, 5, 7}. Vacío: sin núcleos reservados."""
+    cores = set()
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cores.update(range(int(first), int(last) + 1))
+        else:
+            cores.add(int(part))
+    if cores and hasattr(os, "sched_getaffinity"):
+        # Solo los núcleos que este proceso puede usar
+        cores &= os.sched_getaffinity(0)
+    return cores
+
+
+# Núcleos reservados para la ingesta (análisis de PDF, OCR, normalización)
+INGESTION_CPU_CORES = _parse_cores(os.getenv("INGESTION_CPU_CORES", ""))
+# Por defecto un proceso por núcleo reservado; sin reserva, la mitad de la CPU
+INGESTION_CPU_WORKERS = int(
+    os.getenv(
+        "INGESTION_CPU_WORKERS",
+        str(len(INGESTION_CPU_CORES) or max(1, (os.cpu_count() or 2) // 2)),
+    )
+)
+# Prioridad menor que la del servidor para que el chat siga respondiendo
+INGESTION_CPU_NICE = int(os.getenv("INGESTION_CPU_NICE", "10"))
+
+_cpu_pool = None
+_lock = threading.Lock()
+# True dentro de los procesos del pool (los inicializa confine_ingestion_process)
+_in_ingestion_worker = False
+
+
+def confine_ingestion_process():
+    """
+    Inicializador de los procesos de ingesta: los fija a los núcleos reservados
+    y baja su prioridad. Un worker no debe crear pools propios: sus procesos
+    heredarían la afinidad y volverían a sumar INGESTION_CPU_NICE.
+    """
+    global _in_ingestion_worker
+    _in_ingestion_worker = True
+    if INGESTION_CPU_CORES and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, INGESTION_CPU_CORES)
+        except OSError as e:
+            print(f"[cpu_pool] No se pudo fijar la afinidad de CPU: {e}")
+    if INGESTION_CPU_NICE > 0 and hasattr(os, "nice"):
+        try:
+            os.nice(INGESTION_CPU_NICE)
+        except OSError as e:
+            print(f"[cpu_pool] No se pudo bajar la prioridad: {e}")
+
+
+def in_ingestion_worker():
+    """True si el código se ejecuta dentro de un proceso del pool de ingesta."""
+    return _in_ingestion_worker
+
+
+def get_cpu_pool():
+    """Pool de procesos compartido por todo el trabajo de CPU de la ingesta."""
+    global _cpu_pool
+    with _lock:
+        if _cpu_pool is None:
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=INGESTION_CPU_WORKERS,
+                initializer=confine_ingestion_process,
+            )
+            cores = sorted(INGESTION_CPU_CORES) or "todos"
+            print(
+                f"[cpu_pool] Pool de ingesta creado con {INGESTION_CPU_WORKERS} procesos "
+                f"(núcleos: {cores}, nice: {INGESTION_CPU_NICE})"
+            )
+        return _cpu_pool
+
+
+def _discard_pool(pool):
+    """Descarta un pool roto (p. ej. un proceso terminado por falta de memoria)."""
+    global _cpu_pool
+    with _lock:
+        if _cpu_pool is pool:
+            _cpu_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_cpu_task(function, *args):
+    """Ejecuta la función en el pool de ingesta y espera el resultado (desde un hilo)."""
+    pool = get_cpu_pool()
+    try:
+        return pool.submit(function, *args).result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+async def run_cpu_task_async(function, *args):
+    """Igual que run_cpu_task, sin bloquear el event loop."""
+    pool = get_cpu_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, function, *args)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+def shutdown_cpu_pool():
+    global _cpu_pool
+    with _lock:
+        pool, _cpu_pool = _cpu_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
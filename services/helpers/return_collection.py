@@ -1,20 +1,32 @@
 from services.nr_database.nr_connection_service import (
     get_collection,
     create_collection,
-    get_collection_names,
+)
+from services.nr_database.collection_alias_service import (
+    resolve_alias,
+    register_alias,
+    list_logical_collections,
 )
 
 
 def return_collection(collection_name):
-    collection = get_collection(collection_name)
+    # El nombre lógico se resuelve a la colección física vigente (cambia tras reindexar)
+    physical_name = resolve_alias(collection_name)["physical_name"]
+    collection = get_collection(physical_name)
     if collection is None:
-        collection = create_collection(collection_name)
+        collection = create_collection(physical_name)
         if collection is None:
             print(f"Error al crear la colección {collection_name}")
             return None
+        register_alias(collection_name, physical_name)
         return collection
     return collection
 
 
+def get_collection_model(collection_name):
+    """Modelo de embeddings con el que se deben consultar y escribir los fragmentos."""
+    return resolve_alias(collection_name)["embedding_model"]
+
+
 def get_list_collections():
-    return get_collection_names()
+    return [alias["name"] for alias in list_logical_collections()]
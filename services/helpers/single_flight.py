@@ -0,0 +1,52 @@
+import re
+import json
+import asyncio
+import hashlib
+import unicodedata
+
+
+def normalize_query(query):
+    """Pregunta normalizada para detectar solicitudes idénticas."""
+    text = unicodedata.normalize("NFKC", query or "").casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip("¿?¡!. ")
+
+
+def fingerprint(*parts):
+    """Huella corta de cualquier combinación de valores serializables."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class SingleFlight:
+    """
+    Agrupa las llamadas concurrentes con la misma clave: la primera ejecuta
+    el trabajo y las demás esperan su resultado (o su excepción).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}  # {clave: asyncio.Task}
+        self._stats = {"calls": 0, "shared": 0}
+
+    async def run(self, key, factory):
+        self._stats["calls"] += 1
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(
+                lambda done: self._calls.pop(key) if self._calls.get(key) is done else None
+            )
+        else:
+            self._stats["shared"] += 1
+            print(f"[single_flight] {self.name}: solicitud idéntica en curso, se comparte")
+        # Si un solicitante se desconecta, el trabajo sigue para los demás
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "calls": self._stats["calls"],
+            "shared": self._stats["shared"],
+        }
@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+from collections import deque
+from dotenv import load_dotenv
+from services.metrics.save_metrics.save_metrics_response import (
+    save_metrics_responses_bulk,
+)
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Las métricas de respuesta se guardan por lotes en segundo plano
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "2"))  # Segundos
+METRICS_BATCH_SIZE = int(os.getenv("METRICS_BATCH_SIZE", "50"))
+# Máximo de métricas pendientes; si la base no responde se descartan las más antiguas
+METRICS_BUFFER_MAX = int(os.getenv("METRICS_BUFFER_MAX", "5000"))
+
+_pending = deque()
+_wakeup = None
+_task = None
+_stats = {
+    "recorded": 0,
+    "saved": 0,
+    "rejected": 0,  # Filas que la base rechazó (se descartan sin perder el lote)
+    "failed": 0,
+    "dropped": 0,
+    "flushes": 0,
+    "flush_ms_total": 0.0,
+}
+
+
+def record_response_metrics(metrics_data):
+    """
+    Encola las métricas de una respuesta sin bloquear. Debe llamarse desde
+    el event loop.
+    """
+    global _wakeup
+    if len(_pending) >= METRICS_BUFFER_MAX:
+        _pending.popleft()
+        _stats["dropped"] += 1
+    _pending.append(metrics_data)
+    _stats["recorded"] += 1
+    if _task is None or _task.done():
+        start_metrics_recorder()
+    if len(_pending) >= METRICS_BATCH_SIZE:
+        _wakeup.set()
+
+
+async def _flush():
+    while _pending:
+        batch = [_pending.popleft() for _ in range(min(METRICS_BATCH_SIZE, len(_pending)))]
+        start = time.time()
+        try:
+            saved = await asyncio.to_thread(save_metrics_responses_bulk, batch)
+            _stats["saved"] += saved
+            _stats["rejected"] += len(batch) - saved
+        except Exception as e:
+            _stats["failed"] += len(batch)
+            print(f"[metrics_recorder] Error al guardar {len(batch)} métricas: {e}")
+        _stats["flushes"] += 1
+        _stats["flush_ms_total"] += (time.time() - start) * 1000
+
+
+async def _run():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=METRICS_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await _flush()
+
+
+def start_metrics_recorder():
+    global _task, _wakeup
+    if _task is not None and not _task.done():
+        return
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run())
+    print(
+        f"[metrics_recorder] Guardado por lotes cada {METRICS_FLUSH_INTERVAL}s "
+        f"o {METRICS_BATCH_SIZE} métricas"
+    )
+
+
+async def stop_metrics_recorder():
+    """Detiene la tarea y guarda las métricas pendientes al apagar la aplicación."""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    await _flush()
+
+
+def get_metrics_recorder_stats():
+    return {
+        "pending": len(_pending),
+        "recorded": _stats["recorded"],
+        "saved": _stats["saved"],
+        "rejected": _stats["rejected"],
+        "failed": _stats["failed"],
+        "dropped": _stats["dropped"],
+        "flushes": _stats["flushes"],
+        "avg_flush_ms": (
+            _stats["flush_ms_total"] / _stats["flushes"] if _stats["flushes"] else None
+        ),
+        "flush_interval_s": METRICS_FLUSH_INTERVAL,
+        "batch_size": METRICS_BATCH_SIZE,
+    }
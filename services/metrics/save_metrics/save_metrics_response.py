@@ -1,50 +1,69 @@
-import json
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError, DataError
 from models.metric import Metric
 from models.metric_extra_response import MetricExtraResponse
+from models.database import SessionLocal
 
 
-def save_metrics_response(db: Session, metrics_data):
-    print(f"[save_metrics_response] db {db}")
-    print(f"[save_metrics_response] metrics_data {json.dumps(metrics_data, indent=4)}")
-
-    # memory_initial = metrics_data["memory_usage"]["initial"]
-    # memory_final = metrics_data["memory_usage"]["final"]
-
+def _build_metrics(metrics_data):
+    # Ollama puede enviar las claves con null; las columnas son NOT NULL
+    cpu_usage = metrics_data.get("cpu_usage") or {}
+    memory_usage = metrics_data.get("memory_usage") or {}
     metrics = Metric(
-        total_time=metrics_data.get("total_duration", 0),
-        cpu_initial=metrics_data.get("cpu_usage", {}).get("initial", 0),
-        cpu_final=metrics_data.get("cpu_usage", {}).get("final", 0),
-        memory_initial=metrics_data.get("memory_usage", {}).get("initial", 0),
-        memory_final=metrics_data.get("memory_usage", {}).get("final", 0),
+        total_time=metrics_data.get("total_duration") or 0,
+        cpu_initial=cpu_usage.get("initial") or 0,
+        cpu_final=cpu_usage.get("final") or 0,
+        memory_initial=memory_usage.get("initial") or 0,
+        memory_final=memory_usage.get("final") or 0,
     )
-
-    # Guardar las métricas en la base de datos
-    db.add(metrics)
-    db.commit()
-    db.refresh(metrics)
-
-    # Crear la asociación entre la métrica y el documento
-    metric_extra_response = MetricExtraResponse(
-        metric_id=metrics.id,
-        load_model_duration=metrics_data.get("load_duration", 0),
-        number_tokens_prompt=metrics_data.get("prompt_eval_count", 0),
-        time_evaluating_prompt=metrics_data.get("prompt_eval_duration", 0),
-        number_tokens_response=metrics_data.get("eval_count", 0),
-        time_generating_response=metrics_data.get("eval_duration", 0),
-        time_searching_documents=metrics_data.get("search_documents_time", 0),
+    metrics.response_metrics = MetricExtraResponse(
+        load_model_duration=metrics_data.get("load_duration") or 0,
+        number_tokens_prompt=metrics_data.get("prompt_eval_count") or 0,
+        time_evaluating_prompt=metrics_data.get("prompt_eval_duration") or 0,
+        number_tokens_response=metrics_data.get("eval_count") or 0,
+        time_generating_response=metrics_data.get("eval_duration") or 0,
+        time_searching_documents=metrics_data.get("search_documents_time") or 0,
+        prompt_version=metrics_data.get("prompt_version"),
+        cancelled=bool(metrics_data.get("cancelled")),
     )
+    return metrics
 
-    # Guardar la asociación en la base de datos
-    db.add(metric_extra_response)
-    db.commit()
 
-    # Opcionalmente, actualizar las métricas con las asociaciones
-    db.refresh(metrics)
-    db.refresh(metric_extra_response)
+def _save_one_by_one(db, metrics_list):
+    """Guarda fila por fila y descarta solo las que la base rechaza."""
+    saved = 0
+    for metrics_data in metrics_list:
+        try:
+            db.add(_build_metrics(metrics_data))
+            db.commit()
+            saved += 1
+        except (IntegrityError, DataError) as e:
+            db.rollback()
+            print(f"[save_metrics_response] Métrica descartada: {e.orig}")
+    return saved
 
-    print(
-        f"Metricas guardadas: {metrics}, metricas extra guardadas: {metric_extra_response}"
-    )
 
-    return metrics, metric_extra_response
+def save_metrics_responses_bulk(metrics_list):
+    """
+    Guarda las métricas de varias respuestas con una sola sesión y un solo
+    commit; SQLAlchemy agrupa los INSERT de cada tabla. Si una fila viola una
+    restricción se reintenta fila por fila para no perder el resto del lote.
+
+    Returns:
+        int: Métricas guardadas; las demás se descartaron por datos inválidos.
+    """
+    db = SessionLocal()
+    try:
+        try:
+            db.add_all([_build_metrics(metrics_data) for metrics_data in metrics_list])
+            db.commit()
+            saved = len(metrics_list)
+        except (IntegrityError, DataError):
+            db.rollback()
+            saved = _save_one_by_one(db, metrics_list)
+        print(f"[save_metrics_response] {saved} métricas de respuesta guardadas")
+        return saved
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+import pytz
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert
+from models.database import get_db
+from models.collection_alias import CollectionAlias
+from models.reindex_job import ReindexJob
+from services.embeddings.get_embedding_service import MODEL_EMBEDDING
+from services.nr_database.nr_connection_service import get_collection_names
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
+load_dotenv(dotenv_path)
+
+TIME_ZONE = os.getenv("TIME_ZONE", "America/Guayaquil")
+# Cada proceso relee los alias con esta frecuencia; tras un cambio de alias,
+# los demás procesos lo ven como máximo después de este tiempo
+COLLECTION_ALIAS_TTL = float(os.getenv("COLLECTION_ALIAS_TTL", "5"))
+
+_aliases = {}
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def _load_aliases():
+    db = next(get_db())
+    try:
+        return {
+            alias.name: {
+                "name": alias.name,
+                "physical_name": alias.physical_name,
+                "embedding_model": alias.embedding_model,
+            }
+            for alias in db.query(CollectionAlias).all()
+        }
+    finally:
+        db.close()
+
+
+def get_aliases(refresh=False):
+    """Alias vigentes {nombre lógico: {physical_name, embedding_model}}."""
+    global _aliases, _loaded_at
+    with _lock:
+        if refresh or time.monotonic() - _loaded_at > COLLECTION_ALIAS_TTL:
+            _aliases = _load_aliases()
+            _loaded_at = time.monotonic()
+        return dict(_aliases)
+
+
+def invalidate_aliases():
+    global _loaded_at
+    with _lock:
+        _loaded_at = 0.0
+
+
+def register_alias(name, physical_name=None, embedding_model=MODEL_EMBEDDING):
+    """Registra un nombre lógico nuevo; si ya existe, no lo modifica."""
+    db = next(get_db())
+    try:
+        db.execute(
+            insert(CollectionAlias)
+            .values(
+                name=name,
+                physical_name=physical_name or name,
+                embedding_model=embedding_model,
+                updated_at=datetime.now(pytz.timezone(TIME_ZONE)),
+            )
+            .on_conflict_do_nothing()
+        )
+        db.commit()
+    finally:
+        db.close()
+    invalidate_aliases()
+
+
+def resolve_alias(name):
+    """
+    Colección física y modelo de embeddings de un nombre lógico. Los nombres
+    sin alias son colecciones creadas con el modelo configurado actualmente.
+    """
+    alias = get_aliases().get(name)
+    if alias is None:
+        alias = get_aliases(refresh=True).get(name)
+    if alias is None:
+        return {"name": name, "physical_name": name, "embedding_model": MODEL_EMBEDDING}
+    return alias
+
+
+def swap_alias(name, source_physical, target_physical, target_model, db):
+    """
+    Cambia el alias a la colección nueva dentro de la transacción de `db`.
+    Solo se aplica si el alias sigue apuntando al origen esperado.
+
+    :return: True si el alias se actualizó.
+    """
+    updated = (
+        db.query(CollectionAlias)
+        .filter(
+            CollectionAlias.name == name,
+            CollectionAlias.physical_name == source_physical,
+        )
+        .update(
+            {
+                CollectionAlias.physical_name: target_physical,
+                CollectionAlias.embedding_model: target_model,
+                CollectionAlias.updated_at: datetime.now(pytz.timezone(TIME_ZONE)),
+            },
+            synchronize_session=False,
+        )
+    )
+    return updated == 1
+
+
+def sync_collection_aliases():
+    """
+    Registra con el modelo actual las colecciones de Chroma que aún no tienen
+    alias. Se ejecuta al iniciar, antes de cualquier cambio de MODEL_EMBEDDING,
+    para que las colecciones existentes conserven el modelo con el que se crearon.
+    """
+    db = next(get_db())
+    try:
+        referenced = {alias.physical_name for alias in db.query(CollectionAlias).all()}
+        referenced.update(job.target_collection for job in db.query(ReindexJob).all())
+        referenced.update(job.source_collection for job in db.query(ReindexJob).all())
+    finally:
+        db.close()
+
+    for physical_name in get_collection_names():
+        if physical_name not in referenced:
+            print(f"[collection_alias] Registrando la colección '{physical_name}'")
+            register_alias(physical_name)
+
+
+def list_logical_collections():
+    """Colecciones que ven la API y las consultas, con su colección física."""
+    return sorted(get_aliases().values(), key=lambda alias: alias["name"])
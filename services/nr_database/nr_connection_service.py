@@ -54,3 +54,12 @@ def create_collection(collection_name):
         )
     except Exception as e:
         raise Exception(f"Error al crear la colección '{collection_name}': {str(e)}")
+
+
+# Función para eliminar una collection
+def delete_collection(collection_name):
+    try:
+        client.delete_collection(name=collection_name)
+        return True
+    except ValueError:
+        return False
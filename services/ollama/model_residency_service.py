@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from services.ollama.ollama_client_service import get_ollama_async_client, keep_alive_for
+from services.embeddings.get_embedding_service import MODEL_EMBEDDING
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
+load_dotenv(dotenv_path)
+
+# Modelo de chat que se precarga al iniciar; vacío para no precargar ninguno
+MODEL_CHAT = os.getenv("MODEL_CHAT", "")
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+# Modelos que este proceso mantiene cargados; el menos usado se descarga
+OLLAMA_MAX_RESIDENT_MODELS = int(os.getenv("OLLAMA_MAX_RESIDENT_MODELS", "2"))
+# Cargar el modelo de chat en cuanto llega /get_sources, en paralelo a la búsqueda
+PRELOAD_ON_SOURCES = os.getenv("PRELOAD_ON_SOURCES", "true").lower() == "true"
+
+# Modelos cargados en orden de uso: {modelo: {"kind", "last_used", "loaded_at"}}
+_resident = OrderedDict()
+_loading = {}  # Cargas en curso: {modelo: asyncio.Task}
+_unloading = set()  # Referencias a las descargas en curso
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "load_ms_total": 0.0}
+
+
+def _pinned_models():
+    # Los modelos configurados no se descargan por el LRU
+    return {model for model in (MODEL_EMBEDDING, MODEL_CHAT) if model}
+
+
+def mark_used(model, kind="chat"):
+    """
+    Registra el uso de un modelo. Devuelve la lista de modelos que salen del
+    LRU y deben descargarse de Ollama.
+    """
+    if not model:
+        return []
+    with _lock:
+        if model in _resident:
+            _stats["hits"] += 1
+            _resident.move_to_end(model)
+            _resident[model]["last_used"] = time.time()
+            return []
+        _stats["misses"] += 1
+        _resident[model] = {"kind": kind, "last_used": time.time(), "loaded_at": time.time()}
+
+        evicted = []
+        pinned = _pinned_models()
+        for candidate in list(_resident):
+            if len(_resident) <= max(OLLAMA_MAX_RESIDENT_MODELS, len(pinned & set(_resident))):
+                break
+            if candidate in pinned or candidate == model:
+                continue
+            evicted.append((candidate, _resident.pop(candidate)["kind"]))
+            _stats["evictions"] += 1
+        return evicted
+
+
+async def _unload(model, kind):
+    # keep_alive=0 le pide a Ollama liberar el modelo de inmediato
+    client = get_ollama_async_client()
+    try:
+        if kind == "embedding":
+            await client.embed(model=model, input="", keep_alive=0)
+        else:
+            await client.generate(model=model, prompt="", keep_alive=0)
+        print(f"[model_residency] Modelo '{model}' descargado (LRU)")
+    except Exception as e:
+        print(f"[model_residency] No se pudo descargar '{model}': {e}")
+
+
+async def _load(model, kind):
+    client = get_ollama_async_client()
+    start = time.time()
+    try:
+        # Una solicitud sin contenido solo carga el modelo en memoria
+        if kind == "embedding":
+            await client.embed(model=model, input="", keep_alive=keep_alive_for(model))
+        else:
+            await client.generate(model=model, prompt="", keep_alive=keep_alive_for(model))
+    except Exception as e:
+        print(f"[model_residency] No se pudo cargar '{model}': {e}")
+        with _lock:
+            _resident.pop(model, None)
+        return
+    elapsed_ms = (time.time() - start) * 1000
+    with _lock:
+        _stats["loads"] += 1
+        _stats["load_ms_total"] += elapsed_ms
+    print(f"[model_residency] Modelo '{model}' cargado en {elapsed_ms:.0f} ms")
+
+
+def note_model_used(model, kind="chat"):
+    """Registra el uso y descarga en segundo plano lo que sale del LRU (desde el event loop)."""
+    for evicted_model, evicted_kind in mark_used(model, kind):
+        task = asyncio.create_task(_unload(evicted_model, evicted_kind))
+        _unloading.add(task)
+        task.add_done_callback(_unloading.discard)
+
+
+def ensure_loaded(model, kind="chat"):
+    """
+    Lanza la carga del modelo en segundo plano si no está residente y
+    descarga los que salen del LRU. Debe llamarse desde el event loop.
+
+    :return: La tarea de carga, o None si el modelo ya estaba cargado.
+    """
+    if not model:
+        return None
+    with _lock:
+        resident = model in _resident
+        task = _loading.get(model)
+    note_model_used(model, kind)
+    if resident or task is not None:
+        return task
+
+    task = asyncio.create_task(_load(model, kind))
+    with _lock:
+        _loading[model] = task
+    task.add_done_callback(lambda _: _loading.pop(model, None))
+    return task
+
+
+def preload_chat_model(model_name=None):
+    """Precarga el modelo de chat mientras /get_sources busca los documentos."""
+    if PRELOAD_ON_SOURCES:
+        ensure_loaded(model_name or MODEL_CHAT, "chat")
+
+
+async def sync_resident_models():
+    """Ajusta el registro con los modelos que Ollama tiene cargados realmente."""
+    try:
+        response = await get_ollama_async_client().ps()
+    except Exception as e:
+        print(f"[model_residency] No se pudo consultar los modelos cargados: {e}")
+        return
+    loaded = {model["name"] for model in response.get("models", [])}
+    with _lock:
+        for model in list(_resident):
+            if model not in loaded and model not in _loading:
+                _resident.pop(model)
+
+
+async def warm_up_models():
+    """Carga al iniciar los modelos configurados de chat y de embeddings."""
+    if not OLLAMA_WARMUP:
+        return
+    tasks = [ensure_loaded(MODEL_EMBEDDING, "embedding")]
+    if MODEL_CHAT:
+        tasks.append(ensure_loaded(MODEL_CHAT, "chat"))
+    await asyncio.gather(*[task for task in tasks if task is not None])
+
+
+def get_model_residency_stats():
+    with _lock:
+        return {
+            "resident": [
+                {"model": model, "keep_alive": keep_alive_for(model), **info}
+                for model, info in reversed(_resident.items())
+            ],
+            "loading": list(_loading),
+            "max_resident_models": OLLAMA_MAX_RESIDENT_MODELS,
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "loads": _stats["loads"],
+            "evictions": _stats["evictions"],
+            "avg_load_ms": (
+                _stats["load_ms_total"] / _stats["loads"] if _stats["loads"] else None
+            ),
+        }
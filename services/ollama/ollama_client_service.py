@@ -0,0 +1,179 @@
+import os
+import threading
+import httpx
+from ollama import Client, AsyncClient
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
+load_dotenv(dotenv_path)
+
+# Límites del pool de conexiones HTTP hacia Ollama (OLLAMA_HOST lo lee el cliente)
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "120"))  # Segundos
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+# Sin límite de lectura por defecto: una generación larga puede tardar minutos
+OLLAMA_READ_TIMEOUT = os.getenv("OLLAMA_READ_TIMEOUT")
+OLLAMA_POOL_TIMEOUT = float(os.getenv("OLLAMA_POOL_TIMEOUT", "30"))
+# Tiempo que Ollama mantiene un modelo cargado sin uso ("30m", "1h", -1 = siempre)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Valores por modelo: "nomic-embed-text:latest=-1,llama3.1:8b=1h"
+OLLAMA_MODEL_KEEP_ALIVE = os.getenv("OLLAMA_MODEL_KEEP_ALIVE", "")
+
+_sync_client = None
+_async_client = None
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+
+# Contadores por cliente: solicitudes y conexiones TCP nuevas
+_stats = {
+    "sync": {"requests": 0, "new_connections": 0},
+    "async": {"requests": 0, "new_connections": 0},
+}
+
+
+def _parse_keep_alive(value):
+    keep_alive = {}
+    for item in value.split(","):
+        if "=" in item:
+            model, duration = item.rsplit("=", 1)
+            keep_alive[model.strip()] = duration.strip()
+    return keep_alive
+
+
+_model_keep_alive = _parse_keep_alive(OLLAMA_MODEL_KEEP_ALIVE)
+
+
+def keep_alive_for(model):
+    """keep_alive que se envía a Ollama en cada llamada con este modelo."""
+    value = _model_keep_alive.get(model, OLLAMA_KEEP_ALIVE)
+    try:
+        return int(value)  # Ollama acepta segundos o -1 como número
+    except ValueError:
+        return value
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout():
+    read_timeout = float(OLLAMA_READ_TIMEOUT) if OLLAMA_READ_TIMEOUT else None
+    return httpx.Timeout(
+        connect=OLLAMA_CONNECT_TIMEOUT,
+        read=read_timeout,
+        write=read_timeout,
+        pool=OLLAMA_POOL_TIMEOUT,
+    )
+
+
+def _count_request(kind):
+    stats = _stats[kind]
+
+    # httpcore solo emite "connection.connect_tcp" cuando abre una conexión
+    # nueva; una solicitud sin ese evento reutilizó una conexión del pool
+    def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with _stats_lock:
+                stats["new_connections"] += 1
+
+    async def trace_async(event_name, info):
+        trace(event_name, info)
+
+    def on_request(request):
+        with _stats_lock:
+            stats["requests"] += 1
+        request.extensions["trace"] = trace_async if kind == "async" else trace
+
+    async def on_request_async(request):
+        on_request(request)
+
+    return on_request_async if kind == "async" else on_request
+
+
+def get_ollama_client():
+    """Cliente síncrono compartido (embeddings desde hilos); httpx.Client es seguro entre hilos."""
+    global _sync_client
+    with _lock:
+        if _sync_client is None:
+            _sync_client = Client(
+                timeout=_timeout(),
+                limits=_limits(),
+                event_hooks={"request": [_count_request("sync")]},
+            )
+            print("[ollama_client] Cliente síncrono creado")
+        return _sync_client
+
+
+def get_ollama_async_client():
+    """Cliente asíncrono compartido (generación en streaming)."""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = AsyncClient(
+                timeout=_timeout(),
+                limits=_limits(),
+                event_hooks={"request": [_count_request("async")]},
+            )
+            print("[ollama_client] Cliente asíncrono creado")
+        return _async_client
+
+
+async def start_ollama_clients():
+    """Crea los clientes al iniciar la aplicación."""
+    get_ollama_client()
+    get_ollama_async_client()
+    print(
+        f"[ollama_client] Pool: {OLLAMA_MAX_CONNECTIONS} conexiones, "
+        f"{OLLAMA_MAX_KEEPALIVE_CONNECTIONS} keep-alive por {OLLAMA_KEEPALIVE_EXPIRY:.0f}s"
+    )
+
+
+async def close_ollama_clients():
+    """Cierra las conexiones abiertas al apagar la aplicación."""
+    global _sync_client, _async_client
+    with _lock:
+        sync_client, _sync_client = _sync_client, None
+        async_client, _async_client = _async_client, None
+    if async_client is not None:
+        await async_client._client.aclose()
+    if sync_client is not None:
+        sync_client._client.close()
+    print("[ollama_client] Clientes cerrados")
+
+
+def _open_connections(client):
+    # Dato interno de httpx/httpcore; solo informativo
+    try:
+        return len(client._client._transport._pool.connections)
+    except AttributeError:
+        return None
+
+
+def get_ollama_client_stats():
+    """Solicitudes, conexiones nuevas y porcentaje de reutilización por cliente."""
+    clients = {"sync": _sync_client, "async": _async_client}
+    result = {}
+    for kind, stats in _stats.items():
+        requests = stats["requests"]
+        reused = max(0, requests - stats["new_connections"])
+        result[kind] = {
+            "requests": requests,
+            "new_connections": stats["new_connections"],
+            "reused_connections": reused,
+            "reuse_ratio": reused / requests if requests else None,
+            "open_connections": (
+                _open_connections(clients[kind]) if clients[kind] is not None else 0
+            ),
+        }
+    result["limits"] = {
+        "max_connections": OLLAMA_MAX_CONNECTIONS,
+        "max_keepalive_connections": OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry": OLLAMA_KEEPALIVE_EXPIRY,
+    }
+    return result
@@ -0,0 +1,191 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Generaciones simultáneas contra Ollama desde este proceso
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("MAX_CONCURRENT_GENERATIONS", "2"))
+# Espera máxima estimada (s) para aceptar una solicitud en la cola
+GENERATION_WAIT_SLO = float(os.getenv("GENERATION_WAIT_SLO", "60"))
+# Duración inicial estimada de una generación, hasta tener mediciones
+GENERATION_INITIAL_ESTIMATE = float(os.getenv("GENERATION_INITIAL_ESTIMATE", "20"))
+# Cada cuánto se reenvía la posición en la cola aunque no cambie
+GENERATION_POSITION_INTERVAL = float(os.getenv("GENERATION_POSITION_INTERVAL", "5"))
+
+
+class GenerationRejected(Exception):
+    """La cola de generación excede el tiempo de espera aceptable."""
+
+    def __init__(self, estimated_wait):
+        super().__init__(
+            f"El servidor está ocupado; la espera estimada ({estimated_wait:.0f} s) "
+            "supera el máximo permitido. Intenta nuevamente en unos momentos."
+        )
+        self.estimated_wait = estimated_wait
+
+
+class _Ticket:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.enqueued_at = time.monotonic()
+        self.granted = asyncio.Event()
+        self.changed = asyncio.Event()
+
+
+class GenerationScheduler:
+    """
+    Limita las generaciones simultáneas. Las solicitudes en espera forman una
+    cola FIFO por sesión y las sesiones se atienden por turnos, de modo que un
+    usuario con varias preguntas encoladas no bloquea a los demás.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_GENERATIONS, wait_slo=GENERATION_WAIT_SLO):
+        self.max_concurrent = max(1, max_concurrent)
+        self.wait_slo = wait_slo
+        self._sessions = OrderedDict()  # {session_id: deque[_Ticket]}, en orden de turno
+        self._active = 0
+        self._avg_duration = GENERATION_INITIAL_ESTIMATE
+        self._stats = {
+            "accepted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "wait_total_s": 0.0,
+            "wait_max_s": 0.0,
+        }
+
+    def _queue_order(self):
+        """Orden en que se atenderán las solicitudes en espera (turnos por sesión)."""
+        queues = [list(queue) for queue in self._sessions.values()]
+        order = []
+        for depth in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[depth] for queue in queues if depth < len(queue))
+        return order
+
+    def queued(self):
+        return sum(len(queue) for queue in self._sessions.values())
+
+    def estimated_wait(self, position):
+        """Espera estimada para la posición dada (1 = siguiente en entrar)."""
+        if position <= 0:
+            return 0.0
+        return position / self.max_concurrent * self._avg_duration
+
+    def position(self, ticket):
+        order = self._queue_order()
+        return order.index(ticket) + 1 if ticket in order else 0
+
+    def _notify_positions(self):
+        for queue in self._sessions.values():
+            for ticket in queue:
+                ticket.changed.set()
+
+    def _dispatch(self):
+        while self._active < self.max_concurrent and self._sessions:
+            session_id, queue = next(iter(self._sessions.items()))
+            ticket = queue.popleft()
+            # La sesión pasa al final del turno; se elimina si no le quedan solicitudes
+            self._sessions.pop(session_id)
+            if queue:
+                self._sessions[session_id] = queue
+            self._active += 1
+            wait = time.monotonic() - ticket.enqueued_at
+            self._stats["wait_total_s"] += wait
+            self._stats["wait_max_s"] = max(self._stats["wait_max_s"], wait)
+            ticket.granted.set()
+            ticket.changed.set()
+        self._notify_positions()
+
+    def _remove(self, ticket):
+        queue = self._sessions.get(ticket.session_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                self._sessions.pop(ticket.session_id)
+            self._notify_positions()
+
+    def _release(self, duration):
+        self._active -= 1
+        self._stats["completed"] += 1
+        # Media móvil de la duración para estimar la espera
+        self._avg_duration += (duration - self._avg_duration) * 0.2
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, session_id, on_position=None):
+        """
+        Espera un turno para generar. Mientras espera, llama a
+        on_position(posición, espera_estimada) cuando la posición cambia.
+
+        :raises GenerationRejected: Si la espera estimada excede el SLO.
+        """
+        if self._active >= self.max_concurrent:
+            estimated = self.estimated_wait(self.queued() + 1)
+            if estimated > self.wait_slo:
+                self._stats["rejected"] += 1
+                raise GenerationRejected(estimated)
+
+        ticket = _Ticket(session_id)
+        self._sessions.setdefault(session_id, deque()).append(ticket)
+        self._stats["accepted"] += 1
+        self._dispatch()
+
+        try:
+            last_position = None
+            while not ticket.granted.is_set():
+                position = self.position(ticket)
+                if on_position is not None and position:
+                    if position != last_position:
+                        await on_position(position, self.estimated_wait(position))
+                        last_position = position
+                ticket.changed.clear()
+                try:
+                    await asyncio.wait_for(
+                        ticket.changed.wait(), timeout=GENERATION_POSITION_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    last_position = None  # Reenviar la posición periódicamente
+        except BaseException:
+            # Desconexión o cancelación mientras esperaba
+            if ticket.granted.is_set():
+                self._release(0.0)
+            else:
+                self._remove(ticket)
+            raise
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self._active,
+            "queued": self.queued(),
+            "queued_sessions": len(self._sessions),
+            "wait_slo_s": self.wait_slo,
+            "avg_generation_s": self._avg_duration,
+            "estimated_wait_s": self.estimated_wait(self.queued() + 1)
+            if self._active >= self.max_concurrent
+            else 0.0,
+            "accepted": self._stats["accepted"],
+            "rejected": self._stats["rejected"],
+            "completed": self._stats["completed"],
+            "wait_avg_s": (
+                self._stats["wait_total_s"] / self._stats["accepted"]
+                if self._stats["accepted"]
+                else 0.0
+            ),
+            "wait_max_s": self._stats["wait_max_s"],
+        }
+
+
+# Compartido por todas las conexiones del proceso
+generation_scheduler = GenerationScheduler()
@@ -4,20 +4,18 @@ import json
 import asyncio
 from typing import AsyncGenerator, List
 from dotenv import load_dotenv
-from ollama import AsyncClient
 from services.helpers.system_usage import get_system_usage
-from services.metrics.save_metrics.save_metrics_response import save_metrics_response
+from services.ollama.ollama_client_service import get_ollama_async_client, keep_alive_for
+from services.ollama.model_residency_service import note_model_used
+from services.query.ollama.prompt_layout import build_messages, PROMPT_LAYOUT_VERSION
+from services.metrics.save_metrics.metrics_recorder import record_response_metrics
 
 # Especifica la ruta al archivo .env
 dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.env")
 load_dotenv(dotenv_path)
 
-NOMBRE_ASISTENTE = os.getenv("NOMBRE_ASISTENTE", "Sistete")
-AREA_ASISTENCIA = os.getenv("AREA_ASISTENCIA", "No defined")
-
 
 async def ollama_generator(
-    db,
     query: str,
     model_name: str,
     historial_interactions: List[dict],
@@ -36,64 +34,94 @@ async def ollama_generator(
     if not use_considerations:
         considerations = "No hay consideraciones disponibles"  # type: ignore
 
-    # Mensaje inicial para configurar al asistente
-    system_message = {
-        "role": "system",
-        "content": (
-            f"""Tu nombre es {NOMBRE_ASISTENTE}, eres asistente de {AREA_ASISTENCIA}. 
-            Solo tienes permitido responder en español, no puedes usar ingles u otros idiomas, además mantén tono profesional y preciso. 
-            Tu objetivo es responder la pregunta del usuario. Si la información necesaria no está disponible en el contexto, fuentes o consideraciones, indica que no puedes responder con precisión y menciona las fuentes, pero siempre establece la relación entre los datos disponibles y la pregunta del usuario. 
-            Pregunta del usuario: {query}
-            Lista de Fuentes: {sources}
-            Lista de Contexto: {context}
-            Lista de consideraciones: {considerations}"""
-        ),
-    }
-
-    messages = [system_message] + historial_interactions
+    # Plantilla versionada: instrucciones fijas primero para reutilizar el caché
+    messages = build_messages(
+        query, historial_interactions, context, sources, considerations
+    )
     print(
         "[rt_query-ollama-messages] Messages enviados al modelo: ",
         json.dumps(messages, indent=4),
     )
 
-    # Crear una instancia del cliente asincrónico
-    async_client = AsyncClient()
+    # Cliente compartido de la aplicación: reutiliza las conexiones abiertas
+    async_client = get_ollama_async_client()
+    note_model_used(model_name, "chat")
+
+    started = time.time()
+    tokens_sent = 0
+    cancelled = False
+    finished = False
 
     # Llamar al modelo con los mensajes combinados
-    async for chunk in await async_client.chat(
+    stream = await async_client.chat(
         model=model_name,
         messages=messages,
         stream=True,
+        keep_alive=keep_alive_for(model_name),
         options={
             "temperature": 0.8,  # Controla la aleatoriedad de las respuestas. 0 - 1
             "num_thread": 2,  # Establece la cantidad de hilos utilizados por el modelo. depende cpu
             "top_k": 85,  # Restringe la selección de palabras a las más probables. 40 - 100
         },
-    ):
-        if cancel_event.is_set():
-            print("[ollama_generator] Cancelado por desconexión.")
-            break
+    )
+    try:
+        async for chunk in stream:
+            if cancel_event.is_set():
+                print("[ollama_generator] Cancelado por desconexión.")
+                cancelled = True
+                break
 
-        # Procesar el chunk recibido
-        if chunk.get("done"):
-            # Obtener las métricas finales de CPU y memoria
-            final_cpu, final_memory = get_system_usage()
+            # Procesar el chunk recibido
+            if chunk.get("done"):
+                finished = True
+                # Obtener las métricas finales de CPU y memoria (sin bloquear el event loop)
+                final_cpu, final_memory = get_system_usage(interval=None)
 
-            metrics_data = {
-                "created_at": chunk.get("created_at"),
-                "total_duration": chunk.get("total_duration"),
-                "load_duration": chunk.get("load_duration"),
-                "prompt_eval_count": chunk.get("prompt_eval_count"),
-                "prompt_eval_duration": chunk.get("prompt_eval_duration"),
-                "eval_count": chunk.get("eval_count"),
-                "eval_duration": chunk.get("eval_duration"),
-                "cpu_usage": {"initial": initial_cpu, "final": final_cpu},
-                "memory_usage": {"initial": initial_memory, "final": final_memory},
-                "search_documents_time": search_documents_time,
-            }
+                metrics_data = {
+                    "created_at": chunk.get("created_at"),
+                    "total_duration": chunk.get("total_duration"),
+                    "load_duration": chunk.get("load_duration"),
+                    "prompt_eval_count": chunk.get("prompt_eval_count"),
+                    "prompt_eval_duration": chunk.get("prompt_eval_duration"),
+                    "eval_count": chunk.get("eval_count"),
+                    "eval_duration": chunk.get("eval_duration"),
+                    "cpu_usage": {"initial": initial_cpu, "final": final_cpu},
+                    "memory_usage": {"initial": initial_memory, "final": final_memory},
+                    "search_documents_time": search_documents_time,
+                    "prompt_version": PROMPT_LAYOUT_VERSION,
+                }
 
-            save_metrics_response(db, metrics_data)
+                # Se guardan por lotes en segundo plano; el cliente recibe el cierre de inmediato
+                record_response_metrics(metrics_data)
 
-            yield {"key": "MESSAGE_DONE", **metrics_data}
-        else:
-            yield chunk["message"]["content"]
+                yield {"key": "MESSAGE_DONE", **metrics_data}
+            else:
+                tokens_sent += 1
+                yield chunk["message"]["content"]
+    except (asyncio.CancelledError, GeneratorExit):
+        # El endpoint cancela la tarea o cierra el generador al desconectarse el cliente
+        cancelled = not finished
+        raise
+    finally:
+        # Cerrar la respuesta HTTP corta la conexión y Ollama detiene la inferencia
+        await stream.aclose()
+        if cancelled:
+            elapsed_ns = (time.time() - started) * 1e9
+            print(
+                f"[ollama_generator] Generación cancelada tras {tokens_sent} tokens "
+                f"({elapsed_ns / 1e9:.1f}s)"
+            )
+            final_cpu, final_memory = get_system_usage(interval=None)
+            # Se registran aparte: no tienen las duraciones que Ollama reporta al terminar
+            record_response_metrics(
+                {
+                    "total_duration": elapsed_ns,
+                    "eval_count": tokens_sent,
+                    "eval_duration": elapsed_ns,
+                    "cpu_usage": {"initial": initial_cpu, "final": final_cpu},
+                    "memory_usage": {"initial": initial_memory, "final": final_memory},
+                    "search_documents_time": search_documents_time,
+                    "prompt_version": PROMPT_LAYOUT_VERSION,
+                    "cancelled": True,
+                }
+            )
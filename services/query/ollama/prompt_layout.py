@@ -0,0 +1,93 @@
+import os
+from typing import List
+from dotenv import load_dotenv
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+NOMBRE_ASISTENTE = os.getenv("NOMBRE_ASISTENTE", "Sistete")
+AREA_ASISTENCIA = os.getenv("AREA_ASISTENCIA", "No defined")
+
+# Versión del orden de los mensajes; se guarda con las métricas de cada respuesta
+# v1: pregunta y material dentro del mensaje de sistema, antes del historial
+# v2: instrucciones fijas -> material recuperado -> historial -> pregunta al final
+PROMPT_LAYOUT_VERSION = os.getenv("PROMPT_LAYOUT_VERSION", "v2")
+
+# Prefijo idéntico en todas las solicitudes: Ollama reutiliza su caché KV para
+# él. No debe contener nada que cambie entre solicitudes.
+INSTRUCTIONS_V2 = (
+    f"Tu nombre es {NOMBRE_ASISTENTE}, eres asistente de {AREA_ASISTENCIA}. "
+    "Solo tienes permitido responder en español, no puedes usar ingles u otros idiomas, "
+    "además mantén tono profesional y preciso. "
+    "Tu objetivo es responder la última pregunta del usuario usando las fuentes, el "
+    "contexto y las consideraciones que se entregan a continuación. Si la información "
+    "necesaria no está disponible en ellos, indica que no puedes responder con precisión "
+    "y menciona las fuentes, pero siempre establece la relación entre los datos "
+    "disponibles y la pregunta del usuario."
+)
+
+MATERIAL_TEMPLATE_V2 = (
+    "Lista de Fuentes: {sources}\n"
+    "Lista de Contexto: {context}\n"
+    "Lista de consideraciones: {considerations}"
+)
+
+
+def _messages_v1(query, historial_interactions, context, sources, considerations):
+    system_message = {
+        "role": "system",
+        "content": (
+            f"""Tu nombre es {NOMBRE_ASISTENTE}, eres asistente de {AREA_ASISTENCIA}. 
+            Solo tienes permitido responder en español, no puedes usar ingles u otros idiomas, además mantén tono profesional y preciso. 
+            Tu objetivo es responder la pregunta del usuario. Si la información necesaria no está disponible en el contexto, fuentes o consideraciones, indica que no puedes responder con precisión y menciona las fuentes, pero siempre establece la relación entre los datos disponibles y la pregunta del usuario. 
+            Pregunta del usuario: {query}
+            Lista de Fuentes: {sources}
+            Lista de Contexto: {context}
+            Lista de consideraciones: {considerations}"""
+        ),
+    }
+    return [system_message] + historial_interactions
+
+
+def _messages_v2(query, historial_interactions, context, sources, considerations):
+    history = list(historial_interactions)
+    # El historial llega con la pregunta actual al final; se mueve al último lugar
+    # después del material
+    if history and history[-1]["role"] == "user":
+        query = history.pop()["content"]
+    return (
+        [
+            {"role": "system", "content": INSTRUCTIONS_V2},
+            {
+                "role": "system",
+                "content": MATERIAL_TEMPLATE_V2.format(
+                    sources=sources, context=context, considerations=considerations
+                ),
+            },
+        ]
+        + history
+        + [{"role": "user", "content": query}]
+    )
+
+
+PROMPT_LAYOUTS = {"v1": _messages_v1, "v2": _messages_v2}
+
+
+def build_messages(
+    query: str,
+    historial_interactions: List[dict],
+    context: str,
+    sources: str,
+    considerations,
+    version: str = PROMPT_LAYOUT_VERSION,
+):
+    """
+    Arma los mensajes para el modelo con la versión de plantilla indicada.
+
+    :return: Lista de mensajes en el formato de chat de Ollama.
+    """
+    layout = PROMPT_LAYOUTS.get(version)
+    if layout is None:
+        raise ValueError(f"Versión de plantilla desconocida: {version}")
+    return layout(query, historial_interactions, context, sources, considerations)
@@ -0,0 +1,258 @@
+import os
+import asyncio
+import traceback
+from collections import deque
+from contextlib import aclosing
+from dotenv import load_dotenv
+from services.query.ollama.generation_scheduler import (
+    generation_scheduler,
+    GenerationRejected,
+)
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Caracteres que se guardan por respuesta para reenviarlos al reconectar
+RESPONSE_BUFFER_MAX_CHARS = int(os.getenv("RESPONSE_BUFFER_MAX_CHARS", "64000"))
+# Tiempo que una respuesta terminada sigue disponible para reconexiones
+RESPONSE_BUFFER_TTL = float(os.getenv("RESPONSE_BUFFER_TTL", "300"))
+# Tiempo que una generación sigue sin clientes antes de abortarla (0 = abortar al instante)
+RESUME_GRACE_SECONDS = float(os.getenv("RESUME_GRACE_SECONDS", "10"))
+
+_streams = {}  # {response_uuid: ResponseStream}
+_running = {}  # {clave de la solicitud: ResponseStream} de las generaciones en curso
+_stats = {"started": 0, "shared": 0, "resumed": 0, "resume_failed": 0, "aborted": 0}
+
+
+class ResponseStream:
+    """
+    Texto generado para una respuesta, en un buffer circular acotado. La
+    generación corre en su propia tarea; los websockets se suscriben desde un
+    offset (caracteres ya recibidos) y pueden desconectarse y volver.
+    """
+
+    def __init__(self, response_uuid, session_id, key=None):
+        self.response_uuid = response_uuid
+        self.session_id = session_id
+        self.key = key
+        self._chunks = deque()  # [(offset, texto)]
+        self.base = 0  # Primer offset que aún está en el buffer
+        self.length = 0  # Caracteres generados en total
+        self.queue_event = None  # Última posición en la cola mientras espera turno
+        self.final = None  # MESSAGE_DONE, QUEUE_FULL o MESSAGE_ERROR
+        self.finished = False
+        self.cancel_event = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task = None
+        self._grace_handle = None
+
+    def _notify(self):
+        # Los suscriptores esperan el evento anterior; se reemplaza por uno nuevo
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def append(self, text):
+        self._chunks.append((self.length, text))
+        self.length += len(text)
+        while self._chunks and self.length - self._chunks[0][0] > RESPONSE_BUFFER_MAX_CHARS:
+            self._chunks.popleft()
+            self.base = self._chunks[0][0] if self._chunks else self.length
+        self._notify()
+
+    def read_from(self, offset):
+        """Texto desde offset; None si esa parte ya salió del buffer."""
+        if offset < self.base:
+            return None
+        return "".join(
+            text[max(0, offset - start):]
+            for start, text in self._chunks
+            if start + len(text) > offset
+        )
+
+    def set_queue_event(self, event):
+        self.queue_event = event
+        self._notify()
+
+    def _forget_key(self):
+        if self.key is not None and _running.get(self.key) is self:
+            _running.pop(self.key)
+
+    def finish(self, final=None):
+        self._forget_key()
+        self.final = final
+        self.finished = True
+        self.queue_event = None
+        self._notify()
+        # Se conserva un tiempo para reconexiones y luego se descarta
+        asyncio.get_running_loop().call_later(
+            RESPONSE_BUFFER_TTL, _streams.pop, self.response_uuid, None
+        )
+
+    def attach(self):
+        self.subscribers += 1
+        if self._grace_handle is not None:
+            self._grace_handle.cancel()
+            self._grace_handle = None
+
+    def detach(self):
+        self.subscribers -= 1
+        if self.subscribers > 0 or self.finished:
+            return
+        if RESUME_GRACE_SECONDS > 0:
+            self._grace_handle = asyncio.get_running_loop().call_later(
+                RESUME_GRACE_SECONDS, self.abort
+            )
+        else:
+            self.abort()
+
+    def abort(self):
+        """Nadie volvió a conectarse: se corta el stream de Ollama."""
+        self._grace_handle = None
+        if self.subscribers > 0 or self.finished:
+            return
+        print(f"[response_buffer] Generación {self.response_uuid} abortada sin clientes")
+        _stats["aborted"] += 1
+        self.cancel_event.set()
+        if self.task is not None:
+            self.task.cancel()
+
+
+async def _produce(stream, make_chunks):
+    async def on_position(position, estimated_wait):
+        stream.set_queue_event(
+            {
+                "key": "QUEUE_POSITION",
+                "position": position,
+                "estimated_wait": round(estimated_wait, 1),
+            }
+        )
+
+    final = None
+    try:
+        async with generation_scheduler.slot(stream.session_id, on_position=on_position):
+            stream.set_queue_event(None)
+            async with aclosing(make_chunks(stream.cancel_event)) as chunks:
+                async for chunk in chunks:
+                    if isinstance(chunk, dict):
+                        final = chunk
+                    elif chunk:
+                        stream.append(chunk)
+    except GenerationRejected as e:
+        print(f"[response_buffer] Generación rechazada: {e}")
+        final = {
+            "key": "QUEUE_FULL",
+            "estimated_wait": round(e.estimated_wait, 1),
+            "content": str(e),
+        }
+    except asyncio.CancelledError:
+        stream._forget_key()
+        _streams.pop(stream.response_uuid, None)
+        raise
+    except Exception as e:
+        print(f"[response_buffer] Error en la generación: {e}")
+        print(traceback.format_exc())
+        final = {"key": "MESSAGE_ERROR", "content": "No se pudo generar la respuesta."}
+    stream.finish(final)
+
+
+def start_response_stream(response_uuid, session_id, make_chunks, key=None):
+    """
+    Lanza la generación en segundo plano. Si ya hay una generación en curso
+    con la misma clave (misma pregunta, fuentes y modelo) se devuelve esa y
+    el nuevo cliente recibe el mismo stream de tokens.
+
+    :param make_chunks: Recibe el cancel_event y devuelve el generador de
+        chunks (texto o el dict final).
+    """
+    if key is not None and key in _running:
+        _stats["shared"] += 1
+        stream = _running[key]
+        print(f"[response_buffer] Generación idéntica en curso: {stream.response_uuid}")
+        return stream
+    stream = ResponseStream(response_uuid, session_id, key)
+    _streams[response_uuid] = stream
+    if key is not None:
+        _running[key] = stream
+    stream.task = asyncio.create_task(_produce(stream, make_chunks))
+    _stats["started"] += 1
+    return stream
+
+
+def get_response_stream(response_uuid, offset=0):
+    """Respuesta en curso o reciente para reanudarla desde offset; None si ya no está."""
+    stream = _streams.get(response_uuid)
+    if stream is None or offset < stream.base or offset > stream.length:
+        _stats["resume_failed"] += 1
+        return None
+    _stats["resumed"] += 1
+    return stream
+
+
+RESUME_FAILED = {
+    "key": "RESUME_FAILED",
+    "content": "La respuesta ya no está disponible; vuelve a enviar la pregunta.",
+}
+
+
+async def relay_response(stream, writer, offset=0):
+    """
+    Envía por el websocket lo generado desde offset y sigue la generación
+    hasta el final. Si la conexión se cae, la generación continúa sin este
+    suscriptor.
+    """
+    response_uuid = stream.response_uuid
+    stream.attach()
+    await writer.open(response_uuid)
+    try:
+        last_queue_event = None
+        while True:
+            changed = stream.changed
+            text = stream.read_from(offset)
+            if text is None:
+                # El cliente quedó atrás de lo que conserva el buffer circular
+                await writer.send_event(response_uuid, RESUME_FAILED)
+                return
+            if text:
+                offset += len(text)
+                await writer.write(response_uuid, text)
+            if stream.queue_event is not None and stream.queue_event is not last_queue_event:
+                last_queue_event = stream.queue_event
+                await writer.send_event(response_uuid, last_queue_event)
+            if stream.finished and offset >= stream.length:
+                if stream.final is not None:
+                    await writer.send_event(response_uuid, stream.final)
+                return
+            await changed.wait()
+    finally:
+        stream.detach()
+        await writer.close(response_uuid)
+
+
+async def reject_resume(response_uuid, writer):
+    await writer.open(response_uuid)
+    try:
+        await writer.send_event(response_uuid, RESUME_FAILED)
+    finally:
+        await writer.close(response_uuid)
+
+
+def get_response_buffer_stats():
+    streams = list(_streams.values())
+    return {
+        "running": sum(1 for stream in streams if not stream.finished),
+        "buffered": len(streams),
+        "detached": sum(
+            1 for stream in streams if not stream.finished and stream.subscribers == 0
+        ),
+        "buffered_chars": sum(stream.length - stream.base for stream in streams),
+        "started": _stats["started"],
+        "shared": _stats["shared"],
+        "resumed": _stats["resumed"],
+        "resume_failed": _stats["resume_failed"],
+        "aborted": _stats["aborted"],
+        "max_chars": RESPONSE_BUFFER_MAX_CHARS,
+        "ttl_s": RESPONSE_BUFFER_TTL,
+        "grace_s": RESUME_GRACE_SECONDS,
+    }
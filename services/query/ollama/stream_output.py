@@ -0,0 +1,184 @@
+import os
+import time
+import json
+import asyncio
+import threading
+from dotenv import load_dotenv
+
+try:
+    import msgpack
+except ImportError:  # Framing binario opcional
+    msgpack = None
+
+# Especifica la ruta al archivo .env
+dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../.env")
+load_dotenv(dotenv_path)
+
+# Los tokens se acumulan y se envían juntos cada N ms o al llegar a M bytes
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "50"))
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", "256"))
+
+FRAMING_JSON = "json"
+FRAMING_MSGPACK = "msgpack"
+
+_stats_lock = threading.Lock()
+_stats = {"answers": 0, "frames": 0, "bytes": 0, "tokens": 0, "stream_seconds": 0.0}
+
+
+def negotiate_framing(requested):
+    """
+    Framing acordado al conectar (?framing=msgpack). Si msgpack no está
+    instalado se usa JSON.
+    """
+    if requested == FRAMING_MSGPACK and msgpack is not None:
+        return FRAMING_MSGPACK
+    return FRAMING_JSON
+
+
+class StreamWriter:
+    """
+    Etapa de salida del websocket: agrupa los tokens de cada respuesta en
+    frames y los envía cada STREAM_FLUSH_MS o al acumular STREAM_FLUSH_BYTES.
+
+    Framing JSON (compatible con el cliente actual):
+        {"response_uuid": ..., "content": "texto agrupado"}
+    Framing msgpack (binario): cada respuesta recibe un id numérico que se
+    anuncia una sola vez con [id, {"key": "STREAM_OPEN", "response_uuid": ...}];
+    después cada frame es [id, "texto"] o [id, {evento}].
+    """
+
+    def __init__(self, websocket, framing=FRAMING_JSON,
+                 flush_ms=STREAM_FLUSH_MS, flush_bytes=STREAM_FLUSH_BYTES):
+        self.websocket = websocket
+        self.framing = framing
+        self.flush_interval = flush_ms / 1000
+        self.flush_bytes = flush_bytes
+        self._stream_ids = {}  # {response_uuid: id numérico}
+        self._next_stream_id = 1
+        self._buffers = {}  # {response_uuid: [tokens]}
+        self._buffer_bytes = {}
+        self._answers = {}  # {response_uuid: {"frames", "bytes", "tokens", "started"}}
+        self._flush_tasks = {}
+        self._send_lock = asyncio.Lock()
+
+    async def _send(self, response_uuid, content):
+        if self.framing == FRAMING_MSGPACK:
+            payload = msgpack.packb([self._stream_ids[response_uuid], content])
+            await self.websocket.send_bytes(payload)
+        else:
+            payload = json.dumps({"response_uuid": response_uuid, "content": content})
+            await self.websocket.send_text(payload)
+        answer = self._answers.get(response_uuid)
+        if answer is not None:
+            answer["frames"] += 1
+            answer["bytes"] += len(payload)
+
+    async def open(self, response_uuid):
+        """Registra una respuesta nueva; en msgpack anuncia su id numérico."""
+        self._buffers[response_uuid] = []
+        self._buffer_bytes[response_uuid] = 0
+        self._answers[response_uuid] = {
+            "frames": 0, "bytes": 0, "tokens": 0, "started": time.monotonic()
+        }
+        if self.framing == FRAMING_MSGPACK:
+            self._stream_ids[response_uuid] = self._next_stream_id
+            self._next_stream_id += 1
+            async with self._send_lock:
+                await self._send(
+                    response_uuid, {"key": "STREAM_OPEN", "response_uuid": response_uuid}
+                )
+
+    async def write(self, response_uuid, text):
+        """Agrega texto al frame pendiente y lo envía si ya alcanzó el tamaño."""
+        if not text:
+            return
+        self._buffers[response_uuid].append(text)
+        self._buffer_bytes[response_uuid] += len(text.encode("utf-8"))
+        self._answers[response_uuid]["tokens"] += 1
+        if self._buffer_bytes[response_uuid] >= self.flush_bytes:
+            await self.flush(response_uuid)
+        elif response_uuid not in self._flush_tasks:
+            # El primer token pendiente programa el envío por tiempo
+            self._flush_tasks[response_uuid] = asyncio.create_task(
+                self._flush_later(response_uuid)
+            )
+
+    async def _flush_later(self, response_uuid):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_tasks.pop(response_uuid, None)
+        try:
+            await self.flush(response_uuid)
+        except Exception as e:
+            # La desconexión la detecta el endpoint en el siguiente envío
+            print(f"[stream_output] No se pudo enviar el frame: {e}")
+
+    async def flush(self, response_uuid):
+        task = self._flush_tasks.pop(response_uuid, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        async with self._send_lock:
+            pending = self._buffers.get(response_uuid)
+            if not pending:
+                return
+            self._buffers[response_uuid] = []
+            self._buffer_bytes[response_uuid] = 0
+            await self._send(response_uuid, "".join(pending))
+
+    async def send_event(self, response_uuid, event):
+        """Envía un evento (posición en cola, MESSAGE_DONE...) tras el texto pendiente."""
+        await self.flush(response_uuid)
+        async with self._send_lock:
+            if self.framing == FRAMING_JSON and "key" in event and event["key"] != "MESSAGE_DONE":
+                # Los eventos de control viajan al nivel superior, como antes
+                payload = json.dumps({"response_uuid": response_uuid, **event})
+                await self.websocket.send_text(payload)
+                answer = self._answers.get(response_uuid)
+                if answer is not None:
+                    answer["frames"] += 1
+                    answer["bytes"] += len(payload)
+            else:
+                await self._send(response_uuid, event)
+
+    async def close(self, response_uuid):
+        """Envía lo pendiente y registra frames y bytes de la respuesta."""
+        try:
+            await self.flush(response_uuid)
+        finally:
+            self._buffers.pop(response_uuid, None)
+            self._buffer_bytes.pop(response_uuid, None)
+            self._stream_ids.pop(response_uuid, None)
+            answer = self._answers.pop(response_uuid, None)
+            if answer is not None:
+                with _stats_lock:
+                    _stats["answers"] += 1
+                    _stats["frames"] += answer["frames"]
+                    _stats["bytes"] += answer["bytes"]
+                    _stats["tokens"] += answer["tokens"]
+                    _stats["stream_seconds"] += time.monotonic() - answer["started"]
+
+    def discard(self):
+        """Cancela los envíos programados al cerrar la conexión."""
+        for task in self._flush_tasks.values():
+            task.cancel()
+        self._flush_tasks.clear()
+
+
+def get_stream_output_stats():
+    with _stats_lock:
+        answers = _stats["answers"]
+        return {
+            "framing_available": [FRAMING_JSON] + ([FRAMING_MSGPACK] if msgpack else []),
+            "flush_ms": STREAM_FLUSH_MS,
+            "flush_bytes": STREAM_FLUSH_BYTES,
+            "answers": answers,
+            "frames_per_answer": _stats["frames"] / answers if answers else None,
+            "bytes_per_answer": _stats["bytes"] / answers if answers else None,
+            "tokens_per_frame": (
+                _stats["tokens"] / _stats["frames"] if _stats["frames"] else None
+            ),
+            "frames_per_second": (
+                _stats["frames"] / _stats["stream_seconds"]
+                if _stats["stream_seconds"]
+                else None
+            ),
+        }